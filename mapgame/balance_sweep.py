@@ -0,0 +1,245 @@
+"""Monte Carlo balance sweeps: play lots of headless bot runs per parameter combo
+
+Every combination of the parameters below gets `--runs` full runs, each with
+its own seed, spread over a process pool. Each combination's aggregated
+results are written to a small JSON file in `--out`.
+
+Usage:
+    python mapgame/balance_sweep.py --runs 2000 --npcs 5 7 9 --bump-scale 0.5 1 2
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import mapgame_pieces.alive as alive
+import mapgame_pieces.map as tile_map
+import mapgame_pieces.player as player_module
+from mapgame import Game, GameState
+from mapgame_pieces.bot import Bot
+
+logger = logging.getLogger(__name__)
+DEFAULT_BUMP_CHANCES = alive.HOSTILE_LEVEL_BUMP_CHANCES
+
+
+@dataclass(frozen=True)
+class SweepParams:
+    npcs_per_tile: int = tile_map.BASE_NPCS_PER_TILE
+    bump_scale: float = 1.0  # multiplies alive.HOSTILE_LEVEL_BUMP_CHANCES
+    xp_base: float = player_module.XP_CURVE_BASE
+    xp_exponent: float = player_module.XP_CURVE_EXPONENT
+
+    @property
+    def slug(self) -> str:
+        return (
+            f"npcs{self.npcs_per_tile}_bump{self.bump_scale:g}"
+            f"_xp{self.xp_base:g}-{self.xp_exponent:g}"
+        )
+
+    def apply(self):
+        """Patch the tunables in this (worker) process"""
+        tile_map.BASE_NPCS_PER_TILE = self.npcs_per_tile
+        alive.HOSTILE_LEVEL_BUMP_CHANCES = tuple(
+            chance * self.bump_scale for chance in DEFAULT_BUMP_CHANCES
+        )
+        player_module.XP_CURVE_BASE = self.xp_base
+        player_module.XP_CURVE_EXPONENT = self.xp_exponent
+
+
+@dataclass
+class SweepStats:
+    """Aggregated results for one parameter combination; mergeable across workers"""
+
+    runs: int = 0
+    turns: int = 0
+    depths: Counter = field(default_factory=Counter)  # depth reached: n runs
+    causes: Counter = field(default_factory=Counter)  # how the run ended: n runs
+    # humanity on arrival at each depth, summed over runs, and how many runs got there
+    humanity_sums: Counter = field(default_factory=Counter)
+    humanity_counts: Counter = field(default_factory=Counter)
+
+    def add_run(self, depth: int, turns: int, cause: str, humanity: list[int]):
+        self.runs += 1
+        self.turns += turns
+        self.depths[depth] += 1
+        self.causes[cause] += 1
+        for arrived_at, value in enumerate(humanity, start=1):
+            self.humanity_sums[arrived_at] += value
+            self.humanity_counts[arrived_at] += 1
+
+    def merge(self, other: "SweepStats"):
+        self.runs += other.runs
+        self.turns += other.turns
+        self.depths.update(other.depths)
+        self.causes.update(other.causes)
+        self.humanity_sums.update(other.humanity_sums)
+        self.humanity_counts.update(other.humanity_counts)
+
+    def depth_percentile(self, pct: float) -> int:
+        threshold = self.runs * pct / 100
+        seen = 0
+        for depth in sorted(self.depths):
+            seen += self.depths[depth]
+            if seen >= threshold:
+                return depth
+        return 0
+
+    def summary(self, params: SweepParams) -> dict:
+        return {
+            "params": params.__dict__,
+            "runs": self.runs,
+            "mean_turns": round(self.turns / self.runs, 1),
+            "depth": {
+                "mean": round(
+                    sum(d * n for d, n in self.depths.items()) / self.runs, 2
+                ),
+                "p10": self.depth_percentile(10),
+                "p50": self.depth_percentile(50),
+                "p90": self.depth_percentile(90),
+                "max": max(self.depths),
+            },
+            "death_causes": dict(self.causes.most_common()),
+            "mean_humanity_by_depth": [
+                round(self.humanity_sums[d] / self.humanity_counts[d], 1)
+                for d in sorted(self.humanity_counts)
+            ],
+        }
+
+
+def play_one_run(
+    seed: int, max_depth: int, max_turns: int
+) -> tuple[int, int, str, list[int]]:
+    """Returns (depth reached, turns taken, how it ended, humanity on arrival at each depth)"""
+    random.seed(seed)
+    game = Game(headless=True, save_path=None)
+    bot = Bot(game)
+    humanity = [game.player.humanity]
+    for turn in range(max_turns):
+        state_before = game.game_state
+        command = bot.next_command()
+        game.play(command)
+        if game.player.humanity <= 0:
+            if state_before == GameState.in_combat:
+                # blame the kind of the strongest enemy, e.g. "skeleton" for "spooky skeleton"
+                hostiles = game.interaction.in_combat_vs
+                if hostiles:
+                    strongest = max(hostiles, key=lambda npc: npc.attack_power)
+                    cause = "combat: " + strongest.name.split(" ", 1)[-1]
+                else:
+                    cause = "combat"
+            elif command == "portal":
+                cause = "portal"
+            else:
+                cause = state_before.name
+            return game.player.tile_index, turn + 1, cause, humanity
+        if game.player.tile_index > len(humanity):
+            humanity.append(game.player.humanity)
+            if game.player.tile_index >= max_depth:
+                return game.player.tile_index, turn + 1, "reached max depth", humanity
+    return game.player.tile_index, max_turns, "turn limit", humanity
+
+
+def run_batch(
+    params: SweepParams, seeds: list[int], max_depth: int, max_turns: int
+) -> SweepStats:
+    params.apply()
+    stats = SweepStats()
+    for seed in seeds:
+        stats.add_run(*play_one_run(seed, max_depth, max_turns))
+    return stats
+
+
+def _quiet_worker():
+    # the game logs plenty at debug level; we only want the results
+    logging.disable(logging.CRITICAL)
+
+
+def sweep(
+    grid: list[SweepParams],
+    runs: int,
+    out_dir: Path,
+    workers: int,
+    batch_size: int,
+    base_seed: int,
+    max_depth: int,
+    max_turns: int,
+):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    totals = {params: SweepStats() for params in grid}
+    pending = {params: 0 for params in grid}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_quiet_worker) as pool:
+        futures = {}
+        for params in grid:
+            # the same seeds for every combo, so combos are compared on the same luck
+            for first in range(0, runs, batch_size):
+                seeds = list(
+                    range(base_seed + first, base_seed + min(runs, first + batch_size))
+                )
+                future = pool.submit(run_batch, params, seeds, max_depth, max_turns)
+                futures[future] = params
+                pending[params] += 1
+        for future in as_completed(futures):
+            params = futures[future]
+            totals[params].merge(future.result())
+            pending[params] -= 1
+            if not pending[params]:
+                summary = totals[params].summary(params)
+                out_file = out_dir / f"{params.slug}.json"
+                with open(out_file, "w") as results_file:
+                    json.dump(summary, results_file)
+                print(f"{out_file}: mean depth {summary['depth']['mean']}")
+    elapsed = time.perf_counter() - start
+    total_runs = runs * len(grid)
+    print(
+        f"{total_runs} runs in {elapsed:.1f}s ({total_runs / elapsed:.1f} runs/s, {workers} workers)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=1000, help="runs per combination")
+    parser.add_argument(
+        "--npcs", type=int, nargs="+", default=[tile_map.BASE_NPCS_PER_TILE]
+    )
+    parser.add_argument("--bump-scale", type=float, nargs="+", default=[1.0])
+    parser.add_argument(
+        "--xp-base", type=float, nargs="+", default=[player_module.XP_CURVE_BASE]
+    )
+    parser.add_argument(
+        "--xp-exponent",
+        type=float,
+        nargs="+",
+        default=[player_module.XP_CURVE_EXPONENT],
+    )
+    parser.add_argument("--max-depth", type=int, default=50)
+    parser.add_argument("--max-turns", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=25, help="runs per task")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=Path("sweep_results"))
+    args = parser.parse_args()
+
+    param_grid = [
+        SweepParams(*combo)
+        for combo in itertools.product(
+            args.npcs, args.bump_scale, args.xp_base, args.xp_exponent
+        )
+    ]
+    sweep(
+        param_grid,
+        runs=args.runs,
+        out_dir=args.out,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        base_seed=args.seed,
+        max_depth=args.max_depth,
+        max_turns=args.max_turns,
+    )
@@ -0,0 +1,147 @@
+"""Microbenchmark for the cached derived stats on Player, EquippedArmor and NPC
+
+Runs the same 1,000 round combat loop twice: once on the real Player and NPCs,
+and once on copies of how they were before the stats were cached (plain
+attributes, every derived stat computed on each read). The cached run pays
+for everything caching added on the write side too: the hp and level
+properties, Player's __setattr__ hook and the cache invalidation.
+
+Usage: python mapgame/bench_derived_stats.py
+"""
+import random
+import time
+
+from mapgame_pieces.alive import NPC
+from mapgame_pieces.headless import HeadlessGUI
+from mapgame_pieces.player import Player, ArmorPiece, ArmorSlot
+
+ROUNDS = 1000
+REPEATS = 20
+
+
+class BaselineAbilities:
+    def __init__(self):
+        self.passive_heal_double = False
+        self.reduced_humanity_loss = False
+
+    def to_save(self) -> dict:
+        return {key: val for key, val in self.__dict__.items() if val}
+
+
+class BaselineArmor:
+    def __init__(self, armor):
+        for slot in ArmorSlot:
+            setattr(self, slot.name, getattr(armor, slot.name))
+
+    @property
+    def armor_score(self) -> int:
+        total = 0
+        for slot in ArmorSlot:
+            this_slot = getattr(self, slot.name)
+            if this_slot:
+                total += this_slot.armor_amount
+        return total
+
+
+class BaselinePlayer:
+    """The stats the combat loop uses, as Player had them before caching"""
+
+    def __init__(self, player: Player):
+        self.max_hp = player.max_hp
+        self.hp = player.hp
+        self.level = player.level
+        self.xp = player.xp
+        self.tile_index = player.tile_index
+        self._humanity = player.humanity
+        self.flags = player.flags
+        self.abilities = BaselineAbilities()
+        self.armor = BaselineArmor(player.armor)
+
+    @property
+    def humanity(self) -> int:
+        return self._humanity
+
+    @property
+    def attack_power(self):
+        power = (self.level * 0.8) + 4
+        if self.flags.cursed_power:
+            power *= 1.1**self.flags.cursed_power
+        return int(power)
+
+    @property
+    def score(self):
+        return (
+            self.max_hp
+            + self.xp
+            + (self.level * 10)
+            + (self.tile_index * 20)
+            + (len(self.abilities.to_save()) * 20)
+            + self.humanity
+        )
+
+
+class BaselineNPC:
+    def __init__(self, npc: NPC):
+        self.hp = npc.hp
+        self.max_hp = npc.max_hp
+
+    @property
+    def hp_flavor(self):
+        ratio = self.hp / self.max_hp
+        if ratio == 1:
+            return "In perfect health"
+        if ratio >= 0.9:
+            return "In very good health"
+        if ratio >= 0.7:
+            return "In good health"
+        if ratio >= 0.5:
+            return "Slightly injured"
+        if ratio >= 0.3:
+            return "Significantly injured"
+        if ratio >= 0.15:
+            return "Critically injured"
+        return "On the verge of death"
+
+
+def make_combatants(cached: bool):
+    gui = HeadlessGUI()
+    player = Player(gui, save_path=None)
+    player.level = 12
+    player.flags.cursed_power = 2
+    for slot in ArmorSlot:
+        player.armor.equip(ArmorPiece(armor_slot=slot, armor_amount=3), gui)
+    hostiles = [NPC.hostile_from_level(12) for _ in range(3)]
+    if cached:
+        return player, hostiles
+    return BaselinePlayer(player), [BaselineNPC(hostile) for hostile in hostiles]
+
+
+def combat_loop(player, hostiles):
+    for _ in range(ROUNDS):
+        for hostile in hostiles:
+            # player swings, then the prompt and stats panel read everything again
+            hostile.hp = max(1, hostile.hp - player.attack_power // 4)
+            for _ in range(3):
+                hostile.hp_flavor, player.armor.armor_score, player.score
+        # the hostiles hit back
+        player.hp = max(1, player.hp - 1)
+        player.xp += 1
+
+
+def best_of(cached: bool) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        random.seed(0)
+        player, hostiles = make_combatants(cached)
+        start = time.perf_counter()
+        combat_loop(player, hostiles)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    uncached = best_of(cached=False)
+    cached = best_of(cached=True)
+    print(f"{ROUNDS} rounds, best of {REPEATS}")
+    print(f"before caching: {uncached * 1000:8.2f} ms")
+    print(f"cached:         {cached * 1000:8.2f} ms  ({uncached / cached:.1f}x faster)")
@@ -0,0 +1,185 @@
+"""Round-trip benchmark for the player save codecs
+
+Saves and loads a large synthetic player (every armor slot filled, every
+flag set, thousands of inventory entries) three ways: the old reflection
+over __dict__ with setattr on load, the generated schema codec through JSON,
+and the generated compact binary codec.
+
+Usage: python mapgame/bench_save_codec.py --items 5000
+"""
+import argparse
+import json
+import logging
+import time
+
+from mapgame_pieces.headless import HeadlessGUI
+from mapgame_pieces.player import (
+    Player,
+    ArmorPiece,
+    ArmorSlot,
+    ArmorModifier,
+    EquippedArmor,
+    Inventory,
+    Abilities,
+    Flags,
+    PLAYER_SCHEMA,
+)
+
+REPEATS = 200
+
+
+def make_player(n_items: int) -> Player:
+    gui = HeadlessGUI()
+    player = Player(gui, save_path=None)
+    player.level = 40
+    player.xp = 123_456
+    player.tile_index = 200
+    player.time = 98_765
+    for slot in ArmorSlot:
+        player.armor.equip(
+            ArmorPiece(armor_slot=slot, armor_amount=7, modifier=ArmorModifier.blessed),
+            gui,
+        )
+    player.abilities.passive_heal_double = True
+    player.abilities.reduced_humanity_loss = True
+    player.flags.humanity_warning_level = 3
+    player.flags.blessed_revive = 2
+    player.flags.cursed_revive = 5
+    player.flags.cursed_power = 1
+    for i in range(n_items):
+        player.inventory.add(f"Item {i}", i + 1)
+    return player
+
+
+def reflection_save(player: Player) -> dict:
+    """How saves were built before the schemas"""
+    save_data = {
+        "max_hp": player.max_hp,
+        "hp": player.hp,
+        "money": player.money,
+        "level": player.level,
+        "tile_index": player.tile_index,
+        "xp": player.xp,
+        "humanity": player.humanity,
+        "time": player.time,
+        "seed": player.seed,
+    }
+    armor = {}
+    for slot in ArmorSlot:
+        piece = getattr(player.armor, slot.name)
+        if piece is not None:
+            armor[slot.name] = {
+                k: v for k, v in piece.__dict__.items() if v is not None
+            }
+    parts = {
+        "abilities": {
+            k: v for k, v in player.abilities.__dict__.items() if v and k != "count"
+        },
+        "flags": {
+            k: v
+            for k, v in player.flags.__dict__.items()
+            if v and not k.startswith("_")
+        },
+        "armor": armor,
+        "inventory": player.inventory.contents,
+    }
+    save_data.update({k: v for k, v in parts.items() if v})
+    return save_data
+
+
+def reflection_load(player: Player, save_data: dict):
+    for entry, value in save_data.items():
+        if entry == "inventory":
+            player.inventory = Inventory(contents=value)
+        elif entry == "abilities":
+            abilities = Abilities()
+            for k, v in value.items():
+                setattr(abilities, k, v)
+            player.abilities = abilities
+        elif entry == "flags":
+            flags = Flags(on_change=player.invalidate_derived)
+            for k, v in value.items():
+                setattr(flags, k, v)
+            player.flags = flags
+        elif entry == "armor":
+            armor = EquippedArmor()
+            for slot, saved in value.items():
+                piece = ArmorPiece()
+                for k, v in saved.items():
+                    if k == "armor_slot":
+                        v = ArmorSlot(v)
+                    elif k == "modifier":
+                        v = ArmorModifier(v)
+                    setattr(piece, k, v)
+                setattr(armor, slot, piece)
+            player.armor = armor
+        elif entry == "humanity":
+            player._humanity = value
+        else:
+            setattr(player, entry, value)
+    player.invalidate_derived()
+
+
+def best_of(round_trip, player: Player, target: Player) -> tuple[float, int]:
+    best = float("inf")
+    size = 0
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        size = round_trip(player, target)
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+
+def reflection_json(player: Player, target: Player) -> int:
+    data = json.dumps(reflection_save(player))
+    reflection_load(target, json.loads(data))
+    return len(data)
+
+
+def schema_json(player: Player, target: Player) -> int:
+    data = json.dumps(player.save_data())
+    PLAYER_SCHEMA.decode(PLAYER_SCHEMA.migrate(json.loads(data)), target)
+    target.invalidate_derived()
+    return len(data)
+
+
+def schema_binary(player: Player, target: Player) -> int:
+    data = PLAYER_SCHEMA.pack(player)
+    PLAYER_SCHEMA.unpack(data, target)
+    target.invalidate_derived()
+    return len(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=5000, help="inventory entries")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    source = make_player(args.items)
+    expected = source.save_data()
+    print(f"{args.items} inventory entries, best of {REPEATS} round trips")
+    baseline = None
+    for label, round_trip in (
+        ("reflection + json", reflection_json),
+        ("schema + json", schema_json),
+        ("schema binary", schema_binary),
+    ):
+        target = Player(HeadlessGUI(), save_path=None)
+        elapsed, size = best_of(round_trip, source, target)
+        assert target.save_data() == expected, label
+        baseline = baseline or elapsed
+        print(
+            f"{label:<18} {elapsed * 1000:8.3f} ms  {size:>8} bytes"
+            f"  ({baseline / elapsed:.1f}x)"
+        )
+
+    # the same without the big inventory: what an ordinary save costs
+    source = make_player(5)
+    for label, round_trip in (
+        ("reflection + json", reflection_json),
+        ("schema + json", schema_json),
+        ("schema binary", schema_binary),
+    ):
+        elapsed, size = best_of(round_trip, source, Player(HeadlessGUI(), None))
+        print(f"small save, {label:<18} {elapsed * 1e6:8.1f} us  {size:>5} bytes")
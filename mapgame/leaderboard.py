@@ -0,0 +1,89 @@
+"""Show or export the runs recorded in the save database
+
+Usage:
+    python mapgame/leaderboard.py --top 20
+    python mapgame/leaderboard.py --profile alice
+    python mapgame/leaderboard.py --export runs.csv
+    python mapgame/leaderboard.py --bench 1000000
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from mapgame_pieces.player import SAVE_PATH
+from mapgame_pieces.save_store import SaveStore
+
+DB_PATH = SAVE_PATH.with_suffix(".mapdb")
+
+
+def print_runs(store: SaveStore, top: int, profile: str | None):
+    for rank, run in enumerate(store.leaderboard(top, profile), start=1):
+        ended = datetime.fromtimestamp(run.ended).strftime("%Y-%m-%d %H:%M")
+        print(
+            f"{rank:>4}. {run.score:>7}  {run.profile:<16} dimension #{run.depth:<4}"
+            f" level {run.level:<4} {run.turns:>6} turns  {ended}"
+        )
+
+
+def bench(n_runs: int, n_profiles: int, top: int):
+    """Fill a scratch database with random runs and time the leaderboard queries"""
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = SaveStore(Path(tmp_dir) / "bench.mapdb")
+        start = time.perf_counter()
+        per_profile = n_runs // n_profiles
+        for i in range(n_profiles):
+            store.record_runs(
+                f"profile{i}",
+                [
+                    (rng.randint(0, 5000), rng.randint(1, 60), 1, 1000, 0.0)
+                    for _ in range(per_profile)
+                ],
+            )
+        elapsed = time.perf_counter() - start
+        total = per_profile * n_profiles
+        print(f"inserted {total} runs in {elapsed:.1f}s ({total / elapsed:.0f}/s)")
+        for label, profile in (("overall", None), ("one profile", "profile0")):
+            start = time.perf_counter()
+            repeats = 1000
+            for _ in range(repeats):
+                store.leaderboard(top, profile)
+            elapsed = time.perf_counter() - start
+            print(f"top {top} {label}: {elapsed / repeats * 1e6:.0f} us per query")
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--profile", help="only this profile's runs")
+    parser.add_argument("--profiles", action="store_true", help="list the profiles")
+    parser.add_argument("--export", type=Path, help="write every run to a CSV file")
+    parser.add_argument(
+        "--bench",
+        type=int,
+        metavar="RUNS",
+        help="time the leaderboard on a scratch database of this many random runs",
+    )
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench, n_profiles=100, top=args.top)
+    elif not args.db.exists():
+        parser.error(f"{args.db} doesn't exist; play a game first")
+    else:
+        save_store = SaveStore(args.db)
+        if args.profiles:
+            for name, created, updated in save_store.profiles():
+                last_played = datetime.fromtimestamp(updated or created)
+                print(f"{name:<16} last played {last_played:%Y-%m-%d %H:%M}")
+        elif args.export:
+            with open(args.export, "w", newline="") as csv_file:
+                n_exported = save_store.export_runs(csv_file)
+            print(f"wrote {n_exported} runs to {args.export}")
+        else:
+            print_runs(save_store, args.top, args.profile)
@@ -0,0 +1,77 @@
+"""Roll a lot of chests and check the drop rates against the loot table
+
+Usage: python mapgame/loot_audit.py --level 7 --chests 1000000
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from mapgame_pieces.loot import LootEntry, LootTable, LOOT_TABLE_PATH
+
+
+def audit(table: LootTable, level: int, chests: int, seed: int | None) -> bool:
+    rng = random.Random(seed)
+    counts: Counter[str] = Counter()
+    rolled: set[LootEntry] = set()
+    qty_totals: Counter[str] = Counter()
+    start = time.perf_counter()
+    for _ in range(chests):
+        entry = table.roll_entry(level, rng)
+        counts[entry.label] += 1
+        rolled.add(entry)
+        if entry.kind != "armor":
+            qty_totals[entry.label] += rng.randint(*entry.qty_range(level))
+    elapsed = time.perf_counter() - start
+
+    first, last = table.band_of(level)
+    print(f"Level {level} (band {first}-{last}), {chests} chests")
+    print(f"{'loot':<16}{'expected':>10}{'observed':>10}{'sigma':>8}{'avg qty':>9}")
+    all_ok = True
+    for label, rate in sorted(table.expected_rates(level).items()):
+        observed = counts[label] / chests
+        # binomial standard deviation of the observed rate
+        stddev = math.sqrt(rate * (1 - rate) / chests) or 1
+        sigma = (observed - rate) / stddev
+        avg_qty = qty_totals[label] / counts[label] if qty_totals[label] else 1
+        flag = "" if abs(sigma) < 4 else "  <-- off"
+        all_ok = all_ok and not flag
+        print(
+            f"{label:<16}{rate:>10.4%}{observed:>10.4%}{sigma:>8.2f}{avg_qty:>9.2f}{flag}"
+        )
+    # the expected rates come from the same bands as the rolls, so also check
+    # what can drop against the entries themselves at this exact level
+    band_entries, _ = table.compile_band((first, last))
+    band_weight_level = table.band_level((first, last))
+    for entry in table.entries:
+        available = entry.available_at(level)
+        if entry in rolled and not available:
+            problem = "dropped but isn't available"
+        elif (
+            available
+            and entry not in band_entries
+            and entry.weight_at(band_weight_level) > 0
+        ):
+            problem = "is available but can't drop"
+        else:
+            continue
+        print(f"{entry.label} {problem} at level {level}  <-- off")
+        all_ok = False
+    print(f"{chests / elapsed:,.0f} chests/s")
+    return all_ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--level", type=int, default=1)
+    parser.add_argument("--chests", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--table", type=Path, default=LOOT_TABLE_PATH)
+    args = parser.parse_args()
+
+    loot_table = LootTable.from_file(args.table)
+    if not audit(loot_table, args.level, args.chests, args.seed):
+        sys.exit(1)
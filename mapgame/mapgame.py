@@ -1,26 +1,50 @@
+import argparse
+import hashlib
+import json
 import logging
 import random
+import struct
 from enum import Enum
 from dataclasses import dataclass, field
+from pathlib import Path
 
-from mapgame_pieces.player import Player, ArmorPiece, ArmorSlot
+from rich.text import Text
+
+from mapgame_pieces.player import Player, ArmorPiece, ArmorSlot, SAVE_PATH
 from mapgame_pieces.alive import NPC
-from mapgame_pieces.map import Map
+from mapgame_pieces.map import Map, Tile
 from mapgame_pieces.utils import (
     color_string,
     sanitize_input,
+    split_commands,
     get_plural_suffix,
     coordinates_from_direction,
+    derive_seed,
     COLOR_SCHEME,
 )
 from mapgame_pieces.gui import GUIWrapper
+from mapgame_pieces.headless import HeadlessGUI
 from mapgame_pieces.items import Item
+from mapgame_pieces.loot import LootTable
+from mapgame_pieces.recording import SessionRecorder
+from mapgame_pieces.styled_text import MARKUP_CACHE, styled, compose
+from mapgame_pieces.tile_codec import encode_tile, decode_tile
+from mapgame_pieces.tile_cache import TileCache
+from mapgame_pieces.tile_archive import TileArchive
 
 logger = logging.getLogger(__name__)
 
 INVALID_INPUT_MSG = color_string("Input not understood", "dim")
 MAP_WIDTH = 8
 MAP_HEIGHT = 4
+# >1 generates this many candidate tiles per dimension in parallel and keeps
+# the one closest to the level's difficulty target
+TILE_CANDIDATES = 1
+# seconds a portal trip may spend waiting on candidate tiles
+TILE_CANDIDATE_BUDGET = 0.5
+# journal the player's changes every this many turns
+AUTOSAVE_EVERY_TURNS = 5
+LEADERBOARD_SIZE = 10
 
 
 class GameState(Enum):
@@ -38,22 +62,191 @@ class CurrentInteraction:
 
 
 class Game:
-    def __init__(self):
-        self.gui = GUIWrapper(game=self)
-        self.player = Player(self.gui)
-        self.map = Map(self.gui, MAP_WIDTH, MAP_HEIGHT)
-        self.current_tile = self.map.get_tile(
+    def __init__(
+        self,
+        headless: bool = False,
+        save_path: Path | None = SAVE_PATH,
+        profile: str | None = None,
+        seed: int | None = None,
+    ):
+        """Set up a game and, unless `headless`, run the GUI until it exits
+
+        Args:
+            headless (bool): Skip the GUI; drive the game by calling play() directly
+            save_path (Path | None): Where to save the player, or None to never save
+            profile (str | None): Save to this profile in the save store instead
+                of to `save_path` itself
+            seed (int | None): Run seed for a new run; the same seed gives the same
+                dimensions. A saved run carries on with its own seed
+        """
+        self.gui = HeadlessGUI(game=self) if headless else GUIWrapper(game=self)
+        self.player = Player(self.gui, save_path=save_path, profile=profile, seed=seed)
+        if seed is not None and self.player.seed != seed:
+            logger.warning(f"Continuing a saved run; its seed is {self.player.seed}")
+        self.seed_streams()
+        self.map = Map(
+            self.gui,
+            MAP_WIDTH,
+            MAP_HEIGHT,
+            candidates=TILE_CANDIDATES,
+            candidate_budget=TILE_CANDIDATE_BUDGET,
+            # pre-generated tiles are kept next to the save
+            cache=TileCache(save_path.with_suffix(".tilecache")) if save_path else None,
+            seed=self.player.seed,
+        )
+        self.loot_table = LootTable.from_file()
+        # every dimension the player leaves this run, by profile
+        self.archive = (
+            TileArchive(
+                save_path.with_name(f"{self.player.profile}.maparchive"),
+                self.player.seed,
+            )
+            if save_path
+            else None
+        )
+        resumed_tile = self.load_tile()
+        self.current_tile = resumed_tile or self.map.get_tile(
             self.player.tile_index
         )  # self.map.tiles[self.player.tile_index]
+        self.map.prefetch(self.player.tile_index + 1)
         self.debug = False
         self.game_state = GameState.in_map
         self.interaction = CurrentInteraction()
-        self.gui.run()
+        self.recorder: SessionRecorder | None = None
+        if not headless:
+            if save_path:
+                # for replay.py; recordings are kept next to the save
+                self.recorder = SessionRecorder.start(
+                    save_path.parent / "recordings",
+                    self.player.profile,
+                    self.player.seed,
+                    self.player.save_data(),
+                    encode_tile(resumed_tile, self.player.coordinates)
+                    if resumed_tile
+                    else None,
+                )
+            self.gui.run()
+            if self.recorder:
+                self.recorder.close(self.state_hash())
+            self.map.close()
+            # don't leave with a save still queued
+            if self.player.journal:
+                self.player.journal.flush()
+
+    def seed_streams(self):
+        """Start the game's random streams from the run seed and the time"""
+        # combat and everything else get separate streams, so neither shifts the
+        # other (or the tiles, which have their own)
+        self.combat_rng = random.Random(
+            derive_seed(self.player.seed, "combat", self.player.time)
+        )
+        self.rng = random.Random(
+            derive_seed(self.player.seed, "game", self.player.time)
+        )
+
+    def seed_decoded_tile(self, tile: Tile):
+        """A decoded tile has no seed; start its NPCs' movement stream the way a
+        replay of this session will"""
+        tile.movement_rng = random.Random(
+            derive_seed(self.player.seed, "movement", tile.level, self.player.time)
+        )
+
+    def restore(self, player_data: dict, tile_data: bytes | None):
+        """Put the game back in the state a session started from, for replays"""
+        self.player.load_save_data(player_data)
+        self.map.seed = self.player.seed
+        # the session's map started out with only its first tile, not the one
+        # this game was set up with
+        self.map.forget()
+        self.seed_streams()
+        tile = self.resume_tile(tile_data) if tile_data else None
+        self.current_tile = tile or self.map.get_tile(self.player.tile_index)
+        if not tile:
+            self.player.x, self.player.y = (0, 0)
+        self.game_state = GameState.in_map
+        self.interaction = CurrentInteraction()
+
+    def state_hash(self) -> str:
+        """Digest of the player, the current tile and the game state"""
+        digest = hashlib.sha256(
+            json.dumps(self.player.save_data(), sort_keys=True).encode()
+        )
+        digest.update(encode_tile(self.current_tile, self.player.coordinates))
+        digest.update(self.game_state.name.encode())
+        return digest.hexdigest()[:16]
+
+    def save_tile(self):
+        """The current tile is saved alongside the player"""
+        if self.player.journal:
+            self.player.journal.write_tile(
+                encode_tile(self.current_tile, self.player.coordinates)
+            )
+
+    def load_tile(self) -> Tile | None:
+        """Resume the saved tile, if it's the dimension the player was last in"""
+        tile_data = self.player.journal.read_tile() if self.player.journal else None
+        if not tile_data:
+            return None
+        return self.resume_tile(tile_data)
+
+    def resume_tile(self, tile_data: bytes) -> Tile | None:
+        """Decode a saved tile and put the player back where they were in it"""
+        try:
+            tile, player_coordinates = decode_tile(tile_data, self.gui)
+        except (ValueError, struct.error) as exc:
+            logger.error("Error decoding tile save; generating a new tile")
+            logger.exception(exc)
+            return None
+        if tile.level != self.player.tile_index:
+            return None
+        self.seed_decoded_tile(tile)
+        self.player.x, self.player.y = player_coordinates
+        self.map.keep(tile)
+        return tile
+
+    def archive_tile(self):
+        """Keep the current dimension, as the player leaves it, in the archive"""
+        if self.archive:
+            self.archive.put(
+                self.player.tile_index,
+                encode_tile(self.current_tile, self.player.coordinates),
+            )
+
+    def open_archived_tile(self, dim_num: int) -> Tile | None:
+        """A dimension the player has already been to, as they left it"""
+        tile_data = self.archive.get(dim_num) if self.archive else None
+        if not tile_data:
+            return None
+        if self.recorder:
+            # the seed can't make this tile again, so a replay needs it as is
+            self.recorder.record_archived(dim_num, tile_data)
+        try:
+            tile, _ = decode_tile(tile_data, self.gui)
+        except (ValueError, struct.error) as exc:
+            logger.error(f"Error decoding archived dimension #{dim_num}")
+            logger.exception(exc)
+            return None
+        if tile.level != dim_num:
+            logger.error(f"Archived dimension #{dim_num} holds level {tile.level}")
+            return None
+        self.seed_decoded_tile(tile)
+        return tile
+
+    def revisit_tile(self, dim_num: int) -> Tile | None:
+        """A dimension the player has been to before: from the map if it still
+        has it, otherwise from the archive"""
+        tile = self.map.revisit(dim_num)
+        if tile is None:
+            tile = self.open_archived_tile(dim_num)
+            if tile is not None:
+                self.map.keep(tile)
+        return tile
 
     def _progress_time(self):
-        if random.randint(1, 6) == 1 and self.game_state == GameState.in_map:
+        if self.rng.randint(1, 6) == 1 and self.game_state == GameState.in_map:
             self.player._heal_over_time()
         self.player.time += 1
+        self.player.history.sample(self.player)
         for npc in self.current_tile.npcs:
             if (
                 npc not in self.interaction.in_combat_vs
@@ -77,6 +270,9 @@ class Game:
                     self._npc_entered_player_tile(npc, npc_action)
                 elif npc_action and previous_coordinates == self.player.coordinates:
                     self._npc_left_player_tile(npc, npc_action)
+        if not self.player.time % AUTOSAVE_EVERY_TURNS:
+            self.player.autosave()
+            self.save_tile()
 
     def _npc_left_player_tile(self, npc, direction):
         self.gui.main_out.add_line(f"The {npc.name_str} heads {direction}")
@@ -120,13 +316,15 @@ class Game:
         self.gui.main_out.add_line(
             f"You take a moment to reflect. Your current score is {color_string(str(self.player.score), 'score')}"
         )
-        self.gui.main_in.placeholder = random.choice(gui_choices)
+        self.gui.input_placeholder = random.choice(gui_choices)
         self.game_state = GameState.in_limbo
 
     def exit_limbo(self):
-        self.gui.main_in.placeholder = self.gui.default_input_placeholder
+        self.gui.input_placeholder = self.gui.default_input_placeholder
         self.game_state = GameState.in_map
         self.player.save_to_file()
+        self.player.export_history()
+        self.save_tile()
 
     def enter_conversation(self, npc: NPC):
         # self.gui.map_out.update("")
@@ -138,7 +336,7 @@ class Game:
         ]
         if random.random() < 0.2:
             gui_choices.append("70 to 93 percent of all communication is nonverbal")
-        self.gui.main_in.placeholder = random.choice(gui_choices)
+        self.gui.input_placeholder = random.choice(gui_choices)
         if self.interaction.in_conversation_with:
             raise RuntimeError(
                 f"Attempted to enter conversation, but player is already speaking with: {self.interaction.in_conversation_with}"
@@ -147,7 +345,7 @@ class Game:
         self.interaction.in_conversation_with = npc
 
     def end_conversation(self):
-        self.gui.main_in.placeholder = self.gui.default_input_placeholder
+        self.gui.input_placeholder = self.gui.default_input_placeholder
         self.gui.main_out.add_line("Time to continue exploring.")
         self.game_state = GameState.in_map
         self.interaction.in_conversation_with = None
@@ -168,7 +366,7 @@ class Game:
             gui_choices.append("psssh...nothing personnel...kid...")
             gui_choices.append("What is this, some kind of map-game?")
             gui_choices.append("You must construct additional pylons")
-        self.gui.main_in.placeholder = random.choice(gui_choices)
+        self.gui.input_placeholder = random.choice(gui_choices)
         if self.interaction.in_combat_vs:
             raise RuntimeError(
                 f"Attempted to enter combat, but player is already fighting: {self.interaction.in_combat_vs}"
@@ -184,7 +382,7 @@ class Game:
             self.gui.main_out.add_line(f"\nEntered combat with hostiles: {enemy_text}!")
 
     def end_combat(self):
-        self.gui.main_in.placeholder = self.gui.default_input_placeholder
+        self.gui.input_placeholder = self.gui.default_input_placeholder
         self.gui.main_out.add_line(
             "With combat behind you for now, it's time to keep exploring."
         )
@@ -198,11 +396,14 @@ class Game:
         min_dmg = int((base_dmg * 0.5) + 0.5)
         max_dmg = int(base_dmg * 1.5)
         for hostile in self.interaction.in_combat_vs:
-            act_dmg = random.randint(min_dmg, max_dmg)
-            self.gui.main_out.add_line(f"You take a swing at the {hostile.name_str}!")
-            dmg_txt = color_string(f"You do {act_dmg} damage", "damage_done")
+            act_dmg = self.combat_rng.randint(min_dmg, max_dmg)
+            # combat lines are built as Text: the numbers make them poor cache hits
+            self.gui.main_out.add_line(
+                compose("You take a swing at the ", hostile.name_text, "!")
+            )
+            dmg_txt = styled(f"You do {act_dmg} damage", "damage_done")
             dmg_flavor = self.get_dmg_flavor(act_dmg, min_dmg, base_dmg, max_dmg)
-            self.gui.main_out.add_line(f"{dmg_txt} - {dmg_flavor}")
+            self.gui.main_out.add_line(compose(dmg_txt, " - ", dmg_flavor))
             if self.debug:
                 self.gui.main_out.add_line(f"DEBUG: ({min_dmg}-{max_dmg} dmg)")
             if hostile.take_damage(act_dmg):
@@ -214,19 +415,19 @@ class Game:
                 )
                 self.player.humanity += 1
 
-    def get_dmg_flavor(self, act_dmg, min_dmg, base_dmg, max_dmg):
+    def get_dmg_flavor(self, act_dmg, min_dmg, base_dmg, max_dmg) -> Text:
         dmg_range = max_dmg - min_dmg
         diff_from_base = base_dmg - act_dmg
         if abs(diff_from_base) <= (dmg_range // 5):
-            flavor_txt = color_string("an average hit!", "grey78")
+            flavor_txt = styled("an average hit!", "grey78")
         elif act_dmg == max_dmg:
-            flavor_txt = color_string("a critical hit!!", "wheat1")
+            flavor_txt = styled("a critical hit!!", "wheat1")
         elif act_dmg > base_dmg:
-            flavor_txt = color_string("a good hit!", "grey85")
+            flavor_txt = styled("a good hit!", "grey85")
         elif act_dmg == min_dmg:
-            flavor_txt = color_string("a very weak hit!!", "grey50")
+            flavor_txt = styled("a very weak hit!!", "grey50")
         else:
-            flavor_txt = color_string("a glancing hit!", "grey62")
+            flavor_txt = styled("a glancing hit!", "grey62")
         return flavor_txt
 
     def shoot_attack_hostiles(self):
@@ -234,16 +435,16 @@ class Game:
         base_dmg = 10 + self.player.level
         min_dmg = int((base_dmg * 0.5) + 0.5)
         max_dmg = int(base_dmg * 1.5)
-        act_dmg = random.randint(min_dmg, max_dmg)
-        hit = random.randint(0, 100) <= self.player.gun_aiming
-        hostile = random.choice(self.interaction.in_combat_vs)
+        act_dmg = self.combat_rng.randint(min_dmg, max_dmg)
+        hit = self.combat_rng.randint(0, 100) <= self.player.gun_aiming
+        hostile = self.combat_rng.choice(self.interaction.in_combat_vs)
         self.gui.main_out.add_line(
-            f"You aim at the {hostile.name_str} and pull the trigger!"
+            compose("You aim at the ", hostile.name_text, " and pull the trigger!")
         )
         if hit:
             dmg_flavor = self.get_dmg_flavor(act_dmg, min_dmg, base_dmg, max_dmg)
-            dmg_txt = color_string(f"{act_dmg} damage", "damage_done")
-            self.gui.main_out.add_line(f"You do {dmg_txt} - {dmg_flavor}")
+            dmg_txt = styled(f"{act_dmg} damage", "damage_done")
+            self.gui.main_out.add_line(compose("You do ", dmg_txt, " - ", dmg_flavor))
             if self.debug:
                 self.gui.main_out.add_line(f"DEBUG: ({min_dmg}-{max_dmg} dmg)")
             if hostile.take_damage(act_dmg):
@@ -278,7 +479,7 @@ class Game:
             case "run" | "r":
                 success_chance = 0.7 + (self.player.level / 100)
                 success_chance = min(success_chance, 100)
-                if random.random() < success_chance:
+                if self.combat_rng.random() < success_chance:
                     self.gui.main_out.add_line("You run away!")
                     self.end_combat()
                     return
@@ -294,7 +495,7 @@ class Game:
             if hostile.is_dead:
                 out_of_combat.append(hostile)
                 self.player.grant_xp(hostile.xp_reward)
-                self.player.grant_money(random.randint(1, hostile.xp_reward))
+                self.player.grant_money(self.combat_rng.randint(1, hostile.xp_reward))
                 self.current_tile.npcs.remove(hostile)
             elif hostile.player_attitude > 0:
                 out_of_combat.append(hostile)
@@ -320,10 +521,10 @@ class Game:
         base_dmg = hostile.attack_power
         min_dmg = int((base_dmg * 0.7) + 0.5)
         max_dmg = int(base_dmg * 1.3)
-        act_dmg = random.randint(min_dmg, max_dmg)
+        act_dmg = self.combat_rng.randint(min_dmg, max_dmg)
         dmg_flavor = self.get_dmg_flavor(act_dmg, min_dmg, base_dmg, max_dmg)
         self.gui.main_out.add_line(
-            f"The {hostile.name_str} attacks you, scoring {dmg_flavor}"
+            compose("The ", hostile.name_text, " attacks you, scoring ", dmg_flavor)
         )
         # dmg_txt = color_string(f"{act_dmg} damage", 'damage')
         # self.gui.main_out.add_line(
@@ -331,7 +532,7 @@ class Game:
         # )
         if self.debug:
             self.gui.main_out.add_line(f"DEBUG: ({min_dmg}-{max_dmg}) enemy dmg")
-        if self.player.take_damage(act_dmg):
+        if self.player.take_damage(act_dmg, self.combat_rng):
             # player 'died'
             self.interaction.combat_revive_count += 1
             if self.interaction.combat_revive_count >= 3:
@@ -367,15 +568,7 @@ class Game:
         self.end_combat()
 
     def get_chest_contents(self) -> tuple[str | ArmorPiece, int]:
-        match random.randint(1, 3):
-            case 1:
-                return "Bullet", random.randint(3, int(self.player.tile_index / 2) + 3)
-            case 2:
-                min_money = int(self.player.tile_index * 1.2) + 3
-                max_money = int(self.player.tile_index * 2) + 8
-                return "money", random.randint(min_money, max_money)
-            case 3:
-                return ArmorPiece.random_from_level(self.player.tile_index), 1
+        return self.loot_table.roll(self.player.tile_index, self.rng)
 
     def open_chest(self, debug=False):
         # here's the real stuff
@@ -416,6 +609,7 @@ class Game:
         logger.debug(f"player inventory contents: {self.player.inventory.contents}")
 
     def portal_into_another_dimension(self, dim_num=None):
+        self.archive_tile()
         # heal up to ~15% health
         self.player.heal_up_to(int(self.player.max_hp / 6))
         if dim_num is None:
@@ -429,14 +623,15 @@ class Game:
             self.player.humanity = 1
         else:
             self.player.humanity -= hostile_npc_count
-        self.player.grant_xp(dim_num * 3 + random.randint(4, 10))
-        self.current_tile = self.map.get_tile(dim_num)
+        self.player.grant_xp(dim_num * 3 + self.rng.randint(4, 10))
+        self.current_tile = self.revisit_tile(dim_num) or self.map.get_tile(dim_num)
         self.player.x, self.player.y = (0, 0)
         if not self.player.tile_index % 5:
             # we'll safe after exiting limbo
             self.enter_limbo()
         else:
             self.player.save_to_file()
+            self.save_tile()
 
     def maybe_encounter_npc(self):
         # Should we encounter an NPC?
@@ -453,7 +648,7 @@ class Game:
         elif other_npcs:
             conversation_npcs = [x for x in other_npcs if not x.conversation.has_ended]
             if conversation_npcs:
-                convo_npc = random.choice(conversation_npcs)
+                convo_npc = self.rng.choice(conversation_npcs)
                 self.gui.main_out.add_line(
                     f"The {convo_npc.name_str} in this room strikes up a conversation with you!"
                 )
@@ -598,6 +793,24 @@ class Game:
             self.player.flags.cursed_revive += 4
             self.player.flags.cursed_power += 1
 
+    def show_leaderboard(self):
+        if not self.player.store:
+            self.gui.main_out.add_line("Scores aren't kept when the game isn't saved.")
+            return
+        runs = self.player.store.leaderboard(LEADERBOARD_SIZE)
+        if not runs:
+            self.gui.main_out.add_line("Nobody has finished a run yet.")
+            return
+        self.gui.main_out.add_line(color_string("Leaderboard", "score"))
+        for rank, run in enumerate(runs, start=1):
+            line = f"{rank:>2}. {run.score:>6}  {run.profile} (dimension #{run.depth}, level {run.level})"
+            if run.profile == self.player.profile:
+                line = color_string(line, "good_thing_maybe")
+            self.gui.main_out.add_line(line)
+        self.gui.main_out.add_line(
+            f"Your current score is {color_string(str(self.player.score), 'score')}"
+        )
+
     def get_current_room_name(self) -> str | None:
         """Return the name of the room the player is currently in"""
         if self.player.coordinates in self.current_tile.rooms:
@@ -637,7 +850,7 @@ class Game:
                 if self.player.coordinates not in self.current_tile.explored:
                     # heal when entering new rooms
                     self.player._heal_over_time()
-                self.current_tile.explored.add(self.player.coordinates)
+                self.current_tile.explore(self.player.coordinates)
                 self._progress_time()
             else:
                 self.gui.main_out.add_line("You can't move that way.")
@@ -701,6 +914,14 @@ class Game:
             else:
                 self.gui.main_out.add_line(INVALID_INPUT_MSG)
                 return
+        elif command in ["leaderboard", "scores", "highscores"]:
+            self.show_leaderboard()
+        elif command == "seed":
+            seed_txt = color_string(str(self.player.seed), "main_command")
+            self.gui.main_out.add_line(
+                f"This run's seed is {seed_txt}. Start a new run with --seed {seed_txt}"
+                " to play the same dimensions."
+            )
         elif command in ["armor"]:
             no_armor = True
             for slot in ArmorSlot:
@@ -740,10 +961,17 @@ class Game:
                 return
             if self.current_tile._check_valid_coords(tc):
                 self.player.x, self.player.y = tc
-                self.current_tile.explored.add(self.player.coordinates)
+                self.current_tile.explore(self.player.coordinates)
                 self.gui.main_out.add_line("poof~")
             else:
                 self.gui.main_out.add_line("off-map coordinates not allowed")
+        elif self.debug and command == "markup":
+            self.gui.main_out.add_line(MARKUP_CACHE.summary())
+        elif self.debug and command == "dims":
+            dims = self.archive.dimensions() if self.archive else []
+            self.gui.main_out.add_line(
+                f"{len(dims)} archived dimensions: {dims[:20]}{'...' if len(dims) > 20 else ''}"
+            )
         elif self.debug and command == "npc":
             self.gui.main_out.add_line("hihi~")
             self.gui.main_out.add_line(
@@ -786,6 +1014,28 @@ class Game:
         # after that, check to see if we're in combat
         self.maybe_encounter_npc()
 
+    def play_line(self, line: str):
+        """Play everything typed in one go, which can chain commands ("n n e",
+        "3n", "n;e;open"). The chain stops as soon as the game state changes, e.g.
+        when combat starts, or on going through a portal"""
+        if self.game_state == GameState.in_conversation:
+            # say it as typed
+            self.play(line)
+            return
+        commands = split_commands(line)
+        for played, command in enumerate(commands, start=1):
+            state = self.game_state
+            portalled = self.play(command)
+            if played < len(commands) and (portalled or self.game_state != state):
+                skipped = len(commands) - played
+                self.gui.main_out.add_line(
+                    color_string(
+                        f"(skipped {skipped} more command{'s' if skipped > 1 else ''})",
+                        "dim",
+                    )
+                )
+                return
+
     def play(self, command: str) -> bool | None:
         """Route input to where it needs to go depending on current game state
 
@@ -795,6 +1045,8 @@ class Game:
         Returns:
             bool | None: True iff you portal into another dimension
         """
+        if self.recorder:
+            self.recorder.record(command)
         self.gui.main_out.add_line("")
         command = sanitize_input(command)
         match self.game_state:
@@ -805,7 +1057,7 @@ class Game:
             case GameState.in_conversation:
                 convo = self.interaction.in_conversation_with.conversation
                 assert convo
-                out = convo.respond(self.player, command)
+                out = convo.respond(self.player, command, self.rng)
                 self.gui.main_out.add_line(out)
                 if convo.has_ended:
                     self.end_conversation()
@@ -825,8 +1077,19 @@ if __name__ == "__main__":
         # handlers=[RichHandler(rich_tracebacks=False)],
     )
 
+    parser = argparse.ArgumentParser(description="Text based map game")
+    parser.add_argument(
+        "--profile", help="play as this profile; profiles share one save database"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="start a new run from this seed, e.g. a seed of the day",
+    )
+    args = parser.parse_args()
+
     logger.info("\n________________\nInitialized mapgame logger; beginning game...")
     # g = Game()
-    game = Game()
+    game = Game(profile=args.profile, seed=args.seed)
 
     logger.info("\n________________\nGame Over")
@@ -1,16 +1,26 @@
 import random
 import logging
+from functools import cached_property
 from mapgame_pieces.conversations import Conversation, NoConversation
 from mapgame_pieces.utils import color_string
+from mapgame_pieces.styled_text import styled
 
 logger = logging.getLogger(__name__)
+# chance per level for each successive level bump a hostile NPC can roll
+HOSTILE_LEVEL_BUMP_CHANCES = (0.04, 0.03, 0.02, 0.01)
 
 
 class LivingThing:
     """Base class for anything that moves around, has hp, etc"""
 
+    # cached_property stats to throw away when each of hp, max_hp and level
+    # changes; only the ones derived from it, so e.g. taking damage doesn't
+    # throw away a stat that only depends on level
+    _derived_from: dict[str, tuple[str, ...]] = {}
+
     def __init__(self):
         self.is_dead = False
+        self._hp = self._max_hp = self._level = 0
         self.max_hp = 20
         self.hp = self.max_hp
         self.x = 0
@@ -19,6 +29,44 @@ class LivingThing:
         self.attack_power_base = 1
         self.level = 1
 
+    def invalidate_derived(self, changed: str | None = None):
+        """Drop the cached stats derived from `changed`, or all of them, so
+        they're recomputed on next access"""
+        if changed is None:
+            for names in self._derived_from.values():
+                for name in names:
+                    self.__dict__.pop(name, None)
+            return
+        for name in self._derived_from.get(changed, ()):
+            self.__dict__.pop(name, None)
+
+    @property
+    def hp(self) -> int:
+        return self._hp
+
+    @hp.setter
+    def hp(self, val: int):
+        self._hp = val
+        self.invalidate_derived("hp")
+
+    @property
+    def max_hp(self) -> int:
+        return self._max_hp
+
+    @max_hp.setter
+    def max_hp(self, val: int):
+        self._max_hp = val
+        self.invalidate_derived("max_hp")
+
+    @property
+    def level(self) -> int:
+        return self._level
+
+    @level.setter
+    def level(self, val: int):
+        self._level = val
+        self.invalidate_derived("level")
+
     def _heal_over_time(self):
         if self.hp < self.max_hp:
             self.hp += 1
@@ -62,6 +110,8 @@ class LivingThing:
 class NPC(LivingThing):
     """NPC wander around, open chests, and engage the player in combat."""
 
+    _derived_from = {"hp": ("hp_flavor",), "max_hp": ("hp_flavor",)}
+
     def __init__(self, name: str):
         super().__init__()
         self.name = name
@@ -74,7 +124,7 @@ class NPC(LivingThing):
         self.is_dead = False
         self.conversation: Conversation | None = None
 
-    @property
+    @cached_property
     def hp_flavor(self):
         ratio = self.hp / self.max_hp
         if ratio == 1:
@@ -99,8 +149,15 @@ class NPC(LivingThing):
             color = "hostile_name"
         return color_string(self.name, color)
 
+    @property
+    def name_text(self):
+        """name_str as Text, for compose()"""
+        return styled(
+            self.name, "friendly_name" if self.player_attitude > 0 else "hostile_name"
+        )
+
     @classmethod
-    def hostile_from_level(cls, level: int):
+    def hostile_from_level(cls, level: int, rng=random):
         adjs = [
             "spooky",
             "scary",
@@ -124,45 +181,38 @@ class NPC(LivingThing):
             "miscreant",
             "vagabond",
         ]
-        name = random.choice(adjs) + " " + random.choice(nouns)
+        name = rng.choice(adjs) + " " + rng.choice(nouns)
         max_level = int(level * 1.25 + 2)
         if (
             name in ("evil villain", "wayward vagabond", "spooky skeleton")
             or "dangerous" in name
         ):
             level += 1
-        if random.random() < (0.04 * level):
-            level += 1
-        if random.random() < (0.03 * level):
-            level += 1
-        if random.random() < (0.02 * level):
-            level += 1
-        if random.random() < (0.01 * level):
-            level += 1
+        for bump_chance in HOSTILE_LEVEL_BUMP_CHANCES:
+            if rng.random() < (bump_chance * level):
+                level += 1
         level = min(level, max_level)
-        return cls._generate_from_level(name, level)
+        return cls._generate_from_level(name, level, rng)
 
     @classmethod
-    def friendly_from_level(cls, level: int):
-        adj = random.choice(["old", "young", "bald", "spirited", "steadfast", "calm"])
-        noun = random.choice(["man", "woman", "person", "human", "wanderer"])
+    def friendly_from_level(cls, level: int, rng=random):
+        adj = rng.choice(["old", "young", "bald", "spirited", "steadfast", "calm"])
+        noun = rng.choice(["man", "woman", "person", "human", "wanderer"])
         name = adj + " " + noun
-        inst = cls._generate_from_level(name, level)
+        inst = cls._generate_from_level(name, level, rng)
         inst.player_attitude = 1
         return inst
 
     @classmethod
-    def _generate_from_level(cls, name: str, level: int) -> "NPC":
+    def _generate_from_level(cls, name: str, level: int, rng=random) -> "NPC":
         logger.info(f"Generating level {level} NPC {name}")
         inst = cls(name)
         inst.level = level
-        hp_base = random.randint(15, 20)
-        hp_level_multi = random.uniform(4.5, 5.5)
+        hp_base = rng.randint(15, 20)
+        hp_level_multi = rng.uniform(4.5, 5.5)
         inst.max_hp = hp_base + int(level * hp_level_multi)
         inst.hp = inst.max_hp
-        attack_modifier = random.randint(1, 3) + random.randint(
-            0, random.randint(1, level)
-        )
+        attack_modifier = rng.randint(1, 3) + rng.randint(0, rng.randint(1, level))
         inst.attack_power_base = level + attack_modifier
         inst.xp_reward = int(inst.attack_power_base * 0.9) + int(inst.max_hp / 8)
         # inst.attack_type = random.choice(['ranged', 'melee'])
@@ -181,11 +231,12 @@ class NPC(LivingThing):
             tile.chests.remove((self.x, self.y))
             self.max_hp = int(self.max_hp * 1.09)
         elif self.wander:
-            if random.random() < 0.5:
+            # the tile's own stream, so wandering can't shift generation or combat
+            if tile.movement_rng.random() < 0.5:
                 # chance to not wander
                 return
             move_options = ["n", "s", "e", "w"]
-            random.shuffle(move_options)
+            tile.movement_rng.shuffle(move_options)
             mv_choice = move_options.pop()
             move = None
             while not move:  # try to move until it works
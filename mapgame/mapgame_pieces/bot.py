@@ -0,0 +1,106 @@
+import logging
+from collections import deque
+
+from mapgame_pieces.conversations import RiddleConvo
+from mapgame_pieces.map import Tile, Coordinates
+
+logger = logging.getLogger(__name__)
+
+
+class Bot:
+    """Plays the game by picking a command for whatever state it's in.
+
+    Walks (with full knowledge of the map) to the nearest chest while healthy,
+    otherwise heads for the portal. Fights everything with melee, shooting
+    when outnumbered.
+    """
+
+    def __init__(self, game, chest_hp_ratio: float = 0.5):
+        self.game = game
+        self.chest_hp_ratio = chest_hp_ratio  # only go for chests above this hp
+        self._neighbors_for: Tile | None = None
+        self._neighbors: dict[Coordinates, list[tuple[str, Coordinates]]] = {}
+
+    def next_command(self) -> str:
+        match self.game.game_state.name:
+            case "in_combat":
+                return self.combat_command()
+            case "in_conversation":
+                return self.conversation_command()
+            case "in_limbo":
+                return self.limbo_command()
+            case _:
+                return self.map_command()
+
+    def combat_command(self) -> str:
+        hostiles = self.game.interaction.in_combat_vs
+        if len(hostiles) > 1 and self.game.player.inventory.get_item_qty("Bullet"):
+            return "shoot"
+        return "melee"
+
+    def conversation_command(self) -> str:
+        convo = self.game.interaction.in_conversation_with.conversation
+        if isinstance(convo, RiddleConvo):
+            return convo.correct_answers[0]
+        return "thanks"
+
+    def limbo_command(self) -> str:
+        player = self.game.player
+        if player.humanity < 80 and player.money >= 10:
+            return "pay"
+        return "continue"
+
+    def map_command(self) -> str:
+        player = self.game.player
+        tile = self.game.current_tile
+        room = self.game.get_current_room_name()
+        if player.coordinates in tile.chests:
+            return "open"
+        if room == "medbay" and player.hp < player.max_hp * 0.6:
+            return "heal"
+        if room == "portal" and not self._wants_chests():
+            return "portal"
+        targets = tile.chests if self._wants_chests() else set()
+        if not targets:
+            targets = {
+                coords for coords, room in tile.rooms.items() if room.name == "portal"
+            }
+        return self._step_towards(player.coordinates, targets) or "portal"
+
+    def _wants_chests(self) -> bool:
+        player = self.game.player
+        return bool(self.game.current_tile.chests) and (
+            player.hp >= player.max_hp * self.chest_hp_ratio
+        )
+
+    def _neighbors_of(self, coords: Coordinates) -> list[tuple[str, Coordinates]]:
+        tile = self.game.current_tile
+        if self._neighbors_for is not tile:
+            self._neighbors_for = tile
+            self._neighbors = {}
+            for c1, c2 in tile.paths:
+                if c2[0] > c1[0]:
+                    self._neighbors.setdefault(c1, []).append(("e", c2))
+                    self._neighbors.setdefault(c2, []).append(("w", c1))
+                else:
+                    self._neighbors.setdefault(c1, []).append(("s", c2))
+                    self._neighbors.setdefault(c2, []).append(("n", c1))
+        return self._neighbors.get(coords, [])
+
+    def _step_towards(self, start: Coordinates, targets: set) -> str | None:
+        """First move of a shortest path to the nearest target"""
+        if start in targets:
+            return None
+        first_step: dict[Coordinates, str | None] = {start: None}
+        queue = deque([start])
+        while queue:
+            coords = queue.popleft()
+            for direction, neighbor in self._neighbors_of(coords):
+                if neighbor in first_step:
+                    continue
+                first_step[neighbor] = first_step[coords] or direction
+                if neighbor in targets:
+                    return first_step[neighbor]
+                queue.append(neighbor)
+        logger.debug(f"Bot found no path from {start} to {targets}")
+        return None
@@ -27,7 +27,7 @@ class Conversation:
         """Wrap in quotes and print to main_out"""
         return color_string(f'"{quote}"', "dialogue")
 
-    def respond(self, player: "Player", to_say: str) -> str:
+    def respond(self, player: "Player", to_say: str, rng=random) -> str:
         ...
 
 
@@ -52,7 +52,7 @@ class WisdomConvo(Conversation):
         else:
             return self.wrap_in_quotes("Be careful out there!")
 
-    def respond(self, player: "Player", to_say: str) -> str:
+    def respond(self, player: "Player", to_say: str, rng=random) -> str:
         if to_say in LEAVE_OPTIONS or self.given_wisdom:
             if self.exit_conversation():
                 return self.wrap_in_quotes("Good luck on your journey.")
@@ -75,7 +75,7 @@ class WisdomConvo(Conversation):
             possible_wisdom.append("reduced_humanity_loss")
 
         msg_1 = f"The {self.npc.name_str}'s wisdom "
-        match random.choice(possible_wisdom):
+        match rng.choice(possible_wisdom):
             case "xp":
                 player.grant_xp(player.level * 4 + 10)
                 msg_2 = "gives you a sense of experience!"
@@ -109,7 +109,7 @@ class BuffConvo(Conversation):
         else:
             return self.wrap_in_quotes("That should help you out. Good luck out there.")
 
-    def respond(self, player: "Player", to_say: str) -> str:
+    def respond(self, player: "Player", to_say: str, rng=random) -> str:
         if to_say in LEAVE_OPTIONS or self.given_buff:
             if self.exit_conversation():
                 if to_say in THANKS:
@@ -131,11 +131,11 @@ class BuffConvo(Conversation):
         elif player.max_hp - player.hp > 20:
             possible_buffs.append("heal")
 
-        good_adj = random.choice(["strange", "unknown", "peculiar", "unfamiliar"])
+        good_adj = rng.choice(["strange", "unknown", "peculiar", "unfamiliar"])
         out_msg = (
             f"The {self.npc.name} chants in a low voice in a {good_adj} language.\n"
         )
-        match random.choice(possible_buffs):
+        match rng.choice(possible_buffs):
             case "bless_res":
                 player.flags.blessed_revive += 1
                 return out_msg + color_string(
@@ -178,7 +178,7 @@ class CurseConvo(Conversation):
                 "Hah! That should 'help' you. Have fun out there."
             )
 
-    def respond(self, player: "Player", to_say: str) -> str:
+    def respond(self, player: "Player", to_say: str, rng=random) -> str:
         if to_say in LEAVE_OPTIONS or self.given_curse:
             if self.exit_conversation():
                 if to_say in THANKS:
@@ -197,13 +197,13 @@ class CurseConvo(Conversation):
             possible_curses.append("humanity_down")
 
         bad_adj = color_string(
-            random.choice(["malevolent", "uncanny", "eerie", "twisted"]),
+            rng.choice(["malevolent", "uncanny", "eerie", "twisted"]),
             "humanity_down",
         )
         out_msg = (
             f"The {self.npc.name} chants in a low voice in a {bad_adj} language!\n"
         )
-        match random.choice(possible_curses):
+        match rng.choice(possible_curses):
             case "curse_res":
                 player.flags.cursed_revive += 2
                 return out_msg + color_string(
@@ -253,7 +253,7 @@ class IntroConvo(Conversation):
         elif self.stage == 5:
             return self.wrap_in_quotes("Anyway, take care!")
 
-    def respond(self, player: "Player", to_say: str) -> str:
+    def respond(self, player: "Player", to_say: str, rng=random) -> str:
         if to_say in LEAVE_OPTIONS:
             if self.exit_conversation():
                 return self.wrap_in_quotes("Be safe out there.")
@@ -280,7 +280,7 @@ class TestConversation(Conversation):
         else:
             return self.wrap_in_quotes("Yeah I get it.")
 
-    def respond(self, player: "Player", to_say: str) -> str:
+    def respond(self, player: "Player", to_say: str, rng=random) -> str:
         if to_say in LEAVE_OPTIONS:
             if self.exit_conversation():
                 return self.wrap_in_quotes("Hey, where are you going?")
@@ -296,7 +296,7 @@ class TestConversation(Conversation):
         elif self.stage < 3:
             if to_say:
                 self.stage += 1
-                resp = random.choice(
+                resp = rng.choice(
                     ["Uh-huh...", "I see...", "Wow...", "Cool...", "Neat..."]
                 )
                 return self.wrap_in_quotes(resp)
@@ -327,7 +327,7 @@ class RiddleConvo(Conversation):
         else:
             return self.wrap_in_quotes(f"Try my riddle again! {self.riddle_text}")
 
-    def respond(self, player: "Player", to_say: str) -> str:
+    def respond(self, player: "Player", to_say: str, rng=random) -> str:
         if not to_say:
             return ""
         elif to_say in LEAVE_OPTIONS:
@@ -1,7 +1,33 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
 from textual.app import App, ComposeResult
+from textual.geometry import Region, Size
+from textual.widget import Widget
 from textual.widgets import Header, Static, Input, TextLog
+from rich.segment import Segment
+from rich.style import Style
 from rich.text import Text
-from mapgame_pieces.utils import color_string
+from mapgame_pieces.utils import color_string, COLOR_SCHEME
+from mapgame_pieces.scrollback import ScrollbackSpill
+from mapgame_pieces.styled_text import to_text, styled, compose
+from mapgame_pieces.turn_worker import TurnWorker
+from mapgame_pieces.minimap import MAP_PANEL_COLUMNS, MAP_PANEL_ROWS
+from mapgame_pieces.latency import LatencyTracker
+
+# rendered lines of output kept in memory; older turns are re-read from disk
+SCROLLBACK_LINES = 1000
+# turns read back from disk at a time when scrolling past what's in memory
+SCROLLBACK_CHUNK = 25
+# a turn taking longer than this (seconds) shows THINKING in the input box
+THINKING_DELAY = 0.25
+THINKING = "thinking…"
+# stat history sparklines in the stats panel: (stat, label), and samples shown
+SPARKLINES = (("hp", "HP"), ("humanity", "Hum"), ("xp", "XP"), ("money", "$"))
+SPARKLINE_WIDTH = 28
 
 
 def make_15_chars_long(string: str) -> str:
@@ -12,26 +38,302 @@ def make_15_chars_long(string: str) -> str:
 
 
 class OutputWindow(TextLog):
-    def add_line(self, new_content: str):
-        self.write(Text.from_markup(new_content))
+    """TextLog that holds lines back until flush(), at the end of each turn, and
+    then writes them all at once: one render, one scroll
+
+    Only the last `scrollback_lines` rendered lines are kept in memory. Every
+    turn is also appended to a spill file, and scrolling to either end of what's
+    in memory reads the next turns from it, so memory and layout cost stay flat
+    however long the session runs.
+    """
+
+    def __init__(self, *args, scrollback_lines: int = SCROLLBACK_LINES, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending: list[str | Text] = []
+        self.scrollback_lines = scrollback_lines
+        self.spill = ScrollbackSpill()
+        # self.lines holds spill records [_first, _first + len(_heights)), and
+        # _heights has how many rendered lines each of them took
+        self._first = 0
+        self._heights: deque[int] = deque()
+        self._loading = False
+
+    @property
+    def following(self) -> bool:
+        """True when the newest turn is in memory"""
+        return self._first + len(self._heights) == len(self.spill)
+
+    def add_line(self, new_content: str | Text):
+        self._pending.append(new_content)
+
+    def flush(self):
+        """Write out every line added since the last flush"""
+        if not self._pending:
+            return
+        # markup lines repeat a lot, so they're parsed one by one through the cache
+        text = Text("\n").join(to_text(line) for line in self._pending)
+        self._pending.clear()
+        if not self.following:
+            self._show_newest()
+        self.spill.append(text.markup)
+        self._append(self._render(text))
+        self.scroll_end(animate=False, speed=100)
+
+    def _render(self, text: Text) -> list[list[Segment]]:
+        # the same options TextLog.write renders with
+        console = self.app.console
+        width = max(self.min_width, self.size.width or self.min_width)
+        options = console.options.update_width(width)
+        if not self.wrap:
+            options = options.update(overflow="ignore", no_wrap=True)
+        return list(Segment.split_lines(console.render(text, options.update_width(80))))
+
+    def _read(self, start: int, stop: int) -> list[list[list[Segment]]]:
+        return [self._render(Text.from_markup(m)) for m in self.spill.read(start, stop)]
+
+    def _append(self, lines: list[list[Segment]]) -> int:
+        """Add one turn at the bottom; returns how many lines fell off the top"""
+        self.lines.extend(lines)
+        self._heights.append(len(lines))
+        self.max_width = max(
+            [self.max_width] + [sum(s.cell_length for s in line) for line in lines]
+        )
+        dropped = 0
+        while len(self._heights) > 1 and len(self.lines) > self.scrollback_lines:
+            height = self._heights.popleft()
+            del self.lines[:height]
+            self._first += 1
+            dropped += height
+        # keeps _line_cache keys pointing at the same lines
+        self._start_line += dropped
+        self.virtual_size = Size(self.max_width, len(self.lines))
+        return dropped
+
+    def _prepend(self, turns: list[list[list[Segment]]], trim: bool = True) -> int:
+        """Add older turns at the top; returns how many lines were added"""
+        added = [line for lines in turns for line in lines]
+        self.lines[:0] = added
+        self._heights.extendleft(len(lines) for lines in reversed(turns))
+        self._first -= len(turns)
+        self.max_width = max(
+            [self.max_width] + [sum(s.cell_length for s in line) for line in added]
+        )
+        while (
+            trim and len(self._heights) > 1 and len(self.lines) > self.scrollback_lines
+        ):
+            del self.lines[-self._heights.pop() :]
+        self._line_cache.clear()
+        self.virtual_size = Size(self.max_width, len(self.lines))
+        return len(added)
+
+    def _show_newest(self):
+        """Swap whatever older turns are in memory for the newest ones"""
+        self.lines = []
+        self._heights.clear()
+        self._first = len(self.spill)
+        while self._first and len(self.lines) < self.scrollback_lines:
+            start = max(0, self._first - SCROLLBACK_CHUNK)
+            self._prepend(self._read(start, self._first), trim=False)
+
+    def watch_scroll_y(self, new_value: float) -> None:
+        super().watch_scroll_y(new_value)
+        if self._loading:
+            # this is the scroll_to() below, putting the view back
+            return
+        self._loading = True
+        try:
+            self._load_past_edges(new_value)
+        finally:
+            self._loading = False
+
+    def _load_past_edges(self, new_value: float):
+        if new_value <= 0 and self._first:
+            start = max(0, self._first - SCROLLBACK_CHUNK)
+            added = self._prepend(self._read(start, self._first))
+            # keep the same lines in view
+            self.scroll_to(y=added, animate=False)
+        elif new_value >= self.max_scroll_y and not self.following:
+            start = self._first + len(self._heights)
+            stop = min(len(self.spill), start + SCROLLBACK_CHUNK)
+            dropped = sum(self._append(lines) for lines in self._read(start, stop))
+            self.scroll_to(y=new_value - dropped, animate=False)
+
+
+# a line of the map as (text, colour) runs; see Tile.map_rows
+MapRow = list[tuple[str, str | None]]
+
+
+class MapView(Widget):
+    """The map, drawn a line at a time straight from (text, colour) runs
+
+    Each line's segments are kept, and show() repaints only the lines whose runs
+    changed, so a move redraws a couple of lines and nothing is markup parsed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rows: list[MapRow] = []
+        self._lines: list[list[Segment]] = []
+        self._color: str | None = None
+        self._styles: dict[str | None, Style] = {}
+
+    def show(self, rows: list[MapRow], color: str):
+        """Draw `rows`, with `color` for runs that don't have their own"""
+        if color != self._color or len(rows) != len(self._rows):
+            self._color = color
+            self._styles = {None: Style.parse(color)}
+            self._rows = rows
+            self._lines = [self._render_row(row) for row in rows]
+            self.refresh()
+            return
+        width = self.size.width
+        for y, row in enumerate(rows):
+            if row == self._rows[y]:
+                continue
+            self._rows[y] = row
+            self._lines[y] = self._render_row(row)
+            self.refresh(Region(0, y, width, 1))
+
+    def _render_row(self, row: MapRow) -> list[Segment]:
+        return [Segment(text, self._style(color)) for text, color in row]
+
+    def _style(self, color: str | None) -> Style:
+        style = self._styles.get(color)
+        if style is None:
+            style = Style.parse(COLOR_SCHEME.get(color, color))
+            self._styles[color] = style
+        return style
+
+    def render_line(self, y: int) -> list[Segment]:
+        line = self._lines[y] if y < len(self._lines) else []
+        line = Segment.adjust_line_length(line, self.size.width)
+        return list(Segment.apply_style(line, self.rich_style))
+
+
+@dataclass
+class PanelStat:
+    """One field of the stats panel, coloured by how `attr` moved since last shown"""
+
+    attr: str
+    label: Callable[["Player"], str]
+    shown: int | None = None
+
+    def render(self, player: "Player") -> tuple[Text, int]:
+        """The field's text, and how much its value changed"""
+        value = getattr(player, self.attr)
+        diff = 0 if self.shown is None else value - self.shown
+        self.shown = value
+        text = make_15_chars_long(self.label(player))
+        if diff > 0:
+            return styled(text, "panel_stat_up"), diff
+        elif diff < 0:
+            return styled(text, "panel_stat_down"), diff
+        return Text(text), diff
+
+
+class StatsPanel(Static):
+    """Player stats, repainted only when the player says they changed (or the
+    stat history has a new sample for the sparklines)
+
+    Fields that changed are coloured up or down for one turn, so a repaint that
+    coloured anything leaves the panel dirty for the next turn to clear it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dirty = True
+        self.sparks: list[str] = []
+        self.samples_drawn = -1  # history samples the sparklines were drawn from
+        self.rows = (
+            (
+                PanelStat("hp", lambda p: f"HP: {p.hp}/{p.max_hp}"),
+                PanelStat("humanity", lambda p: f"Humanity: {p.humanity}"),
+            ),
+            (
+                PanelStat("xp", lambda p: f"XP: {p.xp}"),
+                PanelStat("money", lambda p: f"Money: {p.money}"),
+            ),
+            (
+                PanelStat("level", lambda p: f"Level: {p.level}"),
+                PanelStat("tile_index", lambda p: f"Depth: {p.tile_index}"),
+            ),
+        )
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def refresh_stats(self, player: "Player", debug: bool = False):
+        # the history only takes a sample when a stat changes
+        new_samples = player.history.samples != self.samples_drawn
+        # debug mode shows the time, which moves every turn
+        if not (self.dirty or debug or new_samples):
+            return
+        if new_samples:
+            self.samples_drawn = player.history.samples
+            self.sparks = [
+                player.history.sparkline(stat, SPARKLINE_WIDTH)
+                for stat, _ in SPARKLINES
+            ]
+        self.dirty = False
+        lines = []
+        for row in self.rows:
+            parts = []
+            for stat in row:
+                text, diff = stat.render(player)
+                parts.append(text)
+                if diff:
+                    self.dirty = True
+            lines.append(compose(*parts))
+        lines.append(Text(f"Inv: {player.inventory.contents}"))
+        if debug:
+            lines.append(
+                Text(
+                    make_15_chars_long(f"Score: {player.score}")
+                    + make_15_chars_long(f"Time: {player.time}")
+                )
+            )
+        lines.append(Text())
+        for (_, label), spark in zip(SPARKLINES, self.sparks):
+            lines.append(compose(styled(f"{label:<4}", "dim"), spark))
+        self.update(Text("\n").join(lines))
 
 
 class GUIWrapper(App):
 
     CSS_PATH = "mapgui.css"
+    BINDINGS = [("f2", "toggle_latency", "Turn latency")]
 
     def __init__(self, game):
         super().__init__()
-        self.stats_out = Static("Stats", classes="box")
+        self.stats_out = StatsPanel("Stats", classes="box")
         self.main_out = OutputWindow(
             wrap=True, markup=True, classes="box", id="tallboi"
         )
-        self.map_out = Static("Map", classes="box")
+        self.map_out = MapView(classes="box")
         self.default_input_placeholder = "Type a command and press enter"
+        # set by the game; shown in the input box once the turn is painted
+        self.input_placeholder = self.default_input_placeholder
         self.main_in = Input(
             placeholder=self.default_input_placeholder, classes="box", id="longboi"
         )
+        self.latency_out = Static(id="latency")
         self.game = game
+        self.turns: TurnWorker | None = None
+        self.latency = LatencyTracker()
+        # when each queued line was entered; the worker takes them in order
+        self._submitted: deque[float] = deque()
+        self._turn_submitted: float | None = None
+        # (entered, painted) for the turn waiting to reach the screen
+        self._awaiting_screen: tuple[float, float] | None = None
+
+    def run(self, *args, **kwargs):
+        try:
+            return super().run(*args, **kwargs)
+        finally:
+            # the game is saved and closed after this, so no turn can be left running
+            if self.turns:
+                self.turns.close()
+            self.latency.dump()
 
     def compose(self) -> ComposeResult:
         # yield Header()
@@ -40,16 +342,19 @@ class GUIWrapper(App):
         yield self.main_out
         yield self.stats_out
         yield self.main_in
+        yield self.latency_out
 
     def on_mount(self):
         self.main_out.add_line(
             color_string("Welcome to mapgame!", "bold medium_spring_green")
         )
-        map_now = self.game.current_tile.get_map(self.game.player.x, self.game.player.y)
-        colored_map = color_string(map_now, self.map_color_from_level())
-        self.map_out.update(colored_map)
-        self.update_stats()
+        self.game.player.on_stats_change = self.stats_out.mark_dirty
         self.game.turn_prompt()
+        self.paint_turn()
+        self.turns = TurnWorker(
+            self.play_turn, self.paint_turn, self.call_later, asyncio.get_running_loop()
+        )
+        self.set_interval(THINKING_DELAY / 2, self.show_thinking)
 
     def map_color_from_level(self) -> str:
         # range: 160 to 195
@@ -60,63 +365,71 @@ class GUIWrapper(App):
 
     def update_map(self):
         if self.game.game_state.value != 1:  # in_map
-            self.map_out.update(self.game.game_state.name.replace("_", " "))
+            state = self.game.game_state.name.replace("_", " ")
+            self.map_out.show([[(state, None)]], "default")
             return
-        map_now = self.game.current_tile.get_map(self.game.player.x, self.game.player.y)
-        colored_map = color_string(map_now, self.map_color_from_level())
-        self.map_out.update(colored_map)
-
-    def color_stat_up_or_down(self, text: str, diff: int):
-        if diff > 0:
-            return color_string(text, "panel_stat_up")
-        elif diff < 0:
-            return color_string(text, "panel_stat_down")
+        tile = self.game.current_tile
+        x, y = self.game.player.coordinates
+        if tile.fits_panel(MAP_PANEL_COLUMNS, MAP_PANEL_ROWS):
+            rows = tile.map_rows(x, y)
         else:
-            return text
-
-    def get_stat_diff(self, stat_name: str):
-        old_stat_prefix = "_old_"
-        current_stat = getattr(self.game.player, stat_name)
-        try:
-            old_stat = getattr(self, old_stat_prefix + stat_name)
-        except AttributeError:
-            old_stat = 0
-        setattr(self, old_stat_prefix + stat_name, current_stat)
-        return current_stat - old_stat
-
-    def get_stat_line(self, text: str, stat_name: str):
-        return self.color_stat_up_or_down(
-            make_15_chars_long(text), self.get_stat_diff(stat_name)
-        )
+            rows = tile.minimap.map_rows(x, y)
+        self.map_out.show(rows, self.map_color_from_level())
 
     def update_stats(self):
-        # hp_diff = self.game.player.hp - self.old_hp
-        # self.old_hp = self.game.player.hp
-        stats = self.get_stat_line(
-            f"HP: {self.game.player.hp}/{self.game.player.max_hp}", "hp"
-        )
-        stats += self.get_stat_line(
-            f"Humanity: {self.game.player.humanity}", "humanity"
-        )
-        stats += "\n"
-        stats += self.get_stat_line(f"XP: {self.game.player.xp}", "xp")
-        stats += self.get_stat_line(f"Money: {self.game.player.money}", "money")
-        stats += "\n"
-        stats += self.get_stat_line(f"Level: {self.game.player.level}", "level")
-        stats += self.get_stat_line(
-            f"Depth: {self.game.player.tile_index}", "tile_index"
-        )
-        stats += "\n"
-        stats += f"Inv: {self.game.player.inventory.contents}"
-        if self.game.debug:
-            stats += "\n"
-            stats += make_15_chars_long(f"Score: {self.game.player.score}")
-            stats += make_15_chars_long(f"Time: {self.game.player.time}")
-        self.stats_out.update(stats)
+        # called by the game from the turn worker; painted with the turn in paint_turn
+        pass
+
+    def play_turn(self, command: str):
+        """Runs on the turn worker; one line can chain several commands, but the
+        map and stats are only painted once, after the last"""
+        self._turn_submitted = self._submitted.popleft()
+        start = self.latency.record("queue", self._turn_submitted)
+        self.game.play_line(command)
+        start = self.latency.record("play", start)
+        self.game.turn_prompt()
+        self.latency.record("turn_prompt", start)
+
+    def paint_turn(self, error: BaseException | None = None):
+        """Show the turn just played: runs on the app thread while the worker waits"""
+        if error:
+            raise error
+        start = time.perf_counter()
+        self.update_map()
+        start = self.latency.record("update_map", start)
+        self.stats_out.refresh_stats(self.game.player, self.game.debug)
+        self.main_in.placeholder = self.input_placeholder
+        start = self.latency.record("stats", start)
+        # everything the turn printed goes out in one write
+        self.main_out.flush()
+        painted = self.latency.record("output", start)
+        if self._turn_submitted is not None:
+            self._awaiting_screen = (self._turn_submitted, painted)
+            self._turn_submitted = None
+        if self.latency_out.display:
+            self.latency_out.update(self.latency.summary())
+
+    def _display(self, screen, renderable):
+        # every screen update goes through here; the first after a turn is painted
+        # is the one that shows it
+        super()._display(screen, renderable)
+        if self._awaiting_screen and renderable is not None:
+            entered, painted = self._awaiting_screen
+            self._awaiting_screen = None
+            self.latency.record("refresh", painted)
+            self.latency.record("total", entered)
+
+    def action_toggle_latency(self):
+        self.latency_out.display = not self.latency_out.display
+        if self.latency_out.display:
+            self.latency_out.update(self.latency.summary())
+
+    def show_thinking(self):
+        if self.turns.busy_for > THINKING_DELAY:
+            self.main_in.placeholder = THINKING
 
     async def on_input_submitted(self, message: Input.Submitted):
         # logger.debug("Input submitted: %s", message.value)
-        self.game.play(message.value)
-        self.update_map()
+        self._submitted.append(time.perf_counter())
+        self.turns.submit(message.value)
         self.main_in.value = ""
-        self.game.turn_prompt()
@@ -0,0 +1,28 @@
+class NullOutput:
+    """Drop-in for OutputWindow that throws away everything written to it"""
+
+    def add_line(self, new_content):
+        pass
+
+    def flush(self):
+        pass
+
+
+class HeadlessGUI:
+    """Stand-in for GUIWrapper so the game can run without a terminal,
+    e.g. for benchmarks and scripted runs"""
+
+    def __init__(self, game=None):
+        self.game = game
+        self.default_input_placeholder = ""
+        self.main_out = NullOutput()
+        self.input_placeholder = ""
+
+    def run(self):
+        pass
+
+    def update_map(self):
+        pass
+
+    def update_stats(self):
+        pass
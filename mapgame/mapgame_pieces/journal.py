@@ -0,0 +1,139 @@
+import json
+import logging
+from copy import deepcopy
+from pathlib import Path
+
+from mapgame_pieces.save_writer import SyncSaveWriter, BackgroundSaveWriter
+
+logger = logging.getLogger(__name__)
+
+# compact the journal into a fresh snapshot after this many appended deltas
+COMPACT_EVERY = 50
+# key in the snapshot matching it to the journal lines written after it
+GENERATION_KEY = "_generation"
+
+
+def diff(old: dict, new: dict) -> dict:
+    """JSON merge patch (RFC 7386) turning `old` into `new`; None means deleted"""
+    patch = {}
+    for key, val in new.items():
+        old_val = old.get(key)
+        if isinstance(val, dict) and isinstance(old_val, dict):
+            sub_patch = diff(old_val, val)
+            if sub_patch:
+                patch[key] = sub_patch
+        elif key not in old or old_val != val:
+            patch[key] = val
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def apply_patch(target: dict, patch: dict) -> dict:
+    for key, val in patch.items():
+        if val is None:
+            target.pop(key, None)
+        elif isinstance(val, dict) and isinstance(target.get(key), dict):
+            apply_patch(target[key], val)
+        else:
+            target[key] = deepcopy(val)
+    return target
+
+
+class SaveJournal:
+    """Snapshot file plus an append-only log of deltas since that snapshot.
+
+    append() writes one small line holding only what changed since the last
+    save, so frequent autosaves stay cheap. Every COMPACT_EVERY appends the
+    current state is written out as a new snapshot and the log starts over.
+    Journal lines carry the snapshot's generation number, so lines left over
+    from before a compaction (e.g. after a crash mid-compaction) are ignored.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: Path,
+        compact_every: int = COMPACT_EVERY,
+        writer: SyncSaveWriter | BackgroundSaveWriter | None = None,
+    ):
+        self.snapshot_path = snapshot_path
+        self.writer = writer if writer else SyncSaveWriter()
+        self.journal_path = snapshot_path.with_suffix(".mapjournal")
+        self.tile_path = snapshot_path.with_suffix(".maptile")
+        self.compact_every = compact_every
+        self.generation = 0
+        self.appended = 0
+        self._last_saved: dict = {}
+
+    def exists(self) -> bool:
+        return self.snapshot_path.exists() or self.journal_path.exists()
+
+    def write_snapshot(self, save_data: dict):
+        self.generation += 1
+        logger.debug(f"Writing snapshot generation {self.generation}")
+        self.writer.replace(
+            self.snapshot_path,
+            json.dumps({**save_data, GENERATION_KEY: self.generation}),
+        )
+        # the snapshot has everything now, start a new journal
+        self.writer.replace(self.journal_path, "")
+        self.appended = 0
+        self._last_saved = deepcopy(save_data)
+
+    def append(self, save_data: dict):
+        """Log what changed since the last save; compacts every so often"""
+        if self.appended >= self.compact_every:
+            self.write_snapshot(save_data)
+            return
+        patch = diff(self._last_saved, save_data)
+        if not patch:
+            return
+        self.writer.append(
+            self.journal_path,
+            json.dumps({"gen": self.generation, "patch": patch}) + "\n",
+        )
+        self.appended += 1
+        apply_patch(self._last_saved, patch)
+
+    def write_tile(self, tile_data: bytes):
+        self.writer.replace(self.tile_path, tile_data)
+
+    def read_tile(self) -> bytes | None:
+        self.writer.flush()
+        if not self.tile_path.exists():
+            return None
+        return self.tile_path.read_bytes()
+
+    def flush(self):
+        self.writer.flush()
+
+    def load(self) -> dict | None:
+        """Snapshot with the journal replayed over it, or None if there's no save"""
+        self.writer.flush()
+        save_data = {}
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path) as snapshot_file:
+                try:
+                    save_data = json.load(snapshot_file)
+                except json.decoder.JSONDecodeError as exc:
+                    logger.error("Error decoding snapshot; starting new game")
+                    logger.exception(exc)
+                    return None
+        self.generation = save_data.pop(GENERATION_KEY, 0)
+        self.appended = 0
+        if self.journal_path.exists():
+            with open(self.journal_path) as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.decoder.JSONDecodeError:
+                        # most likely a write cut short by a crash; it's the last line
+                        logger.warning("Ignoring unreadable journal line")
+                        break
+                    if entry["gen"] != self.generation:
+                        continue
+                    apply_patch(save_data, entry["patch"])
+                    self.appended += 1
+        self._last_saved = deepcopy(save_data)
+        return save_data or None
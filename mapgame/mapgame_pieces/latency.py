@@ -0,0 +1,80 @@
+"""Where the time goes between pressing enter and seeing the turn on screen
+
+Each turn is split into spans: waiting in the turn queue, Game.play, the turn
+prompt, drawing the map and stats, writing out the turn's output (where the
+add_line calls get parsed and rendered), and the wait for Textual to put it on
+screen. Each span keeps its most recent durations in a fixed-size array, so
+recording one is a clock read and an array store; percentiles are only worked
+out when someone looks.
+"""
+import logging
+import time
+from array import array
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# durations kept per span
+LATENCY_WINDOW = 512
+# in turn order; "total" is enter to screen
+SPANS = (
+    "queue",
+    "play",
+    "turn_prompt",
+    "update_map",
+    "stats",
+    "output",
+    "refresh",
+    "total",
+)
+PERCENTILES = (50, 95, 99)
+# where the GUI writes the summary when it exits
+LATENCY_DUMP = Path("mapgame_latency.txt")
+
+
+class SpanTimes:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.durations = array("d", bytes(8 * window))
+        self.count = 0  # recorded in total, including overwritten ones
+
+    def add(self, seconds: float):
+        self.durations[self.count % len(self.durations)] = seconds
+        self.count += 1
+
+    def percentiles(self, *ps: int) -> list[float]:
+        """Of the durations in the window; all 0 if there are none"""
+        recent = sorted(self.durations[: min(self.count, len(self.durations))])
+        if not recent:
+            return [0.0] * len(ps)
+        return [recent[min(len(recent) - 1, len(recent) * p // 100)] for p in ps]
+
+
+class LatencyTracker:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.spans = {name: SpanTimes(window) for name in SPANS}
+
+    def record(self, span: str, start: float) -> float:
+        """Record `span` as lasting from `start` until now; returns now, to start
+        the next span from"""
+        now = time.perf_counter()
+        self.spans[span].add(now - start)
+        return now
+
+    def summary(self) -> str:
+        header = f"{'ms':<12}" + "".join(f"{f'p{p}':>8}" for p in PERCENTILES)
+        lines = [header + f"{'turns':>8}"]
+        for name, times in self.spans.items():
+            values = "".join(
+                f"{v * 1000:8.2f}" for v in times.percentiles(*PERCENTILES)
+            )
+            lines.append(f"{name:<12}{values}{times.count:>8}")
+        return "\n".join(lines)
+
+    def dump(self, path: Path = LATENCY_DUMP):
+        """Append the summary to `path`, if anything was recorded"""
+        if not self.spans["total"].count:
+            return
+        with open(path, "a") as dump_file:
+            dump_file.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            dump_file.write(self.summary() + "\n\n")
+        logger.info(f"Turn latencies written to {path}")
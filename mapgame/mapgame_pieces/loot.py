@@ -0,0 +1,184 @@
+import json
+import logging
+import random
+from bisect import bisect_right
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from mapgame_pieces.player import ArmorPiece
+
+logger = logging.getLogger(__name__)
+
+LOOT_TABLE_PATH = Path(__file__).parent / "loot_tables.json"
+# how many compiled level bands to keep around
+BAND_CACHE_SIZE = 64
+
+# (base, per_level) - evaluates to base + per_level * level
+LevelScaled = tuple[float, float]
+
+
+def _scaled(value: LevelScaled, level: int) -> float:
+    return value[0] + value[1] * level
+
+
+@dataclass(frozen=True)
+class LootEntry:
+    kind: str  # "item", "money" or "armor"
+    name: str = ""
+    weight: LevelScaled = (1, 0)
+    qty_min: LevelScaled = (1, 0)
+    qty_max: LevelScaled = (1, 0)
+    min_level: int = 1
+    max_level: int | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LootEntry":
+        if data["kind"] not in ("item", "money", "armor"):
+            raise ValueError(f"Unknown loot kind: {data['kind']}")
+        fields = dict(data)
+        for key in ("weight", "qty_min", "qty_max"):
+            if key in fields:
+                fields[key] = tuple(fields[key])
+        return cls(**fields)
+
+    @property
+    def label(self) -> str:
+        return self.name or self.kind
+
+    def available_at(self, level: int) -> bool:
+        if level < self.min_level:
+            return False
+        return self.max_level is None or level <= self.max_level
+
+    def weight_at(self, level: int) -> float:
+        return max(0.0, _scaled(self.weight, level))
+
+    def qty_range(self, level: int) -> tuple[int, int]:
+        low = int(_scaled(self.qty_min, level))
+        return low, max(low, int(_scaled(self.qty_max, level)))
+
+    def materialize(self, level: int, rng=random) -> tuple[str | ArmorPiece, int]:
+        """Turn this entry into actual chest contents"""
+        if self.kind == "armor":
+            return ArmorPiece.random_from_level(level, rng), 1
+        qty = rng.randint(*self.qty_range(level))
+        if self.kind == "money":
+            return "money", qty
+        return self.name, qty
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(1) weighted sampling after O(n) setup"""
+
+    def __init__(self, weights: list[float]):
+        n = len(weights)
+        total = sum(weights)
+        if not n or total <= 0:
+            raise ValueError("Alias table needs at least one positive weight")
+        scaled = [w * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+        # anything left over is 1 give or take float error
+
+    def __len__(self) -> int:
+        return len(self.prob)
+
+    def sample(self, rng=random) -> int:
+        # one draw picks both the column and the coin flip
+        roll = rng.random() * len(self.prob)
+        column = int(roll)
+        if roll - column < self.prob[column]:
+            return column
+        return self.alias[column]
+
+
+class LootTable:
+    """Weighted, level-scaled chest loot loaded from a data file.
+
+    Weights are evaluated once per band of `band_size` levels (at the band's
+    middle level) and compiled into an alias table, so rolling a chest costs
+    the same no matter how many kinds of loot there are. Bands are also split
+    where any entry's min_level or max_level starts or stops it, so an entry is
+    either available at every level of a band or at none of them.
+    """
+
+    def __init__(self, entries: list[LootEntry], band_size: int = 5):
+        if band_size < 1:
+            raise ValueError("band_size must be at least 1")
+        self.entries = entries
+        self.band_size = band_size
+        # first levels at which some entry appears or disappears
+        self._splits = sorted(
+            {entry.min_level for entry in entries}
+            | {entry.max_level + 1 for entry in entries if entry.max_level is not None}
+        )
+        self.compile_band = lru_cache(maxsize=BAND_CACHE_SIZE)(self._compile_band)
+
+    @classmethod
+    def from_file(cls, path: Path = LOOT_TABLE_PATH) -> "LootTable":
+        logger.debug("Loading loot table from %s", path)
+        with open(path) as loot_file:
+            data = json.load(loot_file)
+        entries = [LootEntry.from_dict(entry) for entry in data["entries"]]
+        return cls(entries, band_size=data.get("band_size", 5))
+
+    def band_of(self, level: int) -> tuple[int, int]:
+        """First and last level of the band `level` is in"""
+        level = max(1, level)
+        first = (level - 1) // self.band_size * self.band_size + 1
+        last = first + self.band_size - 1
+        split = bisect_right(self._splits, level)
+        if split:
+            first = max(first, self._splits[split - 1])
+        if split < len(self._splits):
+            last = min(last, self._splits[split] - 1)
+        return first, last
+
+    def band_level(self, band: tuple[int, int]) -> int:
+        """The level a band's weights are evaluated at"""
+        first, last = band
+        return first + (last - first + 1) // 2
+
+    def _compile_band(
+        self, band: tuple[int, int]
+    ) -> tuple[list[LootEntry], AliasTable]:
+        level = self.band_level(band)
+        # availability is the same at every level of the band
+        entries = [
+            entry
+            for entry in self.entries
+            if entry.available_at(band[0]) and entry.weight_at(level) > 0
+        ]
+        logger.debug(f"Compiling loot band {band} with {len(entries)} entries")
+        return entries, AliasTable([entry.weight_at(level) for entry in entries])
+
+    def expected_rates(self, level: int) -> dict[str, float]:
+        """Drop rate of each entry label at this level"""
+        band = self.band_of(level)
+        entries, _ = self.compile_band(band)
+        weights = [entry.weight_at(self.band_level(band)) for entry in entries]
+        total = sum(weights)
+        rates: dict[str, float] = {}
+        for entry, weight in zip(entries, weights):
+            rates[entry.label] = rates.get(entry.label, 0) + weight / total
+        return rates
+
+    def roll_entry(self, level: int, rng=random) -> LootEntry:
+        entries, alias_table = self.compile_band(self.band_of(level))
+        return entries[alias_table.sample(rng)]
+
+    def roll(self, level: int, rng=random) -> tuple[str | ArmorPiece, int]:
+        """Roll the contents of one chest: ("money", qty), (item name, qty) or (ArmorPiece, 1)"""
+        return self.roll_entry(level, rng).materialize(level, rng)
@@ -2,7 +2,11 @@ import logging
 from mapgame_pieces.alive import NPC
 import math
 import random
-from dataclasses import dataclass
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import cached_property
 from mapgame_pieces.conversations import (
     Conversation,
     TestConversation,
@@ -12,11 +16,23 @@ from mapgame_pieces.conversations import (
     BuffConvo,
     CurseConvo,
 )
-from mapgame_pieces.utils import color_string
+from mapgame_pieces.utils import color_string, derive_seed
+from mapgame_pieces.tile_metrics import TileMetrics, difficulty_target
+from mapgame_pieces.minimap import Minimap
 from rich import markup
 
 logger = logging.getLogger(__name__)
 BASE_NPCS_PER_TILE = 7
+# Map keeps the tile cache stocked this many levels beyond the current one
+TILES_AHEAD = 3
+# Map keeps this many visited tiles whole; older ones shrink to TileMutations
+LIVE_TILES = 8
+# bump whenever a change to Tile generation would make old tiles play differently
+TILE_GENERATOR_VERSION = 2
+# (riddle text, correct answers); RiddleConvos are saved as an index into this
+RIDDLES = [
+    ("What has four paws and rhymes with 'rat'?", ("cat", "rat")),
+]
 
 
 @dataclass
@@ -31,14 +47,55 @@ Coordinates = tuple[int, int]
 RoomMap = dict[Coordinates, Room]
 
 
+@dataclass
+class TileMutations:
+    """Everything that has happened to a generated tile since it was generated.
+    With the seed, enough to rebuild it."""
+
+    seed: int
+    width: int
+    height: int
+    level: int
+    explored: set[Coordinates]
+    chests_opened: set[Coordinates]  # by the player or stolen by an NPC
+    rooms_used: set[Coordinates]  # e.g. the medbay, once it's been used
+    dead_npcs: set[int]  # indices into the NPCs as generated
+    # surviving NPCs: index -> (x, y, hp, max_hp, player_attitude, conversation
+    # attributes other than the NPC itself)
+    npc_states: dict[int, tuple[int, int, int, int, int, dict | None]] = field(
+        default_factory=dict
+    )
+    all_visible: bool = False
+
+
 class Tile:
-    def __init__(self, gui, width: int, height: int, level: int):
+    def __init__(
+        self, gui, width: int, height: int, level: int, seed: int | None = None
+    ):
+        """
+        Args:
+            seed (int | None): Everything about the tile as generated follows from
+                this; None takes one from the global random stream
+        """
         self.gui = gui
         self.height = height
         self.width = width
+        self.level = level
+        if seed is None:
+            seed = random.getrandbits(64)
+        # generation only; NPC wandering gets its own stream in mark_generated()
+        self.rng = random.Random(seed)
+        # phase timings and rejection-sampling retries, for tile_stats.py
+        self.generation_stats: dict[str, float] = {
+            "coordinate_retries": 0,
+            "path_retries": 0,
+            "connecting_paths": 0,
+        }
+        phase_start = time.perf_counter()
         self.chests = set()
         self.rooms: RoomMap = self._starting_rooms()
         self.add_room(room_name="medbay", map_icon="[m]")
+        phase_start = self._end_phase("rooms", phase_start)
         # {
         #     (0, 0): {
         #         "name": "entrance",
@@ -50,26 +107,158 @@ class Tile:
         #     },  # default for now
         # }
         self.spawn_chests()
+        phase_start = self._end_phase("chests", phase_start)
         self.explored: set(Coordinates) = set(
             [(0, 0)]
         )  # had to put the tuple in a list to get it to turn into a set of tuples
         self.paths = self.generate_paths(self.width * self.height)
+        phase_start = self._end_phase("paths", phase_start)
         self.all_visible = False
         self.add_hostile_npcs_to_tile(level)
         self.add_friendly_npc_to_tile(level)
+        self._end_phase("npcs", phase_start)
+        self.mark_generated(seed)
+
+    def mark_generated(self, seed: int | None):
+        """Remember the tile as generated, to diff against in mutations()"""
+        self.seed = seed  # None if it can't be regenerated
+        self.movement_rng = random.Random(
+            derive_seed(seed, "movement") if seed is not None else None
+        )
+        self.spawned_npcs = list(self.npcs)
+        self.spawned_chests = frozenset(self.chests)
+        self.spawned_rooms = frozenset(self.rooms)
+
+    def mutations(self) -> TileMutations | None:
+        """What's changed since generation, or None for a tile with no seed"""
+        if self.seed is None:
+            return None
+        alive = {id(npc) for npc in self.npcs if not npc.is_dead}
+        dead = set()
+        npc_states = {}
+        for i, npc in enumerate(self.spawned_npcs):
+            if id(npc) not in alive:
+                dead.add(i)
+                continue
+            convo_state = None
+            if npc.conversation:
+                convo_state = {
+                    k: v for k, v in vars(npc.conversation).items() if k != "npc"
+                }
+            npc_states[i] = (
+                npc.x,
+                npc.y,
+                npc.hp,
+                npc.max_hp,
+                npc.player_attitude,
+                convo_state,
+            )
+        return TileMutations(
+            seed=self.seed,
+            width=self.width,
+            height=self.height,
+            level=self.level,
+            explored=set(self.explored),
+            chests_opened=set(self.spawned_chests - self.chests),
+            rooms_used=set(self.spawned_rooms - self.rooms.keys()),
+            dead_npcs=dead,
+            npc_states=npc_states,
+            all_visible=self.all_visible,
+        )
+
+    @classmethod
+    def rebuild(cls, gui, mutations: TileMutations) -> "Tile":
+        """Regenerate from the seed and replay what happened to it"""
+        tile = cls(
+            gui, mutations.width, mutations.height, mutations.level, mutations.seed
+        )
+        tile.explored = set(mutations.explored)
+        tile.chests -= mutations.chests_opened
+        for coordinates in mutations.rooms_used:
+            tile.rooms.pop(coordinates, None)
+        tile.npcs = []
+        for i, npc in enumerate(tile.spawned_npcs):
+            if i in mutations.dead_npcs:
+                continue
+            x, y, hp, max_hp, attitude, convo_state = mutations.npc_states[i]
+            npc.x, npc.y = x, y
+            npc.max_hp = max_hp
+            npc.hp = hp
+            npc.player_attitude = attitude
+            if convo_state and npc.conversation:
+                vars(npc.conversation).update(convo_state)
+            tile.npcs.append(npc)
+        tile.all_visible = mutations.all_visible
+        return tile
+
+    @classmethod
+    def blank(cls, gui, width: int, height: int, level: int) -> "Tile":
+        """An empty tile with nothing generated, for filling in from a save"""
+        inst = cls.__new__(cls)
+        inst.gui = gui
+        inst.height = height
+        inst.width = width
+        inst.level = level
+        inst.generation_stats = {}
+        inst.chests = set()
+        inst.rooms = {}
+        inst.explored = set()
+        inst.paths = []
+        inst.all_visible = False
+        inst.npcs = []
+        inst.mark_generated(seed=None)
+        return inst
+
+    def _end_phase(self, phase: str, phase_start: float) -> float:
+        """Record how long a generation phase took; returns the start of the next one"""
+        now = time.perf_counter()
+        self.generation_stats[phase + "_time"] = now - phase_start
+        return now
+
+    def explore(self, coordinates: Coordinates):
+        """Mark a room explored; use this rather than adding to `explored` directly
+        once the tile is in play, so the minimap keeps count"""
+        if coordinates in self.explored:
+            return
+        self.explored.add(coordinates)
+        if "minimap" in self.__dict__:
+            self.minimap.mark_explored(*coordinates)
+
+    @cached_property
+    def minimap(self) -> Minimap:
+        """Overview for tiles too big to show whole; built on first use"""
+        return Minimap(self)
+
+    def fits_panel(self, columns: int, rows: int) -> bool:
+        """Whether map_rows fits in a panel this big (the last line is always blank)"""
+        return self.width * 4 <= columns and self.height * 2 - 1 <= rows
+
+    def portal_glow(self) -> tuple[str, str]:
+        """How the portal's light looks, and its colour: it reddens with each threat"""
+        match len(self.get_npc_threats()):
+            case 0:
+                return "a soothing golden light.", "wheat1"
+            case 1 | 2:
+                return "a passive yellow light.", "yellow3"
+            case 3 | 4:
+                return "an unsettling orange light.", "dark_orange3"
+            case _:
+                return "a dangerous red light.", "red1"
 
     def get_npc_threats(self):
         return [npc for npc in self.npcs if npc.will_attack_player()]
 
     def add_hostile_npcs_to_tile(self, level: int):
         number_of_npcs = BASE_NPCS_PER_TILE + min(int(level / 6), 3)
-        self.npcs = [NPC.hostile_from_level(level) for x in range(number_of_npcs)]
+        self.npcs = [
+            NPC.hostile_from_level(level, self.rng) for x in range(number_of_npcs)
+        ]
         for npc in self.npcs:
             npc.x, npc.y = self.gen_random_coordinates()
             logger.debug(f"NPC spawned at {(npc.x, npc.y)}")
 
     def add_friendly_npc_to_tile(self, level: int):
-        npc = NPC.friendly_from_level(level)
+        npc = NPC.friendly_from_level(level, self.rng)
         npc.x, npc.y = self.gen_random_coordinates()
         convo = self.make_conversation(npc=npc, level=level)
         if isinstance(convo, WisdomConvo):
@@ -84,12 +273,13 @@ class Tile:
     def make_conversation(self, npc, level):
         if level == 1:
             return IntroConvo(npc)
-        match random.randint(1, 7):
+        match self.rng.randint(1, 7):
             case 1:
+                riddle_text, correct_answers = self.rng.choice(RIDDLES)
                 return RiddleConvo(
                     npc,
-                    riddle_text="What has four paws and rhymes with 'rat'?",
-                    correct_answers=("cat", "rat"),
+                    riddle_text=riddle_text,
+                    correct_answers=correct_answers,
                 )
             case 2 | 3:
                 return WisdomConvo(npc)
@@ -102,7 +292,7 @@ class Tile:
         rooms = {}
         rooms[(0, 0)] = Room(x=0, y=0, name="entrance", map_icon="[e]")
         # portal always at fixed X but vary the Y
-        portal_y = random.randint(0, self.height - 1)
+        portal_y = self.rng.randint(0, self.height - 1)
         rooms[(self.width - 1, portal_y)] = Room(
             x=self.width - 1, y=portal_y, name="portal", map_icon="[p]"
         )
@@ -115,15 +305,17 @@ class Tile:
     def gen_random_coordinates(self) -> Coordinates:
         """Does not select coordinates with existing rooms or chests"""
         while True:
-            x, y = random.randint(0, self.width - 1), random.randint(0, self.height - 1)
+            x, y = self.rng.randint(0, self.width - 1), self.rng.randint(
+                0, self.height - 1
+            )
             try:
                 # logger.debug(f"Checking if {(x, y)} is in rooms")
                 self.rooms[(x, y)]
-                continue
             except KeyError:
                 # logger.debug("It isn't, let's see if there's already a chest here")
                 if (x, y) not in self.chests:
                     return x, y
+            self.generation_stats["coordinate_retries"] += 1
 
     def spawn_chests(self):
         n_chests = int(math.sqrt(self.height * self.width))
@@ -137,23 +329,8 @@ class Tile:
             room_name = self.rooms[room_coords].name
             self.gui.main_out.add_line(f"You stand in the {room_name} room!")
             if room_name == "portal":
-                match len(self.get_npc_threats()):
-                    case 0:
-                        portal_flavor_txt = color_string(
-                            "a soothing golden light.", "wheat1"
-                        )
-                    case 1 | 2:
-                        portal_flavor_txt = color_string(
-                            "a passive yellow light.", "yellow3"
-                        )
-                    case 3 | 4:
-                        portal_flavor_txt = color_string(
-                            "an unsettling orange light.", "dark_orange3"
-                        )
-                    case _:
-                        portal_flavor_txt = color_string(
-                            "a dangerous red light.", "red1"
-                        )
+                glow, color = self.portal_glow()
+                portal_flavor_txt = color_string(glow, color)
                 self.gui.main_out.add_line("It glows with " + portal_flavor_txt)
                 portal_txt = color_string("portal", "main_command")
                 self.gui.main_out.add_line(
@@ -177,15 +354,15 @@ class Tile:
         while len(paths) < n_paths and n_attempts < (4 * n_paths):
             n_attempts += 1
             # choose starting square
-            px1 = random.randint(0, self.width - 1)
-            py1 = random.randint(0, self.height - 1)
+            px1 = self.rng.randint(0, self.width - 1)
+            py1 = self.rng.randint(0, self.height - 1)
             # Utils.printline(self.wm.stdscr, f"px1, py1 is {px1, py1}")
             if (px1, py1) == (self.width - 1, self.height - 1):
                 continue  # can't go anywhere from this corner
             px2 = px1
             py2 = py1
             # randomly add 1 to x or y
-            if random.randint(0, 1):
+            if self.rng.randint(0, 1):
                 px2 = px1 + 1
             else:
                 py2 = py1 + 1
@@ -196,8 +373,10 @@ class Tile:
             ):  # valid path
                 paths.append(((px1, py1), (px2, py2)))
         # Utils.printline(self.wm.stdscr, f"Generated {len(paths)} paths in {n_attempts} attempts")
+        self.generation_stats["path_retries"] += n_attempts - len(paths)
         island_nodes = self._nodes_on_this_island(0, 0, paths)
         while len(island_nodes) < self.width * self.height:
+            self.generation_stats["connecting_paths"] += 1
             # Utils.printline(self.wm.stdscr, "Missing some connections")
             adj_nodes = self._nodes_with_inaccessible_adjacencies(island_nodes)
             paths.append(self._resolve_inaccessible_tile(island_nodes, adj_nodes))
@@ -261,7 +440,7 @@ class Tile:
         return True
 
     def _resolve_inaccessible_tile(self, island_nodes: list, adj_nodes: list):
-        x, y = random.choice(adj_nodes)
+        x, y = self.rng.choice(adj_nodes)
         # Utils.printline(self.stdscr, f'Chose random adjacent node at {x}, {y} to resolve path')
         choices = [
             ((x, y - 1), (x, y)),
@@ -272,7 +451,7 @@ class Tile:
         valid_choice = False
         while not valid_choice:
             valid_choice = None
-            rc = choices.pop(random.randint(0, len(choices) - 1))
+            rc = choices.pop(self.rng.randint(0, len(choices) - 1))
             # Utils.printline(self.stdscr, f'len(choices) is {len(choices)}')
             # Utils.printline(self.stdscr, f'rc is {rc}')
             for c in rc:
@@ -304,80 +483,245 @@ class Tile:
         return self._path_when_moving(x, y, direction) in self.paths
 
     def get_map(self, player_x, player_y):
-        mapstr: str = ""
+        rows = self.map_rows(player_x, player_y)
+        return markup.escape(
+            "".join(text for row in rows for text, _ in row + [("\n", None)])
+        )
+
+    def map_rows(self, player_x, player_y) -> list[list[tuple[str, str | None]]]:
+        """The map as lines of (text, colour) runs, colour None for the map's own
+
+        Explored chests are highlighted, and the portal shows its glow.
+        """
+        portal_color = None
+        rows = []
         for y in range(0, self.height):
-            # print the yth row of rooms
+            # the yth row of rooms
+            row = []
             for x in range(0, self.width):
+                color = None
                 if player_x == x and player_y == y:
-                    mapstr += "[x]"  # this is the player's room
+                    icon = "[x]"  # this is the player's room
                 elif (x, y) in self.explored:
                     if (x, y) in self.rooms:
-                        mapstr += self.rooms[(x, y)].map_icon
+                        room = self.rooms[(x, y)]
+                        icon = room.map_icon
+                        if room.name == "portal":
+                            portal_color = portal_color or self.portal_glow()[1]
+                            color = portal_color
                     else:
-                        mapstr += "[.]"  # explored, empty
+                        icon = "[.]"  # explored, empty
+                    if (x, y) in self.chests:
+                        color = "map_chest"
                 else:
-                    mapstr += "[ ]"  # unexplored room
+                    icon = "[ ]"  # unexplored room
                 # now see whether there's a path to the next room
                 c1 = (x, y)
                 c2 = (x + 1, y)
                 visible = self.all_visible or (
                     c1 in self.explored or c2 in self.explored
                 )
-                if (c1, c2) in self.paths and visible:
-                    mapstr += "-"
-                else:
-                    mapstr += " "
+                path = "-" if (c1, c2) in self.paths and visible else " "
+                _add_run(row, icon, color)
+                _add_run(row, path, None)
+            rows.append(row)
             # now that we've written the rooms, draw paths to next row
-            mapstr += "\n"  # newline
+            line = ""
             for x in range(0, self.width):
-                mapstr += " "  # spaces for above room
                 c1 = (x, y)
                 c2 = (x, y + 1)
                 visible = self.all_visible or (
                     c1 in self.explored or c2 in self.explored
                 )
                 if (c1, c2) in self.paths and visible:
-                    mapstr += "|  "
+                    line += " |  "
                 else:
-                    mapstr += "   "
-            mapstr += "\n"
-        return markup.escape(mapstr)
+                    line += "    "
+            rows.append([(line, None)])
+        return rows
+
+
+def _add_run(row: list[tuple[str, str | None]], text: str, color: str | None):
+    """Append text to a row of runs, merging it into the last run if it's the same colour"""
+    if row and row[-1][1] == color:
+        row[-1] = (row[-1][0] + text, color)
+    else:
+        row.append((text, color))
+
+
+def _generate_candidate(width: int, height: int, level: int, seed: int) -> Tile:
+    """Runs in a worker process; the tile comes back without a gui attached"""
+    return Tile(None, width, height, level, seed)
 
 
 class Map:
-    def __init__(self, gui, width, height):
+    def __init__(
+        self,
+        gui,
+        width,
+        height,
+        candidates: int = 1,
+        candidate_budget: float = 0.5,
+        cache: "TileCache | None" = None,
+        seed: int | None = None,
+    ):
+        """
+        Args:
+            candidates (int): Generate this many tiles per dimension and keep the
+                one closest to the level's difficulty target. The first is
+                generated in this process, the rest in worker processes. 1 just
+                generates a single tile in this process.
+            candidate_budget (float): Seconds to wait for candidates before settling
+                for whichever ones have finished. The first candidate's own
+                generation counts against it, so a pick takes at most the longer
+                of the budget and one generation
+            cache (TileCache | None): Take tiles from this stock of pre-generated
+                tiles when it has one for the level, and keep it filled ahead
+            seed (int | None): The run seed. Each level's tile is generated from
+                a seed derived from it, so get_tile(level) always makes the same
+                tile for the same run seed. Not with candidates > 1, though: which
+                candidates finish within the budget depends on the machine, so
+                the pick, and replays of it, can differ between sessions
+        """
+        self.seed = random.getrandbits(64) if seed is None else seed
         self.default_height = height
         self.default_width = width
         self.gui = gui
-        self.tiles = []  # ordered list
+        # visited tiles by level, least recently used first
+        self.live_tiles: OrderedDict[int, Tile] = OrderedDict()
+        # visited tiles pushed out of live_tiles, shrunk to seed + mutations
+        self.evicted_tiles: dict[int, TileMutations] = {}
+        self.candidates = candidates
+        self.candidate_budget = candidate_budget
+        self._pool: ProcessPoolExecutor | None = None
+        self.cache = cache
+
+    def tile_seed(self, level: int, candidate: int = 0) -> int:
+        return derive_seed(self.seed, "tile", level, candidate)
 
     def get_tile(self, level: int) -> Tile:
         """Generate a tile with NPCs at a particular level"""
+        tile = self._new_tile(level)
+        self.keep(tile)
+        return tile
+
+    def _new_tile(self, level: int) -> Tile:
+        if self.cache:
+            self.prefetch(level + 1)
+            tile = self.cache.take(
+                self.default_width,
+                self.default_height,
+                level,
+                self.tile_seed(level),
+                self.gui,
+            )
+            if tile:
+                logger.debug(f"Took level {level} tile from the tile cache")
+                return tile
+        if self.candidates > 1:
+            return self.pick_candidate_tile(level)
         return Tile(
             self.gui,
             self.default_width,
             self.default_height,
-            level=level,
+            level,
+            self.tile_seed(level),
         )
 
-    def generate_each_dimension(self, tile_num: int) -> Tile:
-        """OLD get_tile() DEPRECIATED when i realized it would be a pain to save/load this
-        Get this tile number; create it if it doesn't exist
-        Note tile numbers are indexed starting from 1
-        """
-        try:
-            return self.tiles[tile_num - 1]
-        except IndexError as ex:
-            # need to create one or more tiles
-            num_to_create = tile_num - len(self.tiles)
-            logger.debug("Creating %s new dimension(s)", num_to_create)
-            for x in range(num_to_create):
-                self.tiles.append(
-                    Tile(
-                        self.gui,
-                        self.default_width,
-                        self.default_height,
-                        level=tile_num,
-                    )
-                )
-            return self.tiles[tile_num - 1]
+    def keep(self, tile: Tile):
+        """Hold on to a visited tile so revisit() can bring it back"""
+        self.live_tiles[tile.level] = tile
+        self.live_tiles.move_to_end(tile.level)
+        self.evicted_tiles.pop(tile.level, None)
+        while len(self.live_tiles) > LIVE_TILES:
+            level, evicted = self.live_tiles.popitem(last=False)
+            mutations = evicted.mutations()
+            if mutations:
+                self.evicted_tiles[level] = mutations
+            else:
+                logger.debug(f"Dropping level {level} tile; it has no seed")
+
+    def forget(self):
+        """Drop every visited tile, as if none had been"""
+        self.live_tiles.clear()
+        self.evicted_tiles.clear()
+
+    def revisit(self, level: int) -> Tile | None:
+        """A tile that's been visited before, as it was left, if Map still has it"""
+        if level in self.live_tiles:
+            tile = self.live_tiles[level]
+        elif level in self.evicted_tiles:
+            logger.debug(f"Rebuilding level {level} tile from its seed")
+            tile = Tile.rebuild(self.gui, self.evicted_tiles[level])
+        else:
+            return None
+        self.keep(tile)
+        return tile
+
+    def pick_candidate_tile(self, level: int) -> Tile:
+        """Generate candidate tiles concurrently; return the one whose difficulty
+        is closest to the target for this level"""
+        started = time.perf_counter()
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor()
+        futures = [
+            self._pool.submit(
+                _generate_candidate,
+                self.default_width,
+                self.default_height,
+                level,
+                self.tile_seed(level, candidate),
+            )
+            for candidate in range(1, self.candidates)
+        ]
+        # the first candidate is made here while the workers make the rest, so
+        # there's always a tile once the budget runs out. Workers still busy
+        # with an earlier dimension's candidates can't hold this one up
+        first = Tile(
+            self.gui,
+            self.default_width,
+            self.default_height,
+            level,
+            self.tile_seed(level),
+        )
+        remaining = self.candidate_budget - (time.perf_counter() - started)
+        done, not_done = wait(futures, timeout=max(0.0, remaining))
+        for future in not_done:
+            future.cancel()
+        if not_done:
+            logger.info(
+                f"{len(not_done)} candidate tiles for level {level} missed the budget"
+            )
+        # in candidate order, so ties don't depend on which finished first
+        tiles = [first] + [
+            future.result()
+            for future in futures
+            if future in done and not future.exception()
+        ]
+        target = difficulty_target(level)
+        best = min(tiles, key=lambda t: abs(TileMetrics.measure(t).difficulty - target))
+        logger.debug(
+            f"Picked 1 of {len(tiles)}/{self.candidates} candidate tiles for level {level}"
+        )
+        best.gui = self.gui
+        return best
+
+    def prefetch(self, level: int):
+        """Have the tile cache generate tiles for the next few levels from `level`"""
+        if self.cache:
+            self.cache.fill(
+                self.default_width,
+                self.default_height,
+                {
+                    ahead: self.tile_seed(ahead)
+                    for ahead in range(level, level + TILES_AHEAD)
+                },
+            )
+
+    def close(self):
+        """Shut down the candidate and tile cache workers, if there are any"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self.cache:
+            self.cache.close()
@@ -0,0 +1,102 @@
+"""Downsampled overview of a tile too big for the map panel
+
+The tile is split into at most MAP_PANEL_COLUMNS x MAP_PANEL_ROWS blocks of rooms,
+one character each, shaded by how much of the block has been explored. The
+player's block and explored portal and medbay rooms are marked on top.
+
+Explored counts per block are kept in a flat array and bumped as rooms are
+explored (see Tile.explore), and rows are only redrawn when something in them
+changed, so drawing costs the same however big the tile is.
+"""
+import logging
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# the map panel's content area (see mapgui.css); the minimap is at most this big
+MAP_PANEL_COLUMNS = 32
+MAP_PANEL_ROWS = 7
+# by explored fraction: none, then up to a quarter, a half, three quarters, all
+SHADES = "·░▒▓█"
+# room name: (character, colour); shown once the room has been explored
+ROOM_MARKERS = {"portal": ("P", None), "medbay": ("+", "minimap_medbay")}
+PLAYER_MARKER = ("@", "minimap_player")
+
+# a line of runs, as in Tile.map_rows
+MapRow = list[tuple[str, str | None]]
+
+
+class Minimap:
+    def __init__(self, tile):
+        self.tile = tile
+        # rooms per block side, rounded up so the blocks cover the tile
+        self.block_width = -(-tile.width // MAP_PANEL_COLUMNS)
+        self.block_height = -(-tile.height // MAP_PANEL_ROWS)
+        self.columns = -(-tile.width // self.block_width)
+        self.rows = -(-tile.height // self.block_height)
+        self.explored = array("I", bytes(4 * self.columns * self.rows))
+        for x, y in tile.explored:
+            self.explored[self._block(x, y)] += 1
+        self._rendered: list[MapRow | None] = [None] * self.rows
+        self._marked_rows: set[int] = set()
+
+    def _block(self, x: int, y: int) -> int:
+        return (y // self.block_height) * self.columns + x // self.block_width
+
+    def _block_size(self, column: int, row: int) -> int:
+        """Rooms in a block; the last row and column can be short"""
+        width = min(self.block_width, self.tile.width - column * self.block_width)
+        height = min(self.block_height, self.tile.height - row * self.block_height)
+        return width * height
+
+    def mark_explored(self, x: int, y: int):
+        """Count a newly explored room"""
+        self.explored[self._block(x, y)] += 1
+        self._rendered[y // self.block_height] = None
+
+    def map_rows(self, player_x: int, player_y: int) -> list[MapRow]:
+        markers = self._markers(player_x, player_y)
+        # markers move, change colour and get used up, so rows that have or had
+        # one are always drawn again; at most a few rows
+        marked_rows = {block // self.columns for block in markers}
+        for row in marked_rows | self._marked_rows:
+            self._rendered[row] = None
+        self._marked_rows = marked_rows
+        for row in range(self.rows):
+            if self._rendered[row] is None:
+                self._rendered[row] = self._render_row(row, markers)
+        return list(self._rendered)
+
+    def _markers(
+        self, player_x: int, player_y: int
+    ) -> dict[int, tuple[str, str | None]]:
+        markers = {}
+        for coordinates, room in self.tile.rooms.items():
+            if room.name in ROOM_MARKERS and coordinates in self.tile.explored:
+                char, color = ROOM_MARKERS[room.name]
+                if room.name == "portal":
+                    color = self.tile.portal_glow()[1]
+                markers[self._block(*coordinates)] = (char, color)
+        markers[self._block(player_x, player_y)] = PLAYER_MARKER
+        return markers
+
+    def _render_row(
+        self, row: int, markers: dict[int, tuple[str, str | None]]
+    ) -> MapRow:
+        runs: MapRow = []
+        shades = ""
+        for column in range(self.columns):
+            block = row * self.columns + column
+            if block in markers:
+                if shades:
+                    runs.append((shades, None))
+                    shades = ""
+                runs.append(markers[block])
+                continue
+            explored = self.explored[block]
+            # any exploring at all shows; only a fully explored block is solid
+            shade = -(-explored * (len(SHADES) - 1) // self._block_size(column, row))
+            shades += SHADES[shade]
+        if shades:
+            runs.append((shades, None))
+        return runs
@@ -1,12 +1,19 @@
 import random
 from mapgame_pieces.alive import LivingThing
 from mapgame_pieces.utils import color_string, COLOR_SCHEME
+from mapgame_pieces.styled_text import styled, compose
 from mapgame_pieces.items import Item
+from mapgame_pieces.journal import SaveJournal
+from mapgame_pieces.save_writer import BackgroundSaveWriter
+from mapgame_pieces.save_store import SaveStore, ProfileJournal
+from mapgame_pieces.save_schema import Schema, Field, EMPTY, VERSION_KEY
+from mapgame_pieces.stat_history import StatHistory
 import logging
 from dataclasses import dataclass
-import json
+from functools import cached_property
 from pathlib import Path
 from enum import Enum
+from typing import Callable
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +24,9 @@ EquippedMap = dict[str, Item | None]
 
 
 SAVE_PATH = Path("mapgame.mapsave")
+# level up once xp exceeds XP_CURVE_BASE * level ** XP_CURVE_EXPONENT
+XP_CURVE_BASE = 25
+XP_CURVE_EXPONENT = 1.3
 logger = logging.getLogger(__name__)
 
 
@@ -50,7 +60,7 @@ class ArmorPiece:
             self.from_saved(saved)
 
     def to_save(self) -> dict:
-        return {k: val for k, val in self.__dict__.items() if val is not None}
+        return ARMOR_PIECE_SCHEMA.encode(self)
 
     @property
     def name_str(self):
@@ -76,34 +86,32 @@ class ArmorPiece:
         )
 
     @staticmethod
-    def generate_name(armor_slot: ArmorSlot) -> str:
+    def generate_name(armor_slot: ArmorSlot, rng=random) -> str:
         match armor_slot:
             case ArmorSlot.head:
-                return random.choice(["helmet", "helm", "headgear"])
+                return rng.choice(["helmet", "helm", "headgear"])
             case ArmorSlot.chest:
-                return random.choice(["chestplate", "chestpiece"])
+                return rng.choice(["chestplate", "chestpiece"])
             case ArmorSlot.legs:
-                return random.choice(["leggings", "pants"])
+                return rng.choice(["leggings", "pants"])
             case ArmorSlot.feet:
-                return random.choice(["boots", "shoes"])
+                return rng.choice(["boots", "shoes"])
             case _:
                 raise ValueError(f"armor_slot is not valid: {armor_slot}")
 
     @classmethod
-    def random_from_level(cls, level: int):
-        armor_slot = random.choice([x for x in ArmorSlot])
-        armor_amount = random.randint(max(1, level // 5), max(1, level // 2))
-        inst = cls(armor_slot=armor_slot, armor_amount=armor_amount)
+    def random_from_level(cls, level: int, rng=random):
+        armor_slot = rng.choice([x for x in ArmorSlot])
+        armor_amount = rng.randint(max(1, level // 5), max(1, level // 2))
+        inst = cls(
+            name=cls.generate_name(armor_slot, rng),
+            armor_slot=armor_slot,
+            armor_amount=armor_amount,
+        )
         return inst
 
     def from_saved(self, saved):
-        for key, val in saved.items():
-            if key == "armor_slot":
-                setattr(self, key, ArmorSlot(val))
-            elif key == "modifier":
-                setattr(self, key, ArmorModifier(val))
-            else:
-                setattr(self, key, val)
+        ARMOR_PIECE_SCHEMA.decode(saved, self)
 
 
 class EquippedArmor:
@@ -118,6 +126,7 @@ class EquippedArmor:
             f"You remove the {getattr(self, armor_slot.name).name_str} from your {armor_slot.name}."
         )
         setattr(self, armor_slot.name, None)
+        self.__dict__.pop("armor_score", None)
 
     def equip(self, to_equip: ArmorPiece, gui):
         armor_slot = to_equip.armor_slot
@@ -125,13 +134,15 @@ class EquippedArmor:
         if already_equipped:
             self.unequip(to_equip.armor_slot, gui)
         setattr(self, armor_slot.name, to_equip)
+        self.__dict__.pop("armor_score", None)
         gui.main_out.add_line(
             f"You cover your {armor_slot.name} with the {getattr(self, armor_slot.name).name_str}."
         )
         # TODO: 'you equip the x'
 
-    @property
+    @cached_property
     def armor_score(self) -> int:
+        """Cached until the next equip() or unequip()"""
         total = 0
         for slot in ArmorSlot:
             this_slot = getattr(self, slot.name)
@@ -140,15 +151,16 @@ class EquippedArmor:
         return total
 
     def to_save(self) -> dict:
-        return {k: val.to_save() for k, val in self.__dict__.items() if val is not None}
+        return EQUIPPED_ARMOR_SCHEMA.encode(self)
 
     def from_saved(self, saved):
-        for key, val in saved.items():
-            setattr(self, key, ArmorPiece(saved=val))
+        EQUIPPED_ARMOR_SCHEMA.decode(saved, self)
+        self.__dict__.pop("armor_score", None)
 
 
 class Inventory:
-    def __init__(self, contents=None):
+    def __init__(self, contents=None, on_change: Callable[[], None] | None = None):
+        self._on_change = on_change
         if contents is None:
             contents = {}
         # items must have unique names!
@@ -185,6 +197,8 @@ class Inventory:
             self._contents[to_add] += qty
         else:
             self._contents[to_add] = qty
+        if self._on_change:
+            self._on_change()
 
     def remove(self, to_remove: str, qty: int = 1):
         logger.debug(f"Removing {qty}x {to_remove} from inventory")
@@ -199,6 +213,8 @@ class Inventory:
             )
         elif self.contents[to_remove] == 0:
             self._contents.pop(to_remove)
+        if self._on_change:
+            self._on_change()
 
 
 @dataclass
@@ -209,55 +225,115 @@ class Abilities:
         if saved:
             self.from_saved(saved)
 
+    def __setattr__(self, name, val):
+        super().__setattr__(name, val)
+        self.__dict__.pop("count", None)
+
+    @cached_property
+    def count(self) -> int:
+        """Number of abilities learned; cached until an ability changes"""
+        return len(self.to_save())
+
     def to_save(self) -> dict:
-        return {key: val for key, val in self.__dict__.items() if val}
+        return ABILITIES_SCHEMA.encode(self)
 
     def from_saved(self, saved):
-        for key, val in saved.items():
-            setattr(self, key, val)
+        ABILITIES_SCHEMA.decode(saved, self)
 
 
 @dataclass
 class Flags:
-    def __init__(self, saved: dict | None = None):
+    def __init__(
+        self, saved: dict | None = None, on_change: Callable[[], None] | None = None
+    ):
+        # set first so __setattr__ can see it
+        object.__setattr__(self, "_on_change", on_change)
         self.humanity_warning_level = 0
         self.blessed_revive = 0
         self.cursed_revive = 0
         self.cursed_power = 0
+        # the game carries on after GAME OVER, but the run only goes on the
+        # leaderboard once
+        self.run_recorded = False
 
         if saved:
             self.from_saved(saved)
 
+    def __setattr__(self, name, val):
+        super().__setattr__(name, val)
+        if self._on_change:
+            self._on_change()
+
     def to_save(self):
-        return {key: val for key, val in self.__dict__.items() if val}
+        return FLAGS_SCHEMA.encode(self)
 
     def from_saved(self, saved):
-        for key, val in saved.items():
-            setattr(self, key, val)
+        FLAGS_SCHEMA.decode(saved, self)
 
 
 class Player(LivingThing):
-    def __init__(self, gui: "GUIWrapper"):
+    # flags changes (cursed_power) invalidate everything
+    _derived_from = {"level": ("attack_power",)}
+    # what the stats panel shows; setting any of these calls on_stats_change
+    _panel_stats = frozenset(
+        ("_hp", "_max_hp", "_level", "_humanity", "xp", "money", "tile_index")
+    )
+    on_stats_change: Callable[[], None] | None = None
+
+    def __init__(
+        self,
+        gui: "GUIWrapper",
+        save_path: Path | None = SAVE_PATH,
+        profile: str | None = None,
+        seed: int | None = None,
+    ):
         super().__init__()
         self.gui = gui
+        self.save_path = save_path  # None means don't load or save
+        # runs are recorded under this name; file saves use the file's name
+        self.profile = profile or (save_path.stem if save_path else None)
+        # profiles and runs live in one database next to the save file
+        self.store = (
+            SaveStore.shared(save_path.with_suffix(".mapdb")) if save_path else None
+        )
         self.max_hp = 30
         self.hp = self.max_hp
         self.attack_power_base = 4  # base melee damage
-        self.inventory = Inventory()
+        self.inventory = Inventory(on_change=self.stats_changed)
         self.abilities = Abilities()
-        self.flags = Flags()
+        self.flags = Flags(on_change=self.invalidate_derived)
         self.armor = EquippedArmor()
+        # this session's stats, a sample per time tick; not saved
+        self.history = StatHistory()
         self.money = 0
         self.level = 1
         self.xp = 0
         self._humanity = 100  # out of 100
         self.time = 0
         self.tile_index = 1
-        if SAVE_PATH.exists():
+        # every dimension and roll of the run derives from this; a save replaces it
+        self.seed = random.getrandbits(31) if seed is None else seed
+        if not save_path:
+            self.journal = None
+        elif profile:
+            self.journal = ProfileJournal(self.store, profile)
+        else:
+            self.journal = SaveJournal(save_path, writer=BackgroundSaveWriter.shared())
+        if self.journal and self.journal.exists():
             self.load_from_file()
 
-    @property
+    def __setattr__(self, name, val):
+        super().__setattr__(name, val)
+        if name in self._panel_stats:
+            self.stats_changed()
+
+    def stats_changed(self):
+        if self.on_stats_change:
+            self.on_stats_change()
+
+    @cached_property
     def attack_power(self):
+        """Cached until level or flags change"""
         power = (self.level * 0.8) + 4
         if self.flags.cursed_power:
             power *= 1.1**self.flags.cursed_power
@@ -303,47 +379,45 @@ class Player(LivingThing):
         base_chance = 60
         return min(base_chance + self.level, 100)
 
+    def save_data(self) -> dict:
+        save_data = PLAYER_SCHEMA.encode(self)
+        save_data[VERSION_KEY] = PLAYER_SCHEMA.version
+        return save_data
+
     def save_to_file(self):
-        logger.debug("Saving to %s", SAVE_PATH)
-        save_data = {
-            "max_hp": self.max_hp,
-            "hp": self.hp,
-            "money": self.money,
-            "level": self.level,
-            "tile_index": self.tile_index,
-            "xp": self.xp,
-            "humanity": self.humanity,
-            "time": self.time,
-        }
-        for object_to_save in ["abilities", "flags", "armor", "inventory"]:
-            save_value = getattr(self, object_to_save).to_save()
-            if save_value:
-                save_data[object_to_save] = save_value
-        with open(SAVE_PATH, "w") as savefile:
-            json.dump(save_data, savefile)
+        """Write a full snapshot of the player"""
+        if not self.journal:
+            return
+        logger.debug("Saving %s", self.profile)
+        self.journal.write_snapshot(self.save_data())
+
+    def autosave(self):
+        """Append whatever changed since the last save to the journal"""
+        if not self.journal:
+            return
+        self.journal.append(self.save_data())
+
+    def export_history(self):
+        """Append the stats sampled since the last export to a CSV next to the save"""
+        if not self.save_path:
+            return
+        path = self.save_path.with_name(f"{self.profile}-history.csv")
+        # the file may not be written yet after this session's first export
+        header = not self.history.exports and not path.exists()
+        rows = self.history.csv_rows(self.seed, header=header)
+        BackgroundSaveWriter.shared().append(path, rows)
 
     def load_from_file(self):
-        logger.debug("Loading save from %s", SAVE_PATH)
-        with open(SAVE_PATH) as savefile:
-            try:
-                save_data = json.load(savefile)
-            except json.decoder.JSONDecodeError as exc:
-                logger.error("Error decoding savefile; starting new game")
-                logger.exception(exc)
-                return
-        for entry, value in save_data.items():
-            if entry == "inventory":
-                self.inventory = Inventory(contents=value)
-            elif entry == "abilities":
-                self.abilities = Abilities(saved=value)
-            elif entry == "flags":
-                self.flags = Flags(saved=value)
-            elif entry == "armor":
-                self.armor = EquippedArmor(saved=value)
-            elif entry == "humanity":
-                self._humanity = value
-            else:
-                setattr(self, entry, value)
+        logger.debug("Loading save %s", self.profile)
+        save_data = self.journal.load()
+        if save_data:
+            self.load_save_data(save_data)
+
+    def load_save_data(self, save_data: dict):
+        PLAYER_SCHEMA.decode(PLAYER_SCHEMA.migrate(save_data), self)
+        self.invalidate_derived()
+        # the inventory is swapped out under Inventory's nose
+        self.stats_changed()
 
     @property
     def score(self):
@@ -352,7 +426,7 @@ class Player(LivingThing):
             + self.xp
             + (self.level * 10)
             + (self.tile_index * 20)
-            + (len(self.abilities.to_save()) * 20)
+            + (self.abilities.count * 20)
             + self.humanity
         )
 
@@ -360,7 +434,7 @@ class Player(LivingThing):
         xp_txt = color_string(f"{xp} XP", "stat_up")
         self.gui.main_out.add_line(f"You gained {xp_txt}!")
         self.xp += xp
-        if self.xp > (25 * pow(self.level, 1.3)):
+        if self.xp > (XP_CURVE_BASE * pow(self.level, XP_CURVE_EXPONENT)):
             lvl_txt = color_string(f"You have leveled up!", "level_up")
             self.gui.main_out.add_line(lvl_txt)
             self.level += 1
@@ -391,6 +465,14 @@ class Player(LivingThing):
 
     def game_over(self):
         logger.info(f"GAME OVER - Score: {self.score}")
+        # set with or without a store: it's saved state, so replays (which have
+        # no store) have to end up with it too
+        if not self.flags.run_recorded:
+            self.flags.run_recorded = True
+            if self.store:
+                self.store.record_run(
+                    self.profile, self.score, self.tile_index, self.level, self.time
+                )
         self.gui.main_out.add_line("\nYour humanity drops to zero!")
         self.gui.main_out.add_line(
             "No longer will you rise to fight the endless hoard of monsters."
@@ -447,17 +529,17 @@ class Player(LivingThing):
             )
         self.recover_hp(int(self.max_hp * recover_ratio))
 
-    def take_damage(self, dmg: int) -> bool:
+    def take_damage(self, dmg: int, rng=random) -> bool:
         """return True if you died"""
         # each armor point has a 50% chance to mitigate dmg
         for x in range(self.armor.armor_score):
-            if random.random() >= 0.5:
+            if rng.random() >= 0.5:
                 dmg -= 1
         if dmg < 1:
             dmg = 1
         ouch = random.choice(["Ouch", "Oof", "Owwie", "Yikes", "Oh no"])
-        dmg_txt = color_string(f"You take {dmg} damage!", "damage_taken")
-        self.gui.main_out.add_line(f"{ouch}! {dmg_txt}")
+        dmg_txt = styled(f"You take {dmg} damage!", "damage_taken")
+        self.gui.main_out.add_line(compose(f"{ouch}! ", dmg_txt))
         self.hp -= dmg
         if self.hp > 0:
             return False
@@ -496,3 +578,63 @@ class Player(LivingThing):
         if not getattr(self.abilities, ability_name):
             self.gui.main_out.add_line("You have learned a new ability!")
             setattr(self.abilities, ability_name, True)
+
+
+ARMOR_PIECE_SCHEMA = Schema(
+    ArmorPiece,
+    [
+        Field("name", str),
+        Field("armor_slot", ArmorSlot),
+        Field("armor_amount", int),
+        Field("modifier", ArmorModifier, default=None),
+    ],
+)
+EQUIPPED_ARMOR_SCHEMA = Schema(
+    EquippedArmor,
+    [Field(slot.name, ARMOR_PIECE_SCHEMA, default=None) for slot in ArmorSlot],
+    new=EquippedArmor,
+)
+ABILITIES_SCHEMA = Schema(
+    Abilities,
+    [
+        Field("passive_heal_double", bool, default=False),
+        Field("reduced_humanity_loss", bool, default=False),
+    ],
+    new=Abilities,
+)
+FLAGS_SCHEMA = Schema(
+    Flags,
+    [
+        Field("humanity_warning_level", int, default=0),
+        Field("blessed_revive", int, default=0),
+        Field("cursed_revive", int, default=0),
+        Field("cursed_power", int, default=0),
+        Field("run_recorded", bool, default=False),
+    ],
+    new=Flags,
+)
+# bump the version and add a migration when the layout changes
+PLAYER_SCHEMA = Schema(
+    Player,
+    [
+        Field("max_hp", int),
+        Field("hp", int),
+        Field("money", int),
+        Field("level", int),
+        Field("tile_index", int),
+        Field("xp", int),
+        # straight to the backing attribute: no humanity warnings on load
+        Field("humanity", int, attr="_humanity"),
+        Field("time", int),
+        Field("seed", int),
+        Field("abilities", ABILITIES_SCHEMA, default=EMPTY),
+        Field("flags", FLAGS_SCHEMA, default=EMPTY),
+        Field("armor", EQUIPPED_ARMOR_SCHEMA, default=EMPTY),
+        Field("inventory", dict, default=EMPTY, attr="inventory._contents"),
+    ],
+    version=2,
+    migrations={
+        # version 1 had no run seed; those runs carry on with a fresh one
+        1: lambda data: data,
+    },
+)
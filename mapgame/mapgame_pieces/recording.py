@@ -0,0 +1,148 @@
+"""Session recordings: everything needed to play a session again offline
+
+Every roll in a run comes from streams derived from the run seed, so a session
+is reproduced exactly by its starting state plus the commands typed. A
+recording (.maprec) is plain text, one record per line:
+
+    {"version": 2, "seed": ..., "player": {...}, "tile": "..."}
+    north
+    open
+    @12 <hex>
+    ...
+    #<state hash>
+
+(a command that starts with #, @ or a backslash gets a backslash put in front)
+
+The first line is the starting state: the player's save and, if the session
+resumed a saved tile, that tile as hex tile_codec data (null if the tile was
+generated from the seed). Then every command, as typed. A dimension read back
+from the player's tile archive can't be rebuilt from the seed, so each one is
+recorded as it's read (an @ line: dimension number, hex tile_codec data). The
+last line is the hash of the game state when the session ended; a session that
+crashed has none.
+"""
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".maprec"
+RECORDING_VERSION = 2  # version 1 recordings had no archive lines
+HASH_PREFIX = "#"
+ARCHIVE_PREFIX = "@"
+# put in front of commands that would otherwise look like a hash line
+ESCAPE = "\\"
+# older recordings are deleted when a new session starts
+RECORDINGS_KEPT = 20
+
+
+@dataclass
+class Recording:
+    seed: int
+    player: dict
+    tile: bytes | None  # tile_codec data, if the session resumed a saved tile
+    commands: list[str] = field(default_factory=list)
+    final_hash: str | None = None  # None if the session never finished
+    # tile_codec data read from the tile archive, by dimension, in read order
+    archived: dict[int, list[bytes]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> "Recording":
+        with open(path) as rec_file:
+            header = json.loads(rec_file.readline())
+            if header["version"] > RECORDING_VERSION:
+                raise ValueError(f"Can't replay version {header['version']} recordings")
+            recording = cls(
+                seed=header["seed"],
+                player=header["player"],
+                tile=bytes.fromhex(header["tile"]) if header["tile"] else None,
+            )
+            for line in rec_file:
+                line = line.rstrip("\n")
+                if line.startswith(HASH_PREFIX):
+                    recording.final_hash = line[len(HASH_PREFIX) :]
+                    break
+                if line.startswith(ARCHIVE_PREFIX):
+                    dimension, tile_hex = line[len(ARCHIVE_PREFIX) :].split(" ")
+                    recording.archived.setdefault(int(dimension), []).append(
+                        bytes.fromhex(tile_hex)
+                    )
+                    continue
+                recording.commands.append(line.removeprefix(ESCAPE))
+        return recording
+
+
+class SessionRecorder:
+    """Writes a recording as the session is played
+
+    Line buffered, so a crash loses at most the command that caused it.
+    """
+
+    def __init__(self, path: Path, seed: int, player: dict, tile: bytes | None):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "w", buffering=1)
+        header = {
+            "version": RECORDING_VERSION,
+            "seed": seed,
+            "player": player,
+            "tile": tile.hex() if tile else None,
+        }
+        self._file.write(json.dumps(header, separators=(",", ":")) + "\n")
+
+    @classmethod
+    def start(
+        cls,
+        recordings_dir: Path,
+        name: str,
+        seed: int,
+        player: dict,
+        tile: bytes | None,
+    ) -> "SessionRecorder":
+        """Begin a new recording in `recordings_dir`, clearing out old ones"""
+        old = sorted(recordings_dir.glob(f"*{SUFFIX}"), key=lambda p: p.stat().st_mtime)
+        for path in old[: max(0, len(old) - RECORDINGS_KEPT + 1)]:
+            path.unlink(missing_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return cls(recordings_dir / f"{name}-{stamp}{SUFFIX}", seed, player, tile)
+
+    def record(self, command: str):
+        # input boxes can't submit newlines, but don't let one split a record
+        command = command.replace("\n", " ")
+        if command.startswith((HASH_PREFIX, ARCHIVE_PREFIX, ESCAPE)):
+            command = ESCAPE + command
+        self._file.write(command + "\n")
+
+    def record_archived(self, dimension: int, tile_data: bytes):
+        self._file.write(f"{ARCHIVE_PREFIX}{dimension} {tile_data.hex()}\n")
+
+    def close(self, final_hash: str):
+        if self._file.closed:
+            return
+        self._file.write(HASH_PREFIX + final_hash + "\n")
+        self._file.close()
+        logger.info(f"Session recorded to {self.path}")
+
+
+class RecordedArchive:
+    """Stands in for the player's TileArchive in a replay: gives back what the
+    session read from the archive, in the same order"""
+
+    def __init__(self, archived: dict[int, list[bytes]]):
+        self._archived = {
+            dimension: deque(records) for dimension, records in archived.items()
+        }
+
+    def get(self, dimension: int) -> bytes | None:
+        records = self._archived.get(dimension)
+        return records.popleft() if records else None
+
+    def put(self, dimension: int, tile_data: bytes):
+        pass
+
+    def dimensions(self) -> list[int]:
+        return sorted(self._archived)
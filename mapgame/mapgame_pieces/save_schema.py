@@ -0,0 +1,248 @@
+"""Declared save layouts that compile to specialised encode/decode functions
+
+A Schema lists the fields of one saved class. The first time it's used it
+generates plain Python functions for that exact list of fields (the way
+dataclasses builds __init__), so saving and loading is straight-line
+attribute access with no reflection over __dict__ and no setattr of
+arbitrary keys. Unknown keys in a save are logged and ignored.
+
+Two encodings are generated:
+    encode/decode   dicts for the JSON saves and the journal
+    pack/unpack     a compact binary form
+"""
+import logging
+import struct
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+REQUIRED = object()  # Field default meaning "always saved, left alone if missing"
+EMPTY = object()  # Field default for nested kinds: left out when empty
+VERSION_KEY = "version"
+
+INT = struct.Struct("<i")
+U16 = struct.Struct("<H")
+# binary struct codes for the fixed-size kinds
+FIXED_CODES = {int: "i", bool: "?"}
+
+
+@dataclass(frozen=True)
+class Field:
+    name: str  # key in the save
+    kind: Any  # int, bool, str, an Enum, dict (str -> int) or a nested Schema
+    # left out of the save when the value equals this, and used when it's missing
+    default: Any = REQUIRED
+    attr: str | None = None  # attribute (may be dotted) if it isn't `name`
+
+    @property
+    def path(self) -> str:
+        return self.attr or self.name
+
+
+class Schema:
+    """Fields of one saved class, plus migrations for older versions of it"""
+
+    def __init__(
+        self,
+        cls: type,
+        fields: list[Field],
+        version: int = 1,
+        migrations: dict[int, Callable[[dict], dict]] | None = None,
+        new: Callable[[], Any] | None = None,
+    ):
+        self.cls = cls
+        self.fields = fields
+        self.version = version
+        # migrations[n] turns a version n save into a version n + 1 save
+        self.migrations = migrations or {}
+        # makes an empty instance for decode to fill in
+        self.new = new or (lambda: cls.__new__(cls))
+        self.known_keys = frozenset(field.name for field in fields)
+        self._codec: dict[str, Callable] | None = None
+
+    @property
+    def codec(self) -> dict[str, Callable]:
+        if self._codec is None:
+            self._codec = _compile(self)
+        return self._codec
+
+    def encode(self, obj) -> dict:
+        return self.codec["encode"](obj)
+
+    def decode(self, data: dict, obj=None):
+        """Fill in `obj` (or a new instance) from `data`; returns it"""
+        return self.codec["decode"](data, self.new() if obj is None else obj)
+
+    def pack(self, obj) -> bytes:
+        out = bytearray(U16.pack(self.version))
+        self.codec["pack"](obj, out)
+        return bytes(out)
+
+    def unpack(self, data: bytes, obj=None):
+        (version,) = U16.unpack_from(data)
+        if version != self.version:
+            raise ValueError(f"Can't unpack version {version} {self.cls.__name__}")
+        obj, _ = self.codec["unpack"](
+            data, U16.size, self.new() if obj is None else obj
+        )
+        return obj
+
+    def migrate(self, data: dict) -> dict:
+        """Bring a saved dict up to the current version; drops the version key"""
+        # saves from before versioning are version 1
+        version = data.pop(VERSION_KEY, 1)
+        if version > self.version:
+            logger.warning(
+                f"{self.cls.__name__} save is version {version}, newer than {self.version}"
+            )
+        while version < self.version:
+            logger.info(f"Migrating {self.cls.__name__} save from version {version}")
+            data = self.migrations[version](data)
+            version += 1
+        return data
+
+    def warn_unknown(self, data: dict):
+        for key in data.keys() - self.known_keys:
+            logger.warning(f"Ignoring unknown {self.cls.__name__} save key {key!r}")
+
+
+def _compile(schema: Schema) -> dict[str, Callable]:
+    """Generate the four codec functions for `schema`"""
+    namespace: dict[str, Any] = {
+        "INT": INT,
+        "struct": struct,
+        "U16": U16,
+        "schema": schema,
+    }
+    fixed = [
+        (i, field) for i, field in enumerate(schema.fields) if field.kind in FIXED_CODES
+    ]
+    fixed_struct = struct.Struct(
+        "<" + "".join(FIXED_CODES[field.kind] for _, field in fixed)
+    )
+    namespace["FIXED"] = fixed_struct
+    encode = ["def encode(obj):", "    out = {}"]
+    decode = ["def decode(data, obj):", "    get = data.get"]
+    pack = ["def pack(obj, out):"]
+    unpack = ["def unpack(data, offset, obj):"]
+    if fixed:
+        values = ", ".join(f"obj.{field.path}" for _, field in fixed)
+        pack.append(f"    out += FIXED.pack({values})")
+        targets = ", ".join(f"obj.{field.path}" for _, field in fixed)
+        unpack.append(f"    {targets}, = FIXED.unpack_from(data, offset)")
+        unpack.append("    offset += FIXED.size")
+
+    for i, field in enumerate(schema.fields):
+        key, path, kind = field.name, field.path, field.kind
+        namespace[f"default_{i}"] = field.default
+        default = f"default_{i}"
+        # encode: value -> json-able
+        if isinstance(kind, Schema):
+            namespace[f"sub_{i}"] = kind
+            to_json = f"sub_{i}.codec['encode'](v)"
+            from_json = (
+                f"sub_{i}.codec['decode'](v, cur if cur is not None else sub_{i}.new())"
+            )
+        elif isinstance(kind, type) and issubclass(kind, Enum):
+            namespace[f"enum_{i}"] = kind
+            to_json = "v.value"
+            from_json = f"enum_{i}(v)"
+        else:
+            to_json = from_json = "v"
+
+        nested = isinstance(kind, Schema) or kind is dict
+        encode.append(f"    v = obj.{path}")
+        if field.default is REQUIRED:
+            encode.append(f"    out[{key!r}] = {to_json}")
+        elif nested:
+            # nested objects and dicts are left out when there's nothing in them
+            encode.append(f"    if v is not None:")
+            encode.append(f"        v = {to_json}")
+            encode.append(f"        if v:")
+            encode.append(f"            out[{key!r}] = v")
+        elif field.default is None:
+            encode.append(f"    if v is not None:")
+            encode.append(f"        out[{key!r}] = {to_json}")
+        else:
+            encode.append(f"    if v != {default}:")
+            encode.append(f"        out[{key!r}] = {to_json}")
+
+        decode.append(f"    v = get({key!r})")
+        if isinstance(kind, Schema):
+            decode.append(f"    cur = obj.{path}")
+        if field.default is REQUIRED:
+            decode.append(f"    if v is not None:")
+            decode.append(f"        obj.{path} = {from_json}")
+        elif field.default is EMPTY:
+            decode.append(f"    if v is None:")
+            decode.append(f"        v = {{}}")
+            decode.append(f"    obj.{path} = {from_json}")
+        else:
+            decode.append(f"    if v is None:")
+            decode.append(f"        obj.{path} = {default}")
+            decode.append(f"    else:")
+            decode.append(f"        obj.{path} = {from_json}")
+
+        if kind in FIXED_CODES:
+            continue
+        pack.append(f"    v = obj.{path}")
+        if isinstance(kind, Schema):
+            unpack.append(f"    cur = obj.{path}")
+            pack.append("    if v is None:")
+            pack.append("        out.append(0)")
+            pack.append("    else:")
+            pack.append("        out.append(1)")
+            pack.append(f"        sub_{i}.codec['pack'](v, out)")
+            unpack.append("    offset += 1")
+            unpack.append("    if data[offset - 1]:")
+            unpack.append(
+                f"        obj.{path}, offset = sub_{i}.codec['unpack'](data, offset,"
+                f" cur if cur is not None else sub_{i}.new())"
+            )
+            unpack.append("    else:")
+            unpack.append(f"        obj.{path} = None")
+        elif isinstance(kind, type) and issubclass(kind, Enum):
+            # 0 is None, otherwise 1 + the member's position
+            namespace[f"members_{i}"] = list(kind)
+            namespace[f"index_{i}"] = {m: n + 1 for n, m in enumerate(kind)}
+            pack.append(f"    out.append(0 if v is None else index_{i}[v])")
+            unpack.append(f"    n = data[offset]")
+            unpack.append(f"    offset += 1")
+            unpack.append(f"    obj.{path} = members_{i}[n - 1] if n else None")
+        elif kind is str:
+            pack.append("    v = v.encode()")
+            pack.append("    out += U16.pack(len(v))")
+            pack.append("    out += v")
+            unpack.append("    (n,) = U16.unpack_from(data, offset)")
+            unpack.append("    offset += U16.size")
+            unpack.append(f"    obj.{path} = data[offset : offset + n].decode()")
+            unpack.append("    offset += n")
+        elif kind is dict:
+            # all the names in one \0 separated string, then all the counts
+            pack.append("    names = '\\0'.join(v).encode()")
+            pack.append("    out += INT.pack(len(v))")
+            pack.append("    out += INT.pack(len(names))")
+            pack.append("    out += names")
+            pack.append("    out += struct.pack(f'<{len(v)}i', *v.values())")
+            unpack.append("    n, size = struct.unpack_from('<2i', data, offset)")
+            unpack.append("    offset += 2 * INT.size")
+            unpack.append("    names = data[offset : offset + size].decode()")
+            unpack.append("    offset += size")
+            unpack.append("    counts = struct.unpack_from(f'<{n}i', data, offset)")
+            unpack.append("    offset += n * INT.size")
+            unpack.append("    v = dict(zip(names.split('\\0'), counts)) if n else {}")
+            unpack.append(f"    obj.{path} = v")
+        else:
+            raise TypeError(f"Can't save {field.name} of kind {kind!r}")
+
+    encode.append("    return out")
+    decode.append("    if not data.keys() <= schema.known_keys:")
+    decode.append("        schema.warn_unknown(data)")
+    decode.append("    return obj")
+    pack.append("    return out")
+    unpack.append("    return obj, offset")
+    source = "\n".join(encode + decode + pack + unpack)
+    exec(source, namespace)
+    return {name: namespace[name] for name in ("encode", "decode", "pack", "unpack")}
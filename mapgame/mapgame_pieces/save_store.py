@@ -0,0 +1,315 @@
+"""SQLite save store: many player profiles and every finished run in one file
+
+Each profile row holds the player's last full save (JSON) and current tile (the
+tile_codec blob). Autosaves in between are JSON merge patches in their own table,
+like SaveJournal's journal lines. Finished runs go in their own table, indexed
+on score so the leaderboard is an index scan no matter how many runs have been
+recorded.
+"""
+import csv
+import json
+import logging
+import sqlite3
+import threading
+import time
+from copy import deepcopy
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TextIO
+
+from mapgame_pieces.journal import COMPACT_EVERY, apply_patch, diff
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    updated REAL,
+    save_json TEXT,
+    tile BLOB
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    profile_id INTEGER NOT NULL REFERENCES profiles(id),
+    score INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    turns INTEGER NOT NULL,
+    ended REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS save_patches (
+    id INTEGER PRIMARY KEY,
+    profile_id INTEGER NOT NULL REFERENCES profiles(id),
+    patch TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS save_patches_by_profile ON save_patches(profile_id, id);
+CREATE INDEX IF NOT EXISTS runs_by_score ON runs(score DESC);
+CREATE INDEX IF NOT EXISTS runs_by_profile_score ON runs(profile_id, score DESC);
+"""
+
+# sqlite3 keeps the compiled statement for each of these on the connection,
+# so they're only parsed once however often they run
+SELECT_PROFILE_ID = "SELECT id FROM profiles WHERE name = ?"
+INSERT_PROFILE = "INSERT INTO profiles (name, created) VALUES (?, ?)"
+SELECT_SAVE = "SELECT save_json FROM profiles WHERE id = ?"
+UPDATE_SAVE = "UPDATE profiles SET save_json = ?, updated = ? WHERE id = ?"
+SELECT_PATCHES = "SELECT patch FROM save_patches WHERE profile_id = ? ORDER BY id"
+INSERT_PATCH = "INSERT INTO save_patches (profile_id, patch) VALUES (?, ?)"
+COUNT_PATCHES = "SELECT COUNT(*) FROM save_patches WHERE profile_id = ?"
+DELETE_PATCHES = "DELETE FROM save_patches WHERE profile_id = ?"
+TOUCH_PROFILE = "UPDATE profiles SET updated = ? WHERE id = ?"
+SELECT_TILE = "SELECT tile FROM profiles WHERE id = ?"
+UPDATE_TILE = "UPDATE profiles SET tile = ?, updated = ? WHERE id = ?"
+INSERT_RUN = (
+    "INSERT INTO runs (profile_id, score, depth, level, turns, ended)"
+    " VALUES (?, ?, ?, ?, ?, ?)"
+)
+RUN_COLUMNS = "p.name, r.score, r.depth, r.level, r.turns, r.ended"
+SELECT_TOP = (
+    f"SELECT {RUN_COLUMNS} FROM runs r JOIN profiles p ON p.id = r.profile_id"
+    " ORDER BY r.score DESC LIMIT ?"
+)
+SELECT_TOP_FOR_PROFILE = (
+    f"SELECT {RUN_COLUMNS} FROM runs r JOIN profiles p ON p.id = r.profile_id"
+    " WHERE r.profile_id = ? ORDER BY r.score DESC LIMIT ?"
+)
+SELECT_ALL_RUNS = (
+    f"SELECT {RUN_COLUMNS} FROM runs r JOIN profiles p ON p.id = r.profile_id"
+    " ORDER BY r.id"
+)
+SELECT_PROFILES = "SELECT name, created, updated FROM profiles ORDER BY name"
+
+
+@dataclass(frozen=True)
+class RunRecord:
+    profile: str
+    score: int
+    depth: int
+    level: int
+    turns: int
+    ended: float  # unix time
+
+
+class SaveStore:
+    """One SQLite database of profiles and runs.
+
+    The database runs in WAL mode with synchronous=NORMAL: a commit is an
+    append to the write-ahead log without an fsync, so saving every few turns
+    costs next to nothing, and readers (e.g. the leaderboard script) never
+    block the game. The connection is opened on first use.
+
+    The game opens the store on the main thread but saves from the turn
+    worker, so the connection is shared between threads and every use of it
+    holds the store's lock.
+    """
+
+    _shared: dict[Path, "SaveStore"] = {}
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+        self._profile_ids: dict[str, int] = {}
+
+    @classmethod
+    def shared(cls, db_path: Path) -> "SaveStore":
+        """One store (and connection) per database file"""
+        if db_path not in cls._shared:
+            cls._shared[db_path] = cls(db_path)
+        return cls._shared[db_path]
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Only use while holding the lock"""
+        if self._conn is None:
+            logger.debug(f"Opening save store {self.db_path}")
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            # every table is created IF NOT EXISTS, so this also upgrades
+            if version < SCHEMA_VERSION:
+                with self._conn:
+                    self._conn.executescript(SCHEMA)
+                    self._conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def find_profile(self, name: str) -> int | None:
+        """Id of the named profile, or None if there's no such profile"""
+        with self._lock:
+            if name not in self._profile_ids:
+                row = self.conn.execute(SELECT_PROFILE_ID, (name,)).fetchone()
+                if not row:
+                    return None
+                self._profile_ids[name] = row[0]
+            return self._profile_ids[name]
+
+    def profile_id(self, name: str) -> int:
+        """Id of the named profile, creating it if it's new. Only for writes:
+        reading a profile that doesn't exist shouldn't create it"""
+        with self._lock:
+            profile_id = self.find_profile(name)
+            if profile_id is None:
+                with self.conn:
+                    cursor = self.conn.execute(INSERT_PROFILE, (name, time.time()))
+                profile_id = self._profile_ids[name] = cursor.lastrowid
+            return profile_id
+
+    def has_save(self, profile: str) -> bool:
+        return self.load(profile) is not None
+
+    def load(self, profile: str) -> dict | None:
+        """Last full save with the patches since applied over it"""
+        with self._lock:
+            profile_id = self.find_profile(profile)
+            if profile_id is None:
+                return None
+            row = self.conn.execute(SELECT_SAVE, (profile_id,)).fetchone()
+            patches = self.conn.execute(SELECT_PATCHES, (profile_id,)).fetchall()
+        save_data = json.loads(row[0]) if row and row[0] is not None else {}
+        for (patch,) in patches:
+            apply_patch(save_data, json.loads(patch))
+        return save_data or None
+
+    def save(self, profile: str, save_data: dict):
+        """Replace the full save; the patches over the old one go with it"""
+        with self._lock, self.conn:
+            profile_id = self.profile_id(profile)
+            self.conn.execute(
+                UPDATE_SAVE, (json.dumps(save_data), time.time(), profile_id)
+            )
+            self.conn.execute(DELETE_PATCHES, (profile_id,))
+
+    def save_patch(self, profile: str, patch: dict):
+        """Add a merge patch over the profile's save"""
+        with self._lock, self.conn:
+            profile_id = self.profile_id(profile)
+            self.conn.execute(INSERT_PATCH, (profile_id, json.dumps(patch)))
+            self.conn.execute(TOUCH_PROFILE, (time.time(), profile_id))
+
+    def patch_count(self, profile: str) -> int:
+        with self._lock:
+            profile_id = self.find_profile(profile)
+            if profile_id is None:
+                return 0
+            return self.conn.execute(COUNT_PATCHES, (profile_id,)).fetchone()[0]
+
+    def load_tile(self, profile: str) -> bytes | None:
+        with self._lock:
+            profile_id = self.find_profile(profile)
+            if profile_id is None:
+                return None
+            row = self.conn.execute(SELECT_TILE, (profile_id,)).fetchone()
+        return row[0] if row else None
+
+    def save_tile(self, profile: str, tile_data: bytes):
+        with self._lock, self.conn:
+            self.conn.execute(
+                UPDATE_TILE, (tile_data, time.time(), self.profile_id(profile))
+            )
+
+    def record_run(self, profile: str, score: int, depth: int, level: int, turns: int):
+        with self._lock, self.conn:
+            self.conn.execute(
+                INSERT_RUN,
+                (self.profile_id(profile), score, depth, level, turns, time.time()),
+            )
+
+    def record_runs(self, profile: str, runs: list[tuple[int, int, int, int, float]]):
+        """Bulk insert of (score, depth, level, turns, ended) in one transaction"""
+        with self._lock:
+            profile_id = self.profile_id(profile)
+            with self.conn:
+                self.conn.executemany(INSERT_RUN, ((profile_id, *run) for run in runs))
+
+    def leaderboard(self, top: int = 10, profile: str | None = None) -> list[RunRecord]:
+        """Best runs overall, or just the named profile's"""
+        with self._lock:
+            if profile is None:
+                rows = self.conn.execute(SELECT_TOP, (top,))
+            else:
+                profile_id = self.find_profile(profile)
+                if profile_id is None:
+                    return []
+                rows = self.conn.execute(SELECT_TOP_FOR_PROFILE, (profile_id, top))
+            return [RunRecord(*row) for row in rows]
+
+    def profiles(self) -> list[tuple[str, float, float | None]]:
+        with self._lock:
+            return self.conn.execute(SELECT_PROFILES).fetchall()
+
+    def export_runs(self, out_file: TextIO) -> int:
+        """Write every run as CSV; returns how many were written"""
+        writer = csv.writer(out_file)
+        writer.writerow(RunRecord.__dataclass_fields__)
+        n_runs = 0
+        with self._lock:
+            for row in self.conn.execute(SELECT_ALL_RUNS):
+                writer.writerow(row)
+                n_runs += 1
+        return n_runs
+
+
+class ProfileJournal:
+    """Saves a player to a SaveStore profile. Same interface as SaveJournal: an
+    autosave only stores what changed since the last save, and every
+    `compact_every` of them the full save is rewritten instead.
+
+    Unlike SaveJournal, writes happen on the calling thread. In the GUI that's
+    the turn worker, so the UI never waits on them, and with WAL and
+    synchronous=NORMAL a small write is an append to the log with no fsync.
+    """
+
+    def __init__(
+        self, store: SaveStore, profile: str, compact_every: int = COMPACT_EVERY
+    ):
+        self.store = store
+        self.profile = profile
+        self.compact_every = compact_every
+        self.appended = 0
+        self._last_saved: dict = {}
+
+    def exists(self) -> bool:
+        return self.store.has_save(self.profile)
+
+    def write_snapshot(self, save_data: dict):
+        self.store.save(self.profile, save_data)
+        self.appended = 0
+        self._last_saved = deepcopy(save_data)
+
+    def append(self, save_data: dict):
+        """Store what changed since the last save; compacts every so often"""
+        if self.appended >= self.compact_every:
+            self.write_snapshot(save_data)
+            return
+        patch = diff(self._last_saved, save_data)
+        if not patch:
+            return
+        self.store.save_patch(self.profile, patch)
+        self.appended += 1
+        apply_patch(self._last_saved, patch)
+
+    def load(self) -> dict | None:
+        save_data = self.store.load(self.profile)
+        # the patches already stored count towards the next compaction
+        self.appended = self.store.patch_count(self.profile)
+        self._last_saved = deepcopy(save_data) if save_data else {}
+        return save_data
+
+    def write_tile(self, tile_data: bytes):
+        self.store.save_tile(self.profile, tile_data)
+
+    def read_tile(self) -> bytes | None:
+        return self.store.load_tile(self.profile)
+
+    def flush(self):
+        pass
@@ -0,0 +1,115 @@
+import atexit
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WriteOp:
+    path: Path
+    data: str | bytes
+    append: bool  # False replaces the whole file
+
+
+def _replace_file(path: Path, data: str):
+    """Write to a temp file then rename over `path` so it's never half written"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb" if isinstance(data, bytes) else "w") as tmp_file:
+        tmp_file.write(data)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
+
+
+def _do_write(op: WriteOp):
+    if op.append:
+        with open(op.path, "ab" if isinstance(op.data, bytes) else "a") as out_file:
+            out_file.write(op.data)
+    else:
+        _replace_file(op.path, op.data)
+
+
+class SyncSaveWriter:
+    """Writes immediately on the calling thread"""
+
+    def replace(self, path: Path, data: str | bytes):
+        _do_write(WriteOp(path, data, append=False))
+
+    def append(self, path: Path, data: str | bytes):
+        _do_write(WriteOp(path, data, append=True))
+
+    def flush(self):
+        pass
+
+
+class BackgroundSaveWriter:
+    """Does save file I/O on a worker thread so the caller never waits on the disk.
+
+    Writes happen in the order they're queued, except that replacing a file
+    drops anything still queued for that file: only the newest contents
+    matter. Callers pass already-serialized strings, so nothing queued can
+    change underneath the writer. flush() blocks until the queue is empty and
+    runs automatically at interpreter exit.
+    """
+
+    _shared: "BackgroundSaveWriter | None" = None
+
+    def __init__(self):
+        self._queue: list[WriteOp] = []
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="save-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.flush)
+
+    @classmethod
+    def shared(cls) -> "BackgroundSaveWriter":
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def replace(self, path: Path, data: str | bytes):
+        with self._cond:
+            self._queue = [op for op in self._queue if op.path != path]
+            self._queue.append(WriteOp(path, data, append=False))
+            self._cond.notify_all()
+
+    def append(self, path: Path, data: str | bytes):
+        with self._cond:
+            self._queue.append(WriteOp(path, data, append=True))
+            self._cond.notify_all()
+
+    def flush(self):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._queue and not self._busy)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                op = self._queue.pop(0)
+                # batch up consecutive appends to the same file into one write
+                while (
+                    op.append
+                    and self._queue
+                    and self._queue[0].append
+                    and self._queue[0].path == op.path
+                ):
+                    op = WriteOp(op.path, op.data + self._queue.pop(0).data, True)
+                self._busy = True
+            try:
+                _do_write(op)
+            except Exception:
+                # anything escaping would kill the thread, and flush() would
+                # then wait forever on the ops left queued
+                logger.exception(f"Failed to write {op.path}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
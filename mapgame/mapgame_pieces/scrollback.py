@@ -0,0 +1,43 @@
+"""Append-only spill file for output that has scrolled out of memory
+
+The output window keeps only its most recent lines rendered in memory. Every
+turn's output is also appended here as one markup record, so older turns can
+be read back and re-rendered when the player scrolls up to them. The file is
+an anonymous temp file: it goes away with the session.
+"""
+import json
+import logging
+import os
+import tempfile
+from array import array
+
+logger = logging.getLogger(__name__)
+
+
+class ScrollbackSpill:
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        # byte offset of each record, then of the end of the file
+        self._offsets = array("Q", [0])
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def append(self, markup: str):
+        # json keeps the record's own newlines out of the record separators
+        record = json.dumps(markup).encode() + b"\n"
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(record)
+        self._offsets.append(self._offsets[-1] + len(record))
+
+    def read(self, start: int, stop: int) -> list[str]:
+        """Records [start, stop), oldest first"""
+        if start >= stop:
+            return []
+        self._file.flush()
+        self._file.seek(self._offsets[start])
+        data = self._file.read(self._offsets[stop] - self._offsets[start])
+        return [json.loads(record) for record in data.splitlines()]
+
+    def close(self):
+        self._file.close()
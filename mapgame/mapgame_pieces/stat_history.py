@@ -0,0 +1,90 @@
+"""Player stats over the run, checked once per time tick
+
+A sample is only taken on ticks where one of the stats changed, along with the
+time, so a quiet stretch costs nothing and the sample count only moves when
+there's something new to show. Samples go in a ring of typed arrays, one array
+per stat, so memory is fixed however long the session runs and a sample is a
+handful of array stores with no objects created. The stats panel draws
+sparklines from the most recent samples, and each limbo checkpoint appends the
+samples taken since the last one to a CSV.
+"""
+import csv
+import io
+import logging
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# samples kept; older ones are overwritten
+HISTORY_TICKS = 1024
+# player attributes sampled, in CSV column order
+HISTORY_STATS = ("hp", "humanity", "xp", "money", "tile_index")
+SPARK_BARS = "▁▂▃▄▅▆▇█"
+
+
+class StatHistory:
+    def __init__(self, capacity: int = HISTORY_TICKS):
+        self.capacity = capacity
+        self.times = array("q", bytes(8 * capacity))
+        self.stats = {stat: array("q", bytes(8 * capacity)) for stat in HISTORY_STATS}
+        self.samples = 0  # taken in total, including overwritten ones
+        self._exported = 0  # samples already written out by csv_rows
+        self.exports = 0  # calls to csv_rows
+
+    def __len__(self) -> int:
+        return min(self.samples, self.capacity)
+
+    def sample(self, player):
+        """Record the player's stats if any changed since the last sample"""
+        if self.samples:
+            last = (self.samples - 1) % self.capacity
+            for stat, values in self.stats.items():
+                if values[last] != getattr(player, stat):
+                    break
+            else:
+                return
+        i = self.samples % self.capacity
+        self.times[i] = player.time
+        for stat, values in self.stats.items():
+            values[i] = getattr(player, stat)
+        self.samples += 1
+
+    def _window(self, values: array, last: int) -> array:
+        """The newest `last` samples of `values`, oldest first"""
+        last = min(last, len(self))
+        end = self.samples % self.capacity
+        start = end - last
+        if start >= 0:
+            return values[start:end]
+        return values[start:] + values[:end]
+
+    def sparkline(self, stat: str, width: int) -> str:
+        """The last `width` samples of `stat`, scaled between their min and max"""
+        values = self._window(self.stats[stat], width)
+        if not values:
+            return ""
+        low, high = min(values), max(values)
+        if low == high:
+            return SPARK_BARS[0] * len(values)
+        scale = (len(SPARK_BARS) - 1) / (high - low)
+        return "".join(SPARK_BARS[round((v - low) * scale)] for v in values)
+
+    def csv_rows(self, seed: int, header: bool = False) -> str:
+        """CSV of the samples taken since the last call; ones that were
+        overwritten before they could be written out are lost"""
+        new = min(self.samples - self._exported, len(self))
+        if new < self.samples - self._exported:
+            logger.warning(
+                f"{self.samples - self._exported - new} stat samples were"
+                " overwritten before export"
+            )
+        self._exported = self.samples
+        self.exports += 1
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        if header:
+            writer.writerow(("seed", "time") + HISTORY_STATS)
+        columns = [self._window(self.times, new)]
+        columns += [self._window(self.stats[stat], new) for stat in HISTORY_STATS]
+        writer.writerows((seed,) + row for row in zip(*columns))
+        return out.getvalue()
@@ -0,0 +1,85 @@
+"""Game text as rich Text: cached markup parsing, and styled text without markup
+
+Most game text is markup built with utils.color_string, and most of it
+repeats: NPC and armor names, "You move north.", the damage flavour phrases.
+MARKUP_CACHE keeps the most recently parsed lines, so a repeat costs a dict
+lookup instead of a Text.from_markup call. Hot paths can skip markup
+altogether and build Text from styled() pieces with compose().
+
+Cached Text objects are shared, so treat them as read-only; join or compose
+them into new Text rather than styling them in place.
+"""
+import logging
+import time
+from collections import OrderedDict
+
+from rich.text import Text
+
+from mapgame_pieces.utils import COLOR_SCHEME
+
+logger = logging.getLogger(__name__)
+
+MARKUP_CACHE_SIZE = 4096
+
+
+class MarkupCache:
+    """Bounded LRU of parsed markup, with counters for the debug `markup` command"""
+
+    def __init__(self, max_entries: int = MARKUP_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._parsed: OrderedDict[str, Text] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.parse_time = 0.0  # seconds spent parsing misses
+
+    def parse(self, markup: str) -> Text:
+        text = self._parsed.get(markup)
+        if text is not None:
+            self.hits += 1
+            self._parsed.move_to_end(markup)
+            return text
+        start = time.perf_counter()
+        text = Text.from_markup(markup)
+        self.parse_time += time.perf_counter() - start
+        self.misses += 1
+        self._parsed[markup] = text
+        if len(self._parsed) > self.max_entries:
+            self._parsed.popitem(last=False)
+        return text
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def time_saved(self) -> float:
+        """Estimated seconds of parsing saved: hits at the average miss cost"""
+        return self.hits * self.parse_time / self.misses if self.misses else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Markup cache: {len(self._parsed)}/{self.max_entries} entries,"
+            f" {self.hits}/{self.hits + self.misses} hits ({self.hit_rate:.0%}),"
+            f" ~{self.time_saved * 1000:.1f} ms of parsing saved"
+        )
+
+
+MARKUP_CACHE = MarkupCache()
+
+
+def styled(string: str, color: str) -> Text:
+    """Like color_string, but straight to Text with no markup to parse"""
+    return Text(string, style=COLOR_SCHEME.get(color, color))
+
+
+def compose(*parts: str | Text) -> Text:
+    """Join Text pieces and plain strings (taken literally, not as markup)"""
+    return Text.assemble(*parts)
+
+
+def to_text(content: str | Text) -> Text:
+    """Text for one line of output: markup strings go through the cache"""
+    if isinstance(content, Text):
+        return content
+    return MARKUP_CACHE.parse(content)
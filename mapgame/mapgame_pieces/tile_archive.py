@@ -0,0 +1,126 @@
+"""Append-only archive of the dimensions a player has left behind
+
+Two files:
+    <name>.maparchive   records appended one after another: the run seed and
+                        dimension number, then the tile_codec data
+    <name>.mapindex     one fixed-width (offset, length) entry per dimension
+                        number, so finding a dimension is a single lookup
+
+Both are read through read-only memory maps, so opening one dimension only
+touches the pages holding it however big the archive gets. A dimension that
+is archived again (after being revisited) gets a new record and its index
+entry is pointed at it.
+
+An archive belongs to one run. Records from another run are never handed
+out, and opening an archive left by an earlier run clears it.
+"""
+import logging
+import mmap
+import struct
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# byte offset into the archive, record length; a length of 0 means not archived
+INDEX_ENTRY = struct.Struct("<QI")
+# run seed, dimension number
+RECORD_HEADER = struct.Struct("<qI")
+
+
+class TileArchive:
+    def __init__(self, path: Path, run_seed: int):
+        self.path = path
+        self.index_path = path.with_suffix(".mapindex")
+        self.run_seed = run_seed
+        self._maps: dict[Path, mmap.mmap] = {}
+        if self._first_run_seed() not in (None, run_seed):
+            logger.info(f"Clearing {path}: it's from an earlier run")
+            self.clear()
+
+    def _first_run_seed(self) -> int | None:
+        """Run seed of the oldest record; every record after it is from the
+        same run, since a new run clears the archive"""
+        if not self.path.exists() or self.path.stat().st_size < RECORD_HEADER.size:
+            return None
+        with open(self.path, "rb") as archive_file:
+            run_seed, _ = RECORD_HEADER.unpack(archive_file.read(RECORD_HEADER.size))
+        return run_seed
+
+    def clear(self):
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self.index_path.unlink(missing_ok=True)
+
+    def _map(self, path: Path, min_size: int) -> mmap.mmap | None:
+        """Read-only map of `path`, remapped if it's grown past what we mapped"""
+        current = self._maps.get(path)
+        if current is not None and len(current) >= min_size:
+            return current
+        if current is not None:
+            current.close()
+            del self._maps[path]
+        if not path.exists() or path.stat().st_size < min_size or not min_size:
+            return None
+        with open(path, "rb") as archive_file:
+            self._maps[path] = mmap.mmap(
+                archive_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        return self._maps[path]
+
+    def _entry(self, dimension: int) -> tuple[int, int]:
+        start = dimension * INDEX_ENTRY.size
+        index = self._map(self.index_path, start + INDEX_ENTRY.size)
+        if index is None:
+            return 0, 0
+        return INDEX_ENTRY.unpack_from(index, start)
+
+    def __contains__(self, dimension: int) -> bool:
+        return self._entry(dimension)[1] > 0
+
+    def get(self, dimension: int) -> bytes | None:
+        """The archived tile_codec record for this dimension, if there is one"""
+        offset, length = self._entry(dimension)
+        if not length:
+            return None
+        archive = self._map(self.path, offset + length)
+        if archive is None:
+            logger.warning(f"Archive index points past the end for #{dimension}")
+            return None
+        run_seed, archived = RECORD_HEADER.unpack_from(archive, offset)
+        if run_seed != self.run_seed or archived != dimension:
+            logger.warning(
+                f"Archive record for #{dimension} is #{archived} of run {run_seed}"
+            )
+            return None
+        return archive[offset + RECORD_HEADER.size : offset + length]
+
+    def put(self, dimension: int, data: bytes):
+        # data first, so the index never points at a half written record
+        with open(self.path, "ab") as archive_file:
+            offset = archive_file.tell()
+            archive_file.write(RECORD_HEADER.pack(self.run_seed, dimension) + data)
+        mode = "r+b" if self.index_path.exists() else "wb"
+        with open(self.index_path, mode) as index_file:
+            index_file.seek(dimension * INDEX_ENTRY.size)
+            index_file.write(INDEX_ENTRY.pack(offset, RECORD_HEADER.size + len(data)))
+
+    def dimensions(self) -> list[int]:
+        """Every archived dimension number"""
+        if not self.index_path.exists():
+            return []
+        n_entries = self.index_path.stat().st_size // INDEX_ENTRY.size
+        index = self._map(self.index_path, n_entries * INDEX_ENTRY.size)
+        if index is None:
+            return []
+        return [
+            dimension
+            for dimension, (_, length) in enumerate(
+                INDEX_ENTRY.iter_unpack(index[: n_entries * INDEX_ENTRY.size])
+            )
+            if length
+        ]
+
+    def close(self):
+        for archive_map in self._maps.values():
+            archive_map.close()
+        self._maps.clear()
@@ -0,0 +1,166 @@
+"""On-disk stock of pre-generated tiles, so portal trips don't wait on generation
+
+Tiles are generated ahead of the player in a background worker process and
+stored as tile_codec files, one per tile, named after their cache key:
+(width, height, level, generator version, seed). A tile is a pure function of
+that key, so a hit is exactly the tile that generating it here would give.
+Taking a tile deletes it; a dimension is only generated once per run. When the
+stock grows past `max_bytes` the oldest tiles are evicted.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from mapgame_pieces.map import Tile, TILE_GENERATOR_VERSION
+from mapgame_pieces.save_writer import SyncSaveWriter
+from mapgame_pieces.tile_codec import encode_tile, decode_tile
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".maptile"
+MAX_CACHE_BYTES = 4 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class TileKey:
+    width: int
+    height: int
+    level: int
+    version: int
+    seed: int
+
+    @property
+    def filename(self) -> str:
+        return (
+            f"{self.width}x{self.height}_{self.level}_{self.version}"
+            f"_{self.seed:016x}{SUFFIX}"
+        )
+
+    @classmethod
+    def from_filename(cls, name: str) -> "TileKey":
+        size, level, version, seed = name.removesuffix(SUFFIX).split("_")
+        width, height = size.split("x")
+        return cls(int(width), int(height), int(level), int(version), int(seed, 16))
+
+
+def _generate_tile_data(key: TileKey) -> bytes:
+    """Runs in the worker process"""
+    return encode_tile(Tile(None, key.width, key.height, key.level, key.seed))
+
+
+class TileCache:
+    def __init__(self, cache_dir: Path, max_bytes: int = MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.writer = SyncSaveWriter()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # cache key: file size, in the order they were written
+        self._entries: dict[TileKey, int] = {}
+        self._pending: set[TileKey] = set()
+        self._pool: ProcessPoolExecutor | None = None
+        self._load_index()
+
+    def _load_index(self):
+        if not self.cache_dir.exists():
+            return
+        found = []
+        for path in self.cache_dir.glob(f"*{SUFFIX}"):
+            try:
+                key = TileKey.from_filename(path.name)
+            except ValueError:
+                continue
+            if key.version != TILE_GENERATOR_VERSION:
+                # made by a different generator; it would play differently
+                path.unlink(missing_ok=True)
+                continue
+            stat = path.stat()
+            found.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(found, key=lambda entry: entry[0]):
+            self._entries[key] = size
+        logger.debug(f"Tile cache has {len(self._entries)} tiles ready")
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(self._entries.values())
+
+    def take(self, width: int, height: int, level: int, seed: int, gui) -> Tile | None:
+        """The pre-generated tile for this level and seed, or None if there isn't one"""
+        key = TileKey(width, height, level, TILE_GENERATOR_VERSION, seed)
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                self.misses += 1
+                return None
+        path = self.cache_dir / key.filename
+        try:
+            data = path.read_bytes()
+            path.unlink()
+            tile, _ = decode_tile(data, gui)
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Dropping unreadable cached tile {path.name}: {exc}")
+            self.misses += 1
+            return None
+        # untouched since generation, so it can be rebuilt from the seed later
+        tile.mark_generated(key.seed)
+        self.hits += 1
+        return tile
+
+    def fill(self, width: int, height: int, seeds: dict[int, int]):
+        """Generate tiles in the background for any of `seeds` (level: seed) that
+        aren't in stock"""
+        keys = [
+            TileKey(width, height, level, TILE_GENERATOR_VERSION, seed)
+            for level, seed in seeds.items()
+        ]
+        with self._lock:
+            wanted = [
+                key
+                for key in keys
+                if key not in self._entries and key not in self._pending
+            ]
+            self._pending.update(wanted)
+        if not wanted:
+            return
+        if self._pool is None:
+            # one worker: this is a trickle of tiles, not a rush
+            self._pool = ProcessPoolExecutor(max_workers=1)
+        for key in wanted:
+            future = self._pool.submit(_generate_tile_data, key)
+            future.add_done_callback(lambda f, key=key: self._store(key, f))
+
+    def _store(self, key: TileKey, future: Future):
+        data = None
+        if future.cancelled():
+            pass
+        elif future.exception():
+            logger.warning(f"Background tile generation failed: {future.exception()}")
+        else:
+            data = future.result()
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                self.writer.replace(self.cache_dir / key.filename, data)
+            except OSError:
+                logger.exception("Failed to write cached tile")
+                data = None
+        with self._lock:
+            # in the same step as adding the entry, so fill() never sees neither
+            self._pending.discard(key)
+            if data is not None:
+                self._entries[key] = len(data)
+                self._evict()
+
+    def _evict(self):
+        """Drop the oldest tiles until the stock fits in max_bytes; hold the lock"""
+        total = self.size_bytes
+        while total > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            total -= self._entries.pop(key)
+            (self.cache_dir / key.filename).unlink(missing_ok=True)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
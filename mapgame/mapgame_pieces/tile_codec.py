@@ -0,0 +1,251 @@
+"""Compact binary format for a whole Tile, so a dimension can be resumed
+
+Layout (little endian):
+    header      magic, version, width, height, level, flags, npc count,
+                player x, player y
+    edges       2 bits per cell (path east, path south), bit packed
+    explored    1 bit per cell, bit packed
+    cells       4 bits per cell: room code in the low 3 bits, chest in the top bit
+    npcs        one fixed-width NPC_STRUCT record per NPC
+"""
+import logging
+import struct
+
+from mapgame_pieces.alive import NPC
+from mapgame_pieces.conversations import (
+    Conversation,
+    NoConversation,
+    TestConversation,
+    RiddleConvo,
+    IntroConvo,
+    WisdomConvo,
+    BuffConvo,
+    CurseConvo,
+)
+from mapgame_pieces.map import Tile, Room, RIDDLES
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MGT"
+VERSION = 1
+HEADER = struct.Struct("<3sBHHHBHHH")
+NAME_BYTES = 40
+# x, y, level, hp, max_hp, attack_power_base, xp_reward, player_attitude,
+# npc flags, conversation type, conversation progress, conversation flags,
+# riddle index, name
+NPC_STRUCT = struct.Struct(f"<HHHhHHHbBBBBB{NAME_BYTES}s")
+
+ALL_VISIBLE = 1
+
+# room code 0 is an empty room
+ROOM_CODES = {"entrance": 1, "portal": 2, "medbay": 3}
+ROOM_ICONS = {"entrance": "[e]", "portal": "[p]", "medbay": "[m]"}
+ROOM_NAMES = {code: name for name, code in ROOM_CODES.items()}
+CHEST_BIT = 0b1000
+
+NPC_DEAD = 1
+NPC_WANDERS = 2
+
+# conversation class: (type code, attribute holding its progress)
+CONVERSATION_TYPES: dict[type, tuple[int, str | None]] = {
+    Conversation: (0, None),
+    NoConversation: (1, None),
+    TestConversation: (2, "stage"),
+    RiddleConvo: (3, "guess_number"),
+    IntroConvo: (4, "stage"),
+    WisdomConvo: (5, "given_wisdom"),
+    BuffConvo: (6, "given_buff"),
+    CurseConvo: (7, "given_curse"),
+}
+CONVERSATION_CLASSES = {code: cls for cls, (code, _) in CONVERSATION_TYPES.items()}
+NO_CONVERSATION_CODE = 255
+CONVO_CAN_LEAVE = 1
+CONVO_HAS_ENDED = 2
+CONVO_ANSWERED = 4
+CONVO_ANSWERED_CORRECTLY = 8
+
+
+def _pack_bits(bits: list[bool]) -> bytes:
+    packed = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            packed[i >> 3] |= 1 << (i & 7)
+    return bytes(packed)
+
+
+def _unpack_bits(packed: bytes, n_bits: int) -> list[bool]:
+    return [bool(packed[i >> 3] & (1 << (i & 7))) for i in range(n_bits)]
+
+
+def _pack_nibbles(nibbles: list[int]) -> bytes:
+    packed = bytearray((len(nibbles) + 1) // 2)
+    for i, nibble in enumerate(nibbles):
+        packed[i >> 1] |= nibble << (4 * (i & 1))
+    return bytes(packed)
+
+
+def _unpack_nibbles(packed: bytes, n_nibbles: int) -> list[int]:
+    return [(packed[i >> 1] >> (4 * (i & 1))) & 0xF for i in range(n_nibbles)]
+
+
+def _encode_npc(npc: NPC) -> bytes:
+    convo = npc.conversation
+    convo_code, counter_attr = NO_CONVERSATION_CODE, None
+    convo_flags = riddle = 0
+    if convo is not None:
+        convo_code, counter_attr = CONVERSATION_TYPES[type(convo)]
+        convo_flags = (CONVO_CAN_LEAVE if convo.can_leave else 0) | (
+            CONVO_HAS_ENDED if convo.has_ended else 0
+        )
+        if isinstance(convo, RiddleConvo):
+            convo_flags |= (CONVO_ANSWERED if convo.answered else 0) | (
+                CONVO_ANSWERED_CORRECTLY if convo.answered_correctly else 0
+            )
+            riddle = next(
+                (i for i, (text, _) in enumerate(RIDDLES) if text == convo.riddle_text),
+                0,
+            )
+    name = npc.name.encode()
+    if len(name) > NAME_BYTES:
+        logger.warning(f"NPC name will be truncated in the tile save: {npc.name}")
+    return NPC_STRUCT.pack(
+        npc.x,
+        npc.y,
+        npc.level,
+        npc.hp,
+        npc.max_hp,
+        npc.attack_power_base,
+        npc.xp_reward,
+        npc.player_attitude,
+        (NPC_DEAD if npc.is_dead else 0) | (NPC_WANDERS if npc.wander else 0),
+        convo_code,
+        min(255, getattr(convo, counter_attr)) if counter_attr else 0,
+        convo_flags,
+        riddle,
+        name,
+    )
+
+
+def _decode_npc(record: bytes) -> NPC:
+    (
+        x,
+        y,
+        level,
+        hp,
+        max_hp,
+        attack_power_base,
+        xp_reward,
+        player_attitude,
+        npc_flags,
+        convo_code,
+        convo_counter,
+        convo_flags,
+        riddle,
+        name,
+    ) = NPC_STRUCT.unpack(record)
+    npc = NPC(name.rstrip(b"\0").decode())
+    npc.x, npc.y = x, y
+    npc.level = level
+    npc.max_hp = max_hp
+    npc.hp = hp
+    npc.attack_power_base = attack_power_base
+    npc.xp_reward = xp_reward
+    npc.player_attitude = player_attitude
+    npc.is_dead = bool(npc_flags & NPC_DEAD)
+    npc.wander = bool(npc_flags & NPC_WANDERS)
+    if convo_code == NO_CONVERSATION_CODE:
+        return npc
+    convo_cls = CONVERSATION_CLASSES[convo_code]
+    if convo_cls is RiddleConvo:
+        riddle_text, correct_answers = RIDDLES[riddle]
+        convo = RiddleConvo(
+            npc, riddle_text=riddle_text, correct_answers=correct_answers
+        )
+        convo.answered = bool(convo_flags & CONVO_ANSWERED)
+        convo.answered_correctly = bool(convo_flags & CONVO_ANSWERED_CORRECTLY)
+    else:
+        convo = convo_cls(npc)
+    counter_attr = CONVERSATION_TYPES[convo_cls][1]
+    if counter_attr:
+        setattr(convo, counter_attr, convo_counter)
+    convo.can_leave = bool(convo_flags & CONVO_CAN_LEAVE)
+    convo.has_ended = bool(convo_flags & CONVO_HAS_ENDED)
+    npc.conversation = convo
+    return npc
+
+
+def encode_tile(tile: Tile, player_coordinates: tuple[int, int] = (0, 0)) -> bytes:
+    width, height = tile.width, tile.height
+    paths = set(tile.paths)
+    edges = []
+    explored = []
+    cells = []
+    for y in range(height):
+        for x in range(width):
+            edges.append(((x, y), (x + 1, y)) in paths)
+            edges.append(((x, y), (x, y + 1)) in paths)
+            explored.append((x, y) in tile.explored)
+            room = tile.rooms.get((x, y))
+            code = ROOM_CODES[room.name] if room else 0
+            if (x, y) in tile.chests:
+                code |= CHEST_BIT
+            cells.append(code)
+    return b"".join(
+        [
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                width,
+                height,
+                tile.level,
+                ALL_VISIBLE if tile.all_visible else 0,
+                len(tile.npcs),
+                *player_coordinates,
+            ),
+            _pack_bits(edges),
+            _pack_bits(explored),
+            _pack_nibbles(cells),
+            *(_encode_npc(npc) for npc in tile.npcs),
+        ]
+    )
+
+
+def decode_tile(data: bytes, gui) -> tuple[Tile, tuple[int, int]]:
+    """Returns the tile and the player's coordinates in it"""
+    magic, version, width, height, level, flags, n_npcs, px, py = HEADER.unpack_from(
+        data
+    )
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} tile save")
+    n_cells = width * height
+    offset = HEADER.size
+    edges_size = (2 * n_cells + 7) // 8
+    edges = _unpack_bits(data[offset : offset + edges_size], 2 * n_cells)
+    offset += edges_size
+    explored_size = (n_cells + 7) // 8
+    explored = _unpack_bits(data[offset : offset + explored_size], n_cells)
+    offset += explored_size
+    cells_size = (n_cells + 1) // 2
+    cells = _unpack_nibbles(data[offset : offset + cells_size], n_cells)
+    offset += cells_size
+
+    tile = Tile.blank(gui, width, height, level)
+    tile.all_visible = bool(flags & ALL_VISIBLE)
+    for i in range(n_cells):
+        x, y = i % width, i // width
+        if edges[2 * i]:
+            tile.paths.append(((x, y), (x + 1, y)))
+        if edges[2 * i + 1]:
+            tile.paths.append(((x, y), (x, y + 1)))
+        if explored[i]:
+            tile.explored.add((x, y))
+        if cells[i] & CHEST_BIT:
+            tile.chests.add((x, y))
+        room_code = cells[i] & ~CHEST_BIT
+        if room_code:
+            name = ROOM_NAMES[room_code]
+            tile.rooms[(x, y)] = Room(x=x, y=y, name=name, map_icon=ROOM_ICONS[name])
+    for _ in range(n_npcs):
+        tile.npcs.append(_decode_npc(data[offset : offset + NPC_STRUCT.size]))
+        offset += NPC_STRUCT.size
+    return tile, (px, py)
@@ -0,0 +1,117 @@
+import logging
+from collections import deque
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# hostile NPCs within this many steps of the entrance count as "near the start"
+NEAR_START_STEPS = 2
+
+Coordinates = tuple[int, int]
+
+
+def adjacency(tile: "Tile") -> dict[Coordinates, list[Coordinates]]:
+    adj: dict[Coordinates, list[Coordinates]] = {}
+    for c1, c2 in tile.paths:
+        adj.setdefault(c1, []).append(c2)
+        adj.setdefault(c2, []).append(c1)
+    return adj
+
+
+def step_distances(
+    adj: dict[Coordinates, list[Coordinates]], start: Coordinates
+) -> dict[Coordinates, int]:
+    """Breadth first search: number of moves from `start` to every reachable room"""
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        coords = queue.popleft()
+        for neighbor in adj.get(coords, ()):
+            if neighbor not in distances:
+                distances[neighbor] = distances[coords] + 1
+                queue.append(neighbor)
+    return distances
+
+
+@dataclass
+class TileMetrics:
+    """Cheap shape measurements of a generated tile"""
+
+    n_rooms: int
+    portal_distance: int  # moves from the entrance to the portal
+    dead_ends: int  # rooms with only one way in or out
+    threats_near_start: int
+    n_hostiles: int
+    chest_spread: float  # mean moves from each chest to its nearest other chest
+
+    @classmethod
+    def measure(cls, tile: "Tile") -> "TileMetrics":
+        adj = adjacency(tile)
+        from_entrance = step_distances(adj, (0, 0))
+        portal = next(c for c, room in tile.rooms.items() if room.name == "portal")
+        hostiles = [npc for npc in tile.npcs if npc.will_attack_player()]
+        threats_near_start = sum(
+            1
+            for npc in hostiles
+            if from_entrance.get(npc.coordinates, NEAR_START_STEPS + 1)
+            <= NEAR_START_STEPS
+        )
+        chests = list(tile.chests)
+        nearest = []
+        for chest in chests:
+            distances = step_distances(adj, chest)
+            others = [distances[c] for c in chests if c != chest and c in distances]
+            if others:
+                nearest.append(min(others))
+        return cls(
+            n_rooms=tile.width * tile.height,
+            portal_distance=from_entrance.get(portal, 0),
+            dead_ends=sum(1 for neighbors in adj.values() if len(neighbors) == 1),
+            threats_near_start=threats_near_start,
+            n_hostiles=len(hostiles),
+            chest_spread=sum(nearest) / len(nearest) if nearest else 0.0,
+        )
+
+    @property
+    def difficulty(self) -> float:
+        """Rough 0 (easy) to 1 (hard) rating built from the other metrics"""
+        # a straight run from entrance to portal is about width + height moves
+        size = max(1, int(self.n_rooms**0.5))
+        portal_part = min(1.0, self.portal_distance / (3 * size))
+        dead_end_part = min(1.0, 3 * self.dead_ends / self.n_rooms)
+        threat_part = self.threats_near_start / max(1, self.n_hostiles)
+        # clustered chests are easy pickings
+        spread_part = min(1.0, self.chest_spread / size)
+        return (
+            0.35 * portal_part
+            + 0.2 * dead_end_part
+            + 0.3 * threat_part
+            + 0.15 * spread_part
+        )
+
+
+def difficulty_target(level: int) -> float:
+    """How hard a tile at this level should be, on the TileMetrics.difficulty scale"""
+    return min(0.75, 0.25 + 0.02 * level)
+
+
+def shape_metrics(tile: "Tile") -> dict[str, float]:
+    """Graph shape of a tile's paths, plus whatever it recorded while generating"""
+    adj = adjacency(tile)
+    n_rooms = tile.width * tile.height
+    n_paths = len(tile.paths)
+    portal = next(c for c, room in tile.rooms.items() if room.name == "portal")
+    from_entrance = step_distances(adj, (0, 0))
+    # all-pairs BFS; fine for the map sizes we actually play on
+    diameter = max(max(step_distances(adj, room).values()) for room in adj)
+    metrics = {
+        "paths": n_paths,
+        "avg_degree": 2 * n_paths / n_rooms,
+        "diameter": diameter,
+        "dead_ends": sum(1 for neighbors in adj.values() if len(neighbors) == 1),
+        # independent cycles in a connected graph: edges - nodes + 1
+        "loops": n_paths - n_rooms + 1,
+        "portal_distance": from_entrance.get(portal, 0),
+    }
+    metrics.update(tile.generation_stats)
+    return metrics
@@ -0,0 +1,85 @@
+"""Runs game turns on a worker thread so a slow turn never blocks the UI
+
+Commands are played one at a time, in the order they were submitted. After each
+turn the worker has the app paint it, on the app's own thread, and waits until
+that's done before playing the next command. So only one thread touches the
+game at a time: the worker while a turn plays, the app while it paints.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class TurnWorker:
+    def __init__(
+        self,
+        play: Callable[[str], None],
+        paint: Callable[[BaseException | None], None],
+        call_on_app: Callable[..., None],
+        loop: asyncio.AbstractEventLoop,
+    ):
+        """
+        Args:
+            play (Callable): Plays one command; runs on the worker
+            paint (Callable): Shows the turn just played, and is given the error
+                if playing it raised one; runs on the app's thread
+            call_on_app (Callable): How the app schedules a callback, e.g.
+                App.call_later; called from the event loop
+            loop (AbstractEventLoop): The app's event loop
+        """
+        self._play = play
+        self._paint = paint
+        self._call_on_app = call_on_app
+        self._loop = loop
+        self._commands: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+        self._painted = threading.Event()
+        self._closed = False
+        self._turn_started: float | None = None
+        self._thread = threading.Thread(target=self._run, name="turns", daemon=True)
+        self._thread.start()
+
+    def submit(self, command: str):
+        self._commands.put(command)
+
+    @property
+    def busy_for(self) -> float:
+        """Seconds the turn being played has taken so far, 0 when idle"""
+        started = self._turn_started
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def close(self):
+        """Finish the turn being played, if any, and drop anything still queued"""
+        self._closed = True
+        self._commands.put(None)
+        # the app may be gone and never paint the last turn
+        self._painted.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            command = self._commands.get()
+            if command is None or self._closed:
+                return
+            error = None
+            self._turn_started = time.perf_counter()
+            try:
+                self._play(command)
+            except Exception as exc:
+                logger.exception(f"Turn failed: {command!r}")
+                error = exc
+            finally:
+                self._turn_started = None
+            self._painted.clear()
+            self._loop.call_soon_threadsafe(self._call_on_app, self._paint_turn, error)
+            self._painted.wait()
+
+    def _paint_turn(self, error: BaseException | None):
+        try:
+            self._paint(error)
+        finally:
+            self._painted.set()
@@ -1,6 +1,19 @@
 import logging
+import random
+import re
 
 logger = logging.getLogger(__name__)
+# a move in a chain of commands, optionally repeated: "n", "3e"
+CHAINED_MOVE = re.compile(r"(\d*)([nesw])")
+# most times one move in a chain can be repeated
+MAX_REPEAT = 20
+
+
+def derive_seed(*parts) -> int:
+    """Seed for one independent random stream, e.g. derive_seed(run_seed, "tile", 3).
+    The same parts always give the same seed, in any process"""
+    # str seeds are hashed with sha512, unlike hash(), which varies between runs
+    return random.Random(":".join(str(part) for part in parts)).getrandbits(64)
 
 
 def get_plural_suffix(word: str):
@@ -46,6 +59,9 @@ COLOR_SCHEME = {
     "cursed": "bold red1",
     "bad_thing_happened": "hot_pink3",
     "in_limbo": "purple",
+    "map_chest": "light_goldenrod1",
+    "minimap_player": "bold white",
+    "minimap_medbay": "green",
 }
 
 
@@ -69,3 +85,23 @@ def sanitize_input(in_str: str) -> str:
         str
     """
     return in_str.strip().lower()
+
+
+def split_commands(line: str) -> list[str]:
+    """Split a typed line into the commands it chains
+
+    Commands are separated by semicolons. A part made only of moves can also be
+    separated by spaces, and a move can have a repeat count in front: "3n e;open"
+    is n, n, n, e, open. Any other part is one command, spaces and all.
+    """
+    commands = []
+    for part in line.split(";"):
+        words = part.lower().split()
+        moves = [CHAINED_MOVE.fullmatch(word) for word in words]
+        if words and all(moves):
+            for move in moves:
+                repeat = min(int(move[1] or 1), MAX_REPEAT)
+                commands.extend([move[2]] * repeat)
+        elif part.strip():
+            commands.append(part)
+    return commands or [line]
@@ -0,0 +1,81 @@
+"""Replay recorded sessions headlessly, as fast as they'll go
+
+Each recording is pushed through Game.play the way the GUI would (play, then
+the turn prompt) with nothing rendered, and the game state it ends in is
+checked against the hash recorded when the session ended. A recording of a
+session that crashed replays up to the crash and shows the traceback.
+
+Replays are also realistic workloads: --repeat times them, --profile shows
+where the time goes.
+
+Usage: python mapgame/replay.py recordings/*.maprec --repeat 5
+"""
+import argparse
+import copy
+import cProfile
+import logging
+import pstats
+import sys
+import time
+from pathlib import Path
+
+from mapgame import Game
+from mapgame_pieces.recording import Recording, RecordedArchive
+
+
+def replay(recording: Recording) -> Game:
+    game = Game(headless=True, save_path=None, seed=recording.seed)
+    # dimensions the session took from the player's archive; everything else,
+    # tile cache included, comes from the seed just as it did in the session
+    game.archive = RecordedArchive(recording.archived)
+    # loading takes ownership of nested parts (the inventory), so replay a copy
+    game.restore(copy.deepcopy(recording.player), recording.tile)
+    game.turn_prompt()
+    for command in recording.commands:
+        game.play(command)
+        game.gui.update_map()
+        game.turn_prompt()
+    return game
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recordings", type=Path, nargs="+")
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="replay each this many times; best time"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="print the top functions by time"
+    )
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    mismatches = 0
+    profiler = cProfile.Profile() if args.profile else None
+    for path in args.recordings:
+        recording = Recording.load(path)
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            if profiler:
+                profiler.enable()
+            game = replay(recording)
+            if profiler:
+                profiler.disable()
+            best = min(best, time.perf_counter() - start)
+        turns = len(recording.commands)
+        final_hash = game.state_hash()
+        if recording.final_hash is None:
+            verdict = "unfinished session, nothing to check"
+        elif final_hash == recording.final_hash:
+            verdict = "state matches"
+        else:
+            verdict = f"MISMATCH: {final_hash} != {recording.final_hash}"
+            mismatches += 1
+        print(
+            f"{path.name}: {turns} turns in {best * 1000:.1f} ms"
+            f" ({turns / best:,.0f} turns/s), {verdict}"
+        )
+    if profiler:
+        pstats.Stats(profiler).sort_stats("tottime").print_stats(20)
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,39 @@
+import asyncio
+
+from textual._context import active_app
+from textual.widgets import Input
+
+from mapgame import Game
+from mapgame_pieces.gui import GUIWrapper
+
+
+def play_in_gui(game: Game, commands: list[str]):
+    """Play `commands` through the GUI, with turns on its worker thread as usual"""
+    gui = GUIWrapper(game)
+    game.gui = game.player.gui = game.map.gui = game.current_tile.gui = gui
+
+    async def play():
+        async with gui.run_test(size=(100, 40)) as pilot:
+            active_app.set(gui)
+            await pilot.pause(0.2)
+            for command in commands:
+                await gui.on_input_submitted(Input.Submitted(gui.main_in, command))
+                await pilot.pause(0.1)
+            gui.turns.close()
+
+    asyncio.run(play())
+    return gui
+
+
+def test_profile_saves_from_turn_worker(tmp_path):
+    # the store's connection is opened on the main thread while loading the save
+    game = Game(
+        headless=True, save_path=tmp_path / "save.json", profile="alice", seed=7
+    )
+    game.player.save_to_file()
+    play_in_gui(game, ["debug", "ggwp", "leaderboard", "e", "s"])
+    # the app's thread still flushes at exit
+    game.player.journal.flush()
+    runs = game.player.store.leaderboard(profile="alice")
+    assert [run.profile for run in runs] == ["alice"]
+    assert game.player.time > 0
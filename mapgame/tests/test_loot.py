@@ -0,0 +1,16 @@
+from mapgame_pieces.loot import LootEntry, LootTable
+
+
+def test_level_gated_entries_follow_their_levels():
+    table = LootTable(
+        [
+            LootEntry("money"),
+            LootEntry("item", "late", min_level=8),
+            LootEntry("item", "early", max_level=7),
+        ],
+        band_size=5,
+    )
+    for level in range(1, 21):
+        entries, _ = table.compile_band(table.band_of(level))
+        available = [entry for entry in table.entries if entry.available_at(level)]
+        assert entries == available, level
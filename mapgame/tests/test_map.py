@@ -0,0 +1,23 @@
+import time
+
+from mapgame_pieces.map import Map
+
+
+def test_candidates_within_budget_are_reproducible():
+    picked = []
+    for _ in range(2):
+        tile_map = Map(None, 8, 8, candidates=3, candidate_budget=30, seed=5)
+        tile = tile_map.get_tile(4)
+        picked.append((tile.seed, [room.name for room in tile.rooms.values()]))
+        tile_map.close()
+    assert picked[0] == picked[1]
+
+
+def test_candidates_settle_for_the_first_when_out_of_time():
+    tile_map = Map(None, 8, 8, candidates=3, candidate_budget=0, seed=5)
+    started = time.perf_counter()
+    tile = tile_map.get_tile(4)
+    # the first candidate is made in this process; nothing waits on the workers
+    assert time.perf_counter() - started < 5
+    assert tile.seed == tile_map.tile_seed(4)
+    tile_map.close()
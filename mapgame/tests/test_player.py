@@ -0,0 +1,44 @@
+from mapgame import Game
+
+
+def test_run_recorded_once(tmp_path):
+    save_path = tmp_path / "save.json"
+    game = Game(headless=True, save_path=save_path, profile="alice", seed=7)
+    game.player.game_over()
+    game.player.game_over()
+    game.player.save_to_file()
+    # nor again after loading the save
+    Game(headless=True, save_path=save_path, profile="alice").player.game_over()
+    assert len(game.player.store.leaderboard(profile="alice")) == 1
+
+
+def test_reading_missing_profile_creates_nothing(tmp_path):
+    game = Game(headless=True, save_path=tmp_path / "save.json", profile="alice")
+    store = game.player.store
+    assert not game.player.journal.exists()
+    assert store.leaderboard(profile="typo") == []
+    assert store.load_tile("typo") is None
+    assert store.profiles() == []
+
+
+def test_derived_stats_follow_what_they_depend_on():
+    player = Game(headless=True, save_path=None, seed=7).player
+    power = player.attack_power
+    player.hp -= 5
+    assert "attack_power" in player.__dict__
+    player.level += 5
+    assert player.attack_power > power
+    player.flags.cursed_power += 1
+    assert "attack_power" not in player.__dict__
+
+
+def test_history_only_samples_changes():
+    player = Game(headless=True, save_path=None, seed=7).player
+    player.history.sample(player)
+    samples = player.history.samples
+    player.time += 1
+    player.history.sample(player)
+    assert player.history.samples == samples
+    player.xp += 1
+    player.history.sample(player)
+    assert player.history.samples == samples + 1
@@ -0,0 +1,77 @@
+import mapgame_pieces.map
+from mapgame import Game
+from mapgame_pieces.bot import Bot
+from mapgame_pieces.recording import Recording, SessionRecorder
+from mapgame_pieces.tile_codec import encode_tile
+from replay import replay
+
+
+def record_session(game: Game, path, commands, resumed: bool) -> Recording:
+    """Play `commands` with a recorder attached, the way the GUI session does;
+    `resumed` says whether the game started from a saved tile"""
+    game.recorder = SessionRecorder(
+        path,
+        game.player.seed,
+        game.player.save_data(),
+        encode_tile(game.current_tile, game.player.coordinates) if resumed else None,
+    )
+    for command in commands:
+        game.play(command)
+    game.recorder.close(game.state_hash())
+    return Recording.load(path)
+
+
+def test_replay_revisits_archived_dimension(tmp_path):
+    save_path = tmp_path / "save.json"
+    # leave dimension 1 with some of it explored, so the archive has more than
+    # its seed would make
+    first = Game(headless=True, save_path=save_path, seed=7)
+    for command in ["e", "s", "e", "debug", "tpdim 2"]:
+        first.play(command)
+    first.player.journal.flush()
+
+    game = Game(headless=True, save_path=save_path)
+    commands = ["debug", "tpdim 1", "n", "w"]
+    recording = record_session(game, tmp_path / "session.maprec", commands, True)
+    assert list(recording.archived) == [1]
+    assert replay(recording).state_hash() == recording.final_hash
+
+
+def test_replay_through_game_over_with_save(tmp_path):
+    game = Game(headless=True, save_path=tmp_path / "save.json", seed=7)
+    commands = ["e", "debug", "ggwp", "s"]
+    recording = record_session(game, tmp_path / "session.maprec", commands, False)
+    assert game.player.flags.run_recorded
+    assert replay(recording).state_hash() == recording.final_hash
+
+
+def test_replay_saved_run_across_portals_to_game_over(tmp_path, monkeypatch):
+    # one live tile, so going back to a dimension rebuilds it from its mutations
+    monkeypatch.setattr(mapgame_pieces.map, "LIVE_TILES", 1)
+    save_path = tmp_path / "save.json"
+    earlier = Game(headless=True, save_path=save_path, seed=1)
+    bot = Bot(earlier)
+    while earlier.player.tile_index < 3:
+        earlier.play(bot.next_command())
+    earlier.player.journal.flush()
+    earlier.map.close()
+
+    game = Game(headless=True, save_path=save_path)
+    bot = Bot(game)
+
+    def commands():
+        # back to dimensions left last session (the archive), then to one left
+        # this session (rebuilt from its mutations)
+        yield from ["debug", "tpdim 1", "e", "tpdim 2", "tpdim 1"]
+        for _ in range(5000):
+            if game.player.humanity <= 0:
+                break
+            yield bot.next_command()
+        yield from ["n", "s"]
+
+    recording = record_session(game, tmp_path / "session.maprec", commands(), True)
+    game.map.close()
+    assert game.player.flags.run_recorded
+    assert game.player.tile_index > 3
+    assert sorted(recording.archived) == [1, 2, 3]
+    assert replay(recording).state_hash() == recording.final_hash
@@ -0,0 +1,21 @@
+from mapgame_pieces.save_store import ProfileJournal, SaveStore
+
+
+def test_profile_journal_round_trip(tmp_path):
+    store = SaveStore(tmp_path / "saves.mapdb")
+    journal = ProfileJournal(store, "alice", compact_every=3)
+    save = {"hp": 30, "money": 0, "flags": {"cursed_power": 0}}
+    journal.write_snapshot(save)
+    for money in range(1, 6):
+        save = {**save, "money": money, "flags": {"cursed_power": money % 2}}
+        journal.append(save)
+        assert ProfileJournal(store, "alice").load() == save
+    # three patches, then a full save, then one more
+    assert store.patch_count("alice") == 1
+    reloaded = ProfileJournal(store, "alice", compact_every=3)
+    reloaded.load()
+    for hp in range(1, 4):
+        reloaded.append({**save, "hp": hp})
+    assert store.patch_count("alice") == 0
+    assert reloaded.load() == {**save, "hp": 3}
+    store.close()
@@ -0,0 +1,16 @@
+import threading
+
+from mapgame_pieces.save_writer import BackgroundSaveWriter
+
+
+def test_writer_survives_failed_write(tmp_path):
+    writer = BackgroundSaveWriter()
+    bad, good = tmp_path / "bad", tmp_path / "good"
+    # neither str nor bytes: the write raises a TypeError on the writer thread
+    writer.append(bad, 42)
+    writer.append(good, "saved")
+    flushed = threading.Thread(target=writer.flush, daemon=True)
+    flushed.start()
+    flushed.join(timeout=5)
+    assert not flushed.is_alive()
+    assert good.read_text() == "saved"
@@ -0,0 +1,29 @@
+from mapgame import Game
+
+
+def test_new_run_doesnt_revisit_old_runs_dimensions(tmp_path):
+    save_path = tmp_path / "save.json"
+    old_run = Game(headless=True, save_path=save_path, seed=7)
+    for command in ["e", "debug", "tpdim 2", "s", "tpdim 3"]:
+        old_run.play(command)
+    old_run.player.journal.flush()
+    assert old_run.archive.dimensions() == [1, 2]
+    # start over, as the game over text suggests
+    for suffix in (".json", ".mapjournal", ".maptile"):
+        save_path.with_suffix(suffix).unlink(missing_ok=True)
+
+    game = Game(headless=True, save_path=save_path, seed=99)
+    assert game.archive.dimensions() == []
+    for command in ["debug", "tpdim 2"]:
+        game.play(command)
+    assert game.current_tile.seed == game.map.tile_seed(2)
+
+
+def test_archive_ignores_records_from_another_run(tmp_path):
+    save_path = tmp_path / "save.json"
+    game = Game(headless=True, save_path=save_path, seed=7)
+    for command in ["e", "debug", "tpdim 2"]:
+        game.play(command)
+    assert game.archive.get(1)
+    game.archive.run_seed = 8
+    assert game.archive.get(1) is None
@@ -0,0 +1,104 @@
+"""Generate lots of tiles and summarise their shape and generation cost
+
+Tiles are generated and measured one at a time and only a fixed-size
+reservoir sample of each metric is kept, so memory stays flat for any --tiles.
+
+Usage: python mapgame/tile_stats.py --width 8 --height 4 --level 5 --tiles 10000
+"""
+import argparse
+import json
+import logging
+import random
+import time
+
+from mapgame_pieces.map import Tile
+from mapgame_pieces.tile_metrics import shape_metrics
+
+PERCENTILES = (50, 90, 99)
+
+
+class StreamingSummary:
+    """Count, mean, min and max exactly; percentiles from a reservoir sample"""
+
+    def __init__(self, reservoir_size: int, rng: random.Random):
+        self.reservoir_size = reservoir_size
+        self.rng = rng
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.sample: list[float] = []
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.sample) < self.reservoir_size:
+            self.sample.append(value)
+        else:
+            slot = self.rng.randrange(self.count)
+            if slot < self.reservoir_size:
+                self.sample[slot] = value
+
+    def percentile(self, pct: float) -> float:
+        ordered = sorted(self.sample)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def to_dict(self) -> dict[str, float]:
+        summary = {"mean": self.total / self.count, "min": self.min, "max": self.max}
+        for pct in PERCENTILES:
+            summary[f"p{pct}"] = self.percentile(pct)
+        return summary
+
+
+def collect(
+    width: int, height: int, level: int, n_tiles: int, reservoir_size: int, seed: int
+) -> dict[str, StreamingSummary]:
+    random.seed(seed)
+    summary_rng = random.Random(seed)
+    summaries: dict[str, StreamingSummary] = {}
+    for _ in range(n_tiles):
+        start = time.perf_counter()
+        tile = Tile(None, width, height, level=level)
+        elapsed = time.perf_counter() - start
+        metrics = shape_metrics(tile)
+        metrics["total_time"] = elapsed
+        for name, value in metrics.items():
+            if name not in summaries:
+                summaries[name] = StreamingSummary(reservoir_size, summary_rng)
+            summaries[name].add(value)
+    return summaries
+
+
+def print_table(summaries: dict[str, StreamingSummary]):
+    columns = ["mean", "min"] + [f"p{pct}" for pct in PERCENTILES] + ["max"]
+    print(f"{'metric':<20}" + "".join(f"{col:>11}" for col in columns))
+    for name, summary in summaries.items():
+        row = summary.to_dict()
+        # report times in milliseconds
+        scale = 1000 if name.endswith("_time") else 1
+        label = name + " (ms)" if scale != 1 else name
+        print(f"{label:<20}" + "".join(f"{row[col] * scale:>11.3f}" for col in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--height", type=int, default=4)
+    parser.add_argument("--level", type=int, default=1)
+    parser.add_argument("--tiles", type=int, default=1000)
+    parser.add_argument("--reservoir", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print JSON instead")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    results = collect(
+        args.width, args.height, args.level, args.tiles, args.reservoir, args.seed
+    )
+    if args.json:
+        print(json.dumps({name: s.to_dict() for name, s in results.items()}))
+    else:
+        print(f"{args.tiles} tiles, {args.width}x{args.height}, level {args.level}")
+        print_table(results)